@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LANGUAGE DETECTOR
+Общее определение языка текста (en/es) для TTS и субтитров обоих пайплайнов
+• Один проход по словам: frozenset словаря и кортеж окончаний
+• Кэш результатов по выборке текста
+• Определение языка по абзацам для смешанных сценариев
+"""
+
+import re
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 500
+
+SPANISH_CHARS = frozenset('ñáéíóúü¿¡ç')
+
+SPANISH_WORDS = frozenset([
+    'el', 'la', 'los', 'las', 'de', 'del', 'que', 'y', 'es', 'en', 'un', 'una', 'se', 'no',
+    'con', 'por', 'para', 'su', 'sus', 'te', 'le', 'lo', 'me', 'nos', 'como', 'más', 'muy',
+    'todo', 'todos', 'toda', 'todas', 'este', 'esta', 'estos', 'estas', 'ese', 'esa', 'esos',
+    'esas', 'aquel', 'aquella', 'aquellos', 'aquellas', 'pero', 'si', 'sí', 'también', 'cuando',
+    'donde', 'dónde', 'cómo', 'qué', 'quién', 'cuál', 'cuánto', 'tiempo', 'año', 'día', 'casa',
+    'hacer', 'ser', 'estar', 'tener', 'haber', 'poder', 'decir', 'ir', 'ver', 'dar', 'saber',
+    'querer', 'llegar', 'pasar', 'deber', 'poner', 'parecer', 'quedar', 'creer', 'hablar',
+    'llevar', 'dejar', 'seguir', 'encontrar', 'llamar', 'venir', 'pensar', 'salir', 'volver',
+    'tomar', 'conocer', 'vivir', 'sentir', 'tratar', 'mirar', 'contar', 'empezar', 'esperar'
+])
+
+SPANISH_ENDINGS = ('ción', 'sión', 'dad', 'tad', 'mente', 'ando', 'iendo', 'ado', 'ido')
+
+# Пороги: доля испанских слов и доля слов с испанскими окончаниями
+SPANISH_WORD_RATIO = 0.15
+SPANISH_ENDING_RATIO = 0.05
+
+# Абзацы короче этого числа слов (заголовки, подписи) наследуют язык соседей
+MIN_PARAGRAPH_WORDS = 4
+# Одиночный абзац другого языка короче этого числа слов между абзацами одного языка
+# считается ошибкой определения (имена, цитаты) и не переключает голос
+ISOLATED_PARAGRAPH_WORDS = 12
+
+PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+
+@lru_cache(maxsize=512)
+def _detect_sample(sample: str) -> str:
+    """Определение языка для нормализованной (lower) выборки текста"""
+    if not SPANISH_CHARS.isdisjoint(sample):
+        return 'es'
+    
+    words = sample.split()
+    if not words:
+        return 'en'
+    
+    spanish_words = 0
+    spanish_endings = 0
+    for word in words:
+        if word in SPANISH_WORDS:
+            spanish_words += 1
+        if word.endswith(SPANISH_ENDINGS):
+            spanish_endings += 1
+    
+    if spanish_words > len(words) * SPANISH_WORD_RATIO:
+        return 'es'
+    if spanish_endings > len(words) * SPANISH_ENDING_RATIO:
+        return 'es'
+    return 'en'
+
+def detect_language(text: str, sample_size: int = SAMPLE_SIZE) -> str:
+    """Язык текста: 'en' или 'es' (по первым sample_size символам)"""
+    if not text or not text.strip():
+        return 'en'
+    return _detect_sample(text[:sample_size].lower())
+
+def split_paragraphs(text: str) -> list:
+    """Абзацы текста: по пустым строкам, иначе по переводам строк"""
+    paragraphs = [p.strip() for p in PARAGRAPH_SPLIT.split(text)]
+    if len(paragraphs) == 1:
+        paragraphs = [p.strip() for p in text.split('\n')]
+    return [p for p in paragraphs if p]
+
+def detect_paragraph_languages(text: str) -> list:
+    """Язык каждого абзаца: [(абзац, язык), ...]. Короткие абзацы наследуют язык соседей"""
+    paragraphs = split_paragraphs(text)
+    languages = [
+        detect_language(p) if len(p.split()) >= MIN_PARAGRAPH_WORDS else None
+        for p in paragraphs
+    ]
+    
+    fallback = detect_language(text)
+    previous = None
+    for i, language in enumerate(languages):
+        if language is None:
+            following = next((lang for lang in languages[i + 1:] if lang), None)
+            languages[i] = previous or following or fallback
+        previous = languages[i]
+    
+    for i in range(1, len(languages) - 1):
+        if (languages[i - 1] == languages[i + 1] != languages[i]
+                and len(paragraphs[i].split()) < ISOLATED_PARAGRAPH_WORDS):
+            languages[i] = languages[i - 1]
+    
+    return list(zip(paragraphs, languages))
+
+def split_language_runs(text: str) -> list:
+    """Соседние абзацы одного языка склеиваются: [(язык, текст), ...]"""
+    runs = []
+    for paragraph, language in detect_paragraph_languages(text):
+        if runs and runs[-1][0] == language:
+            runs[-1] = (language, runs[-1][1] + '\n\n' + paragraph)
+        else:
+            runs.append((language, paragraph))
+    
+    if len(runs) > 1:
+        logger.info(f"🌐 Mixed-language text: {' → '.join(language for language, _ in runs)}")
+    return runs
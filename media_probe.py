@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IN-PROCESS MEDIA PROBE
+Чтение длительности, размеров и поворота медиафайлов без запуска ffprobe
+• MP3: Xing/Info заголовок или подсчет кадров
+• MP4/MOV/M4V: боксы moov/mvhd/trak/tkhd/mdhd/hdlr/stsd (+ профиль H.264 из avcC)
+• Остальные контейнеры - через ffprobe (fallback)
+Результаты кэшируются по (путь, размер, mtime)
+"""
+
+import json
+import math
+import struct
+import logging
+import threading
+import subprocess
+from pathlib import Path
+
+from mp3_frames import mp3_duration, parse_frame_header, id3v2_size
+
+logger = logging.getLogger(__name__)
+
+MP4_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts'}
+MP4_TOP_LEVEL_BOXES = {b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip', b'pnot'}
+# Поля VisualSampleEntry до вложенных боксов (avcC и др.)
+VISUAL_SAMPLE_ENTRY_FIELDS = 78
+H264_CODECS = {'avc1', 'avc3', 'h264'}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def iter_boxes(data, start: int = 0, end: int = None):
+    """Итерация по ISO BMFF боксам в буфере: (тип, начало данных, конец бокса)"""
+    end = len(data) if end is None else end
+    pos = start
+    
+    while pos + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            break
+        yield box_type, pos + header, pos + size
+        pos += size
+
+def read_moov(mp4_file: Path):
+    """Чтение бокса moov с диска без загрузки mdat"""
+    with open(mp4_file, 'rb') as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        pos = 0
+        
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            header = f.read(16)
+            size, box_type = struct.unpack('>I4s', header[:8])
+            header_size = 8
+            if size == 1:
+                size = struct.unpack('>Q', header[8:16])[0]
+                header_size = 16
+            elif size == 0:
+                size = file_size - pos
+            
+            if box_type not in MP4_TOP_LEVEL_BOXES and pos == 0:
+                return None
+            if size < header_size:
+                return None
+            if box_type == b'moov':
+                f.seek(pos + header_size)
+                return f.read(size - header_size)
+            pos += size
+    
+    return None
+
+def parse_full_box_times(data, start: int):
+    """(timescale, duration) из mvhd/mdhd с учетом версии бокса"""
+    version = data[start]
+    if version == 1:
+        timescale, duration = struct.unpack('>IQ', data[start + 20:start + 32])
+    else:
+        timescale, duration = struct.unpack('>II', data[start + 12:start + 20])
+    return timescale, duration
+
+def parse_tkhd(data, start: int):
+    """Размеры и поворот дорожки из матрицы tkhd (градусы по часовой стрелке, как тег rotate)"""
+    version = data[start]
+    offset = start + (88 if version == 1 else 76)
+    matrix = struct.unpack('>9i', data[offset - 36:offset])
+    width, height = struct.unpack('>II', data[offset:offset + 8])
+    
+    a, b = matrix[0] / 65536, matrix[1] / 65536
+    rotation = int(round(math.degrees(math.atan2(b, a)))) % 360
+    return width >> 16, height >> 16, rotation
+
+def parse_avc_profile(data, entry_start: int, entry_end: int):
+    """profile_idc H.264 из бокса avcC записи stsd (None если бокса нет)"""
+    for box_type, data_start, _ in iter_boxes(data, entry_start + 8 + VISUAL_SAMPLE_ENTRY_FIELDS, entry_end):
+        if box_type == b'avcC':
+            return data[data_start + 1]
+    return None
+
+def parse_trak(data, start: int, end: int):
+    """Разбор дорожки: тип, размеры, поворот, длительность, кодек, профиль H.264, число сэмплов"""
+    track = {'handler': None, 'width': 0, 'height': 0, 'rotation': 0, 'duration': 0.0, 'codec': None, 'samples': 0,
+             'profile': None}
+    
+    def walk(box_start, box_end):
+        for box_type, data_start, box_stop in iter_boxes(data, box_start, box_end):
+            if box_type in MP4_CONTAINER_BOXES:
+                walk(data_start, box_stop)
+            elif box_type == b'tkhd':
+                track['width'], track['height'], track['rotation'] = parse_tkhd(data, data_start)
+            elif box_type == b'mdhd':
+                timescale, duration = parse_full_box_times(data, data_start)
+                track['duration'] = duration / timescale if timescale else 0.0
+                track['timescale'] = timescale
+            elif box_type == b'hdlr':
+                track['handler'] = bytes(data[data_start + 8:data_start + 12]).decode('ascii', 'replace')
+            elif box_type == b'stsd':
+                # Первая запись: size(4) + format(4)
+                track['codec'] = bytes(data[data_start + 12:data_start + 16]).decode('ascii', 'replace')
+                if track['codec'] in H264_CODECS:
+                    entry_size = struct.unpack('>I', data[data_start + 8:data_start + 12])[0]
+                    track['profile'] = parse_avc_profile(data, data_start + 8, min(box_stop, data_start + 8 + entry_size))
+            elif box_type == b'stts':
+                entry_count = struct.unpack('>I', data[data_start + 4:data_start + 8])[0]
+                entries = struct.unpack(f'>{entry_count * 2}I', data[data_start + 8:data_start + 8 + entry_count * 8])
+                track['samples'] = sum(entries[0::2])
+    
+    walk(start, end)
+    return track
+
+def probe_mp4(mp4_file: Path):
+    """Свойства MP4/MOV по боксу moov (None если moov не найден)"""
+    moov = read_moov(mp4_file)
+    if not moov:
+        return None
+    
+    info = {
+        'duration': 0.0, 'width': 0, 'height': 0, 'rotation': 0,
+        'video_codec': None, 'audio_codec': None, 'has_video': False, 'has_audio': False,
+        'video_duration': 0.0, 'frame_count': 0, 'fps': 0.0, 'video_profile': None, 'pixel_format': None,
+        'source': 'mp4'
+    }
+    
+    for box_type, start, end in iter_boxes(moov):
+        if box_type == b'mvex':
+            # Фрагментированный MP4: сэмплы и длительность в moof - разбирает ffprobe
+            return None
+        if box_type == b'mvhd':
+            timescale, duration = parse_full_box_times(moov, start)
+            info['duration'] = duration / timescale if timescale else 0.0
+        elif box_type == b'trak':
+            track = parse_trak(moov, start, end)
+            if track['handler'] == 'vide' and not info['has_video']:
+                info.update({
+                    'has_video': True,
+                    'width': track['width'],
+                    'height': track['height'],
+                    'rotation': track['rotation'],
+                    'video_codec': track['codec'],
+                    'video_profile': track['profile'],
+                    'video_duration': track['duration'],
+                    'frame_count': track['samples'],
+                    'fps': track['samples'] / track['duration'] if track['duration'] else 0.0
+                })
+            elif track['handler'] == 'soun' and not info['has_audio']:
+                info['has_audio'] = True
+                info['audio_codec'] = track['codec']
+    
+    if not info['duration']:
+        info['duration'] = info['video_duration']
+    if not info['duration']:
+        return None
+    return info
+
+def probe_mp3(mp3_file: Path):
+    """Свойства MP3 по заголовкам кадров"""
+    data = Path(mp3_file).read_bytes()
+    duration = mp3_duration(data)
+    if duration <= 0:
+        return None
+    
+    header = parse_frame_header(data, id3v2_size(data))
+    return {
+        'duration': duration, 'width': 0, 'height': 0, 'rotation': 0,
+        'video_codec': None, 'audio_codec': 'mp3', 'has_video': False, 'has_audio': True,
+        'video_duration': 0.0, 'frame_count': 0, 'fps': 0.0, 'video_profile': None, 'pixel_format': None,
+        'sample_rate': header['sample_rate'] if header else 0,
+        'source': 'mp3'
+    }
+
+def probe_ffprobe(media_file: Path):
+    """Fallback: свойства через ffprobe"""
+    try:
+        cmd = [
+            'ffprobe', '-v', 'quiet', '-print_format', 'json',
+            '-show_format', '-show_streams', str(media_file)
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        
+        data = json.loads(result.stdout)
+        streams = data.get('streams', [])
+        video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        
+        info = {
+            'duration': float(data.get('format', {}).get('duration', 0) or 0),
+            'width': 0, 'height': 0, 'rotation': 0,
+            'video_codec': None, 'audio_codec': audio_stream.get('codec_name') if audio_stream else None,
+            'has_video': video_stream is not None, 'has_audio': audio_stream is not None,
+            'video_duration': 0.0, 'frame_count': 0, 'fps': 0.0, 'video_profile': None, 'pixel_format': None,
+            'source': 'ffprobe'
+        }
+        
+        if video_stream:
+            rotation = int(float(video_stream.get('tags', {}).get('rotate', 0) or 0))
+            for side_data in video_stream.get('side_data_list', []):
+                if 'rotation' in side_data:
+                    # Display matrix хранит поворот против часовой стрелки - к соглашению тега rotate и tkhd
+                    rotation = -int(float(side_data['rotation']))
+            
+            num, _, den = str(video_stream.get('avg_frame_rate', '0/1')).partition('/')
+            info.update({
+                'width': int(video_stream.get('width', 0)),
+                'height': int(video_stream.get('height', 0)),
+                'rotation': rotation % 360,
+                'video_codec': video_stream.get('codec_name'),
+                'video_duration': float(video_stream.get('duration', 0) or 0),
+                'frame_count': int(video_stream.get('nb_frames', 0) or 0),
+                'fps': float(num) / float(den) if den and float(den) else 0.0,
+                'video_profile': video_stream.get('profile'),
+                'pixel_format': video_stream.get('pix_fmt')
+            })
+        
+        return info
+    
+    except Exception as e:
+        logger.error(f"❌ ffprobe failed for {media_file}: {e}")
+        return None
+
+def detect_container(media_file: Path):
+    """Определение контейнера по сигнатуре: 'mp3', 'mp4' или None"""
+    with open(media_file, 'rb') as f:
+        head = f.read(12)
+    
+    if len(head) >= 8 and head[4:8] in MP4_TOP_LEVEL_BOXES:
+        return 'mp4'
+    if head[:3] == b'ID3' or parse_frame_header(head, 0):
+        return 'mp3'
+    return None
+
+def probe_media(media_file: Path):
+    """Свойства медиафайла: длительность, размеры, поворот, кодеки (None при ошибке)"""
+    media_file = Path(media_file)
+    try:
+        stat = media_file.stat()
+    except OSError:
+        return None
+    
+    cache_key = (str(media_file.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        if cache_key in _cache:
+            return dict(_cache[cache_key])
+    
+    info = None
+    try:
+        container = detect_container(media_file)
+        if container == 'mp4':
+            info = probe_mp4(media_file)
+        elif container == 'mp3':
+            info = probe_mp3(media_file)
+    except Exception as e:
+        logger.debug(f"In-process probe failed for {media_file.name}: {e}")
+        info = None
+    
+    if info is None:
+        info = probe_ffprobe(media_file)
+    
+    if info is not None:
+        with _cache_lock:
+            _cache[cache_key] = dict(info)
+    return info
+
+def get_duration(media_file: Path) -> float:
+    """Длительность медиафайла в секундах (0.0 если определить не удалось)"""
+    info = probe_media(media_file)
+    return info['duration'] if info else 0.0
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MP3 FRAME TOOLS
+Разбор заголовков MPEG-аудио кадров и склейка MP3 на уровне кадров без ffmpeg
+• Пропуск ID3v2/ID3v1 тегов и служебных Xing/Info/VBRI кадров
+• Проверка совместимости потоков (версия, layer, частота, каналы)
+"""
+
+import os
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Таблицы битрейтов (кбит/с) по (версия, layer)
+BITRATES = {
+    ('1', 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    ('1', 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    ('1', 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    ('2', 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    ('2', 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    ('2', 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+SAMPLE_RATES = {
+    '1': [44100, 48000, 32000],
+    '2': [22050, 24000, 16000],
+    '2.5': [11025, 12000, 8000],
+}
+
+VERSIONS = {0: '2.5', 2: '2', 3: '1'}
+LAYERS = {1: 3, 2: 2, 3: 1}
+
+def parse_frame_header(data, pos: int):
+    """Разбор 4-байтного заголовка MPEG-аудио кадра (None если это не кадр)"""
+    if pos + 4 > len(data):
+        return None
+    
+    b0, b1, b2, b3 = data[pos], data[pos + 1], data[pos + 2], data[pos + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    
+    version = VERSIONS.get((b1 >> 3) & 0x03)
+    layer = LAYERS.get((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    
+    table_version = '1' if version == '1' else '2'
+    bitrate = BITRATES[(table_version, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    channel_mode = b3 >> 6
+    
+    if layer == 1:
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+        samples = 384
+    elif layer == 2 or version == '1':
+        frame_length = 144 * bitrate // sample_rate + padding
+        samples = 1152
+    else:
+        frame_length = 72 * bitrate // sample_rate + padding
+        samples = 576
+    
+    return {
+        'version': version,
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'channels': 1 if channel_mode == 3 else 2,
+        'protected': not (b1 & 0x01),
+        'frame_length': frame_length,
+        'samples': samples,
+    }
+
+def id3v2_size(data) -> int:
+    """Размер ID3v2 тега в начале файла (0 если тега нет)"""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = ((data[6] & 0x7F) << 21) | ((data[7] & 0x7F) << 14) | ((data[8] & 0x7F) << 7) | (data[9] & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def audio_end(data) -> int:
+    """Конец аудиоданных без ID3v1 тега в хвосте"""
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+    return end
+
+def is_info_frame(data, pos: int, header: dict) -> bool:
+    """Служебный Xing/Info/VBRI кадр (не содержит звука)"""
+    if header['layer'] != 3:
+        return False
+    
+    if header['version'] == '1':
+        side_info = 17 if header['channels'] == 1 else 32
+    else:
+        side_info = 9 if header['channels'] == 1 else 17
+    
+    offset = pos + 4 + (2 if header['protected'] else 0) + side_info
+    if data[offset:offset + 4] in (b'Xing', b'Info'):
+        return True
+    return data[pos + 36:pos + 40] == b'VBRI'
+
+def iter_frames(data):
+    """Итерация по аудиокадрам: (позиция, заголовок), служебные кадры пропускаются"""
+    pos = id3v2_size(data)
+    end = audio_end(data)
+    first = True
+    
+    while pos + 4 <= end:
+        header = parse_frame_header(data, pos)
+        
+        if header is None or header['frame_length'] <= 4 or pos + header['frame_length'] > end:
+            # Потеря синхронизации - ищем следующий sync word
+            next_sync = data.find(b'\xff', pos + 1, end)
+            if next_sync < 0:
+                break
+            pos = next_sync
+            continue
+        
+        if not (first and is_info_frame(data, pos, header)):
+            yield pos, header
+        
+        first = False
+        pos += header['frame_length']
+
+def xing_frame_count(data, pos: int, header: dict):
+    """Количество кадров из Xing/Info заголовка (None если поле отсутствует)"""
+    if header['version'] == '1':
+        side_info = 17 if header['channels'] == 1 else 32
+    else:
+        side_info = 9 if header['channels'] == 1 else 17
+    
+    offset = pos + 4 + (2 if header['protected'] else 0) + side_info
+    if data[offset:offset + 4] not in (b'Xing', b'Info'):
+        return None
+    
+    flags = int.from_bytes(data[offset + 4:offset + 8], 'big')
+    if not flags & 0x01:
+        return None
+    return int.from_bytes(data[offset + 8:offset + 12], 'big')
+
+def mp3_duration(data) -> float:
+    """Длительность MP3 в секундах: по Xing заголовку или подсчетом кадров"""
+    pos = id3v2_size(data)
+    
+    # Первый кадр может быть служебным Xing/Info с готовым числом кадров
+    while pos + 4 <= len(data) and parse_frame_header(data, pos) is None:
+        pos = data.find(b'\xff', pos + 1)
+        if pos < 0:
+            return 0.0
+    
+    header = parse_frame_header(data, pos)
+    if header is None:
+        return 0.0
+    
+    frame_count = xing_frame_count(data, pos, header)
+    if frame_count:
+        return frame_count * header['samples'] / header['sample_rate']
+    
+    samples = 0
+    sample_rate = 0
+    for _, frame_header in iter_frames(data):
+        samples += frame_header['samples']
+        sample_rate = frame_header['sample_rate']
+    return samples / sample_rate if sample_rate else 0.0
+
+def stream_format(header: dict) -> tuple:
+    """Ключ совместимости потоков для склейки"""
+    return header['version'], header['layer'], header['sample_rate'], header['channels']
+
+def read_frames(mp3_file: Path):
+    """Чтение MP3: (формат, список memoryview кадров, длительность в секундах)"""
+    data = Path(mp3_file).read_bytes()
+    view = memoryview(data)
+    
+    frames = []
+    stream_key = None
+    samples = 0
+    sample_rate = 0
+    
+    for pos, header in iter_frames(data):
+        key = stream_format(header)
+        if stream_key is None:
+            stream_key = key
+            sample_rate = header['sample_rate']
+        elif key != stream_key:
+            raise ValueError(f"mixed stream formats inside {Path(mp3_file).name}")
+        frames.append(view[pos:pos + header['frame_length']])
+        samples += header['samples']
+    
+    duration = samples / sample_rate if sample_rate else 0.0
+    return stream_key, frames, duration
+
+def concat_mp3_files(input_files: list, output_file: Path) -> bool:
+    """Склейка однотипных MP3 на уровне кадров. False - форматы не совпадают или файл не разобран"""
+    try:
+        parsed = []
+        stream_key = None
+        
+        for input_file in input_files:
+            key, frames, duration = read_frames(input_file)
+            if not frames:
+                logger.info(f"ℹ️ No MPEG audio frames in {Path(input_file).name}")
+                return False
+            if stream_key is None:
+                stream_key = key
+            elif key != stream_key:
+                logger.info(f"ℹ️ MP3 format mismatch: {Path(input_file).name} {key} != {stream_key}")
+                return False
+            parsed.append((frames, duration))
+        
+        output_file = Path(output_file)
+        temp_output = output_file.with_name(f".{output_file.name}.part")
+        
+        with open(temp_output, 'wb') as f:
+            for frames, _ in parsed:
+                for frame in frames:
+                    f.write(frame)
+        
+        os.replace(temp_output, output_file)
+        
+        total_frames = sum(len(frames) for frames, _ in parsed)
+        total_duration = sum(duration for _, duration in parsed)
+        logger.info(f"✅ Native MP3 concat: {len(parsed)} files, {total_frames} frames, {total_duration:.1f}s")
+        return True
+    
+    except Exception as e:
+        logger.info(f"ℹ️ Native MP3 concat not possible: {e}")
+        temp_output = Path(output_file).with_name(f".{Path(output_file).name}.part")
+        if temp_output.exists():
+            try:
+                temp_output.unlink()
+            except:
+                pass
+        return False
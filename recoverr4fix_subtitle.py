@@ -21,7 +21,8 @@ import asyncio
 import threading
 import subprocess
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, Future, CancelledError
+from collections import deque
 import queue
 import logging
 import glob
@@ -29,6 +30,7 @@ from datetime import datetime
 import multiprocessing
 import signal
 import traceback
+import importlib.util
 import gc
 
 # GUI imports
@@ -39,9 +41,18 @@ from tkinter import font as tkFont
 # Core processing imports
 import cv2
 import numpy as np
-import whisper
 import edge_tts
 
+# Local modules
+from mp3_frames import concat_mp3_files
+from media_probe import probe_media, get_duration
+from language_detector import detect_language as detect_text_language, split_language_runs
+from transcription_worker import word_timings, batch_word_timings
+from transcript_cache import save_transcript, load_transcript, load_latest_transcript
+from subtitle_ir import SubtitleIR, ass_header, compile_formatter, preset_style, write_ass, export_plain_subtitles
+from subtitle_sprites import SubtitleCompositor, verify_against_libass
+from subtitle_fonts import ass_filter, resolve_fonts_dir, start_font_preparation
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -356,38 +367,35 @@ class VideoOrientationDetector:
     
     @staticmethod
     def get_video_info(video_path: Path):
-        """Получение информации о видео"""
+        """Получение информации о видео (с учетом поворота из метаданных)"""
         try:
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_streams', str(video_path)
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            info = probe_media(video_path)
             
-            if result.returncode == 0:
-                import json
-                data = json.loads(result.stdout)
-                video_stream = next((s for s in data['streams'] if s['codec_type'] == 'video'), None)
-                
-                if video_stream:
-                    width = int(video_stream.get('width', 0))
-                    height = int(video_stream.get('height', 0))
-                    duration = float(video_stream.get('duration', 0))
-                    
-                    if width > height:
-                        orientation = 'landscape'
-                    elif height > width:
-                        orientation = 'portrait'
-                    else:
-                        orientation = 'square'
-                    
-                    return {
-                        'width': width,
-                        'height': height,
-                        'duration': duration,
-                        'orientation': orientation,
-                        'aspect_ratio': width / height if height > 0 else 1.0
-                    }
+            if info and info['has_video']:
+                width = info['width']
+                height = info['height']
+                duration = info['video_duration'] or info['duration']
+                rotation = info['rotation']
+                
+                # При повороте на 90/270 отображаемые размеры меняются местами
+                if rotation in (90, 270):
+                    width, height = height, width
+                
+                if width > height:
+                    orientation = 'landscape'
+                elif height > width:
+                    orientation = 'portrait'
+                else:
+                    orientation = 'square'
+                
+                return {
+                    'width': width,
+                    'height': height,
+                    'duration': duration,
+                    'rotation': rotation,
+                    'orientation': orientation,
+                    'aspect_ratio': width / height if height > 0 else 1.0
+                }
         except Exception as e:
             logger.error(f"❌ Error getting video info: {e}")
         
@@ -684,6 +692,377 @@ class AdvancedImageProcessor:
             logger.warning(f"Motion effect error: {e}")
             return img
 
+class TTSLatencyStats:
+    """Статистика задержек TTS запросов: гистограмма по попыткам и перцентили успешных"""
+    
+    HISTOGRAM_BUCKETS = (0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60)
+    
+    def __init__(self, window_size: int = 200, min_samples: int = 8):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window_size)
+        self._buckets = [0] * (len(self.HISTOGRAM_BUCKETS) + 1)
+        self._outcomes = {}
+        self._lock = threading.Lock()
+    
+    def record(self, latency: float, outcome: str = 'ok'):
+        """Регистрация одной попытки (ok / error / timeout / cancelled)"""
+        with self._lock:
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            if outcome == 'cancelled':
+                return
+            index = next((i for i, bound in enumerate(self.HISTOGRAM_BUCKETS) if latency <= bound), len(self.HISTOGRAM_BUCKETS))
+            self._buckets[index] += 1
+            if outcome == 'ok':
+                self._samples.append(latency)
+    
+    def percentile(self, p: float):
+        """Перцентиль задержки успешных запросов (None пока мало данных)"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(math.ceil(p / 100 * len(ordered))) - 1)
+        return ordered[max(0, index)]
+    
+    def histogram(self) -> dict:
+        """Гистограмма задержек попыток: верхняя граница бакета -> количество"""
+        with self._lock:
+            labels = [f"<={bound}s" for bound in self.HISTOGRAM_BUCKETS] + [f">{self.HISTOGRAM_BUCKETS[-1]}s"]
+            return dict(zip(labels, self._buckets))
+    
+    def summary(self) -> dict:
+        """Сводка для логов и UI"""
+        with self._lock:
+            outcomes = dict(self._outcomes)
+        return {
+            'attempts': sum(outcomes.values()),
+            'outcomes': outcomes,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'histogram': self.histogram()
+        }
+
+class TTSCircuitBreaker:
+    """Общий circuit breaker TTS сервиса: при серии отказов приостанавливает все чанки"""
+    
+    def __init__(self, failure_threshold: int = 5, open_seconds: float = 15.0, max_open_seconds: float = 120.0):
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.open_seconds = open_seconds
+        self.state = 'closed'
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+    
+    async def before_request(self) -> bool:
+        """Ожидание, пока сервис снова можно нагружать (True - этот запрос пробный)"""
+        while True:
+            if self.state == 'closed':
+                return False
+            
+            if self.state == 'open':
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    logger.info(f"⛔ TTS circuit open, pausing {remaining:.1f}s")
+                    await asyncio.sleep(remaining)
+                    continue
+                self.state = 'half_open'
+            
+            # half_open: пропускаем только один пробный запрос
+            if not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            await asyncio.sleep(0.5)
+    
+    def release_probe(self):
+        """Пробный запрос завершился без результата (отмена) - следующий запрос станет пробным"""
+        if self.state == 'half_open':
+            self._probe_in_flight = False
+    
+    def record_success(self):
+        if self.state != 'closed':
+            logger.info("✅ TTS circuit closed, service recovered")
+        self.state = 'closed'
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+        self.open_seconds = self.base_open_seconds
+    
+    def record_failure(self):
+        self._consecutive_failures += 1
+        
+        if self.state == 'half_open':
+            # Пробный запрос не прошел - открываем снова на больший срок
+            self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+            self._open()
+        elif self.state == 'closed' and self._consecutive_failures >= self.failure_threshold:
+            self._open()
+    
+    def _open(self):
+        self.state = 'open'
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        logger.warning(f"⛔ TTS circuit opened after {self._consecutive_failures} consecutive failures ({self.open_seconds:.0f}s)")
+
+class TTSSessionPool:
+    """Долгоживущий event loop и пул соединений TTS, общий для всех чанков и видео"""
+    
+    def __init__(self, limit: int = 16, keepalive_timeout: float = 60.0, health_check_interval: float = 300.0):
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self.health_check_interval = health_check_interval
+        
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._connector = None
+        self._session = None
+        self._health_lock = None
+        self._last_health_check = 0.0
+        self._suspect = False
+        self.stats = {'connectors_created': 0, 'sessions_created': 0, 'health_checks': 0, 'recycled': 0}
+    
+    def _ensure_loop(self):
+        """Запуск фонового потока с event loop (один на процесс обработки)"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='tts-session-loop', daemon=True)
+                self._thread.start()
+            return self._loop
+    
+    def run(self, coro, timeout: float = None):
+        """Выполнение корутины в постоянном event loop пула (вызов из любого потока)"""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+    
+    def _owns_current_loop(self) -> bool:
+        """Соединения пула привязаны к его loop - в чужом loop (asyncio.run) пул не используется"""
+        try:
+            return self._loop is not None and asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+    
+    def connector(self):
+        """Общий aiohttp коннектор (None вне loop пула)"""
+        if not self._owns_current_loop():
+            return None
+        
+        if self._connector is None or self._connector.closed:
+            import aiohttp
+            
+            class PooledTCPConnector(aiohttp.TCPConnector):
+                """Коннектор, который не закрывается клиентскими сессиями (edge_tts закрывает свою ClientSession)"""
+                
+                pinned = True
+                
+                def close(self, *args, **kwargs):
+                    if self.pinned:
+                        done = asyncio.get_running_loop().create_future()
+                        done.set_result(None)
+                        return done
+                    return super().close(*args, **kwargs)
+            
+            self._connector = PooledTCPConnector(
+                limit=self.limit, keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.health_check_interval
+            )
+            self.stats['connectors_created'] += 1
+        return self._connector
+    
+    def session(self):
+        """Общая aiohttp ClientSession поверх коннектора пула (None вне loop пула)"""
+        connector = self.connector()
+        if connector is None:
+            return None
+        
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(connector=connector, connector_owner=False)
+            self.stats['sessions_created'] += 1
+        return self._session
+    
+    def mark_suspect(self):
+        """Ошибка запроса: перед следующим запросом проверить соединения"""
+        self._suspect = True
+    
+    async def ensure_healthy(self, backend) -> bool:
+        """Проверка здоровья соединений (не чаще health_check_interval, сразу после ошибок)"""
+        if not self._owns_current_loop():
+            return True
+        
+        if self._health_lock is None:
+            self._health_lock = asyncio.Lock()
+        
+        async with self._health_lock:
+            if not self._suspect and time.monotonic() - self._last_health_check < self.health_check_interval:
+                return True
+            
+            self.stats['health_checks'] += 1
+            try:
+                healthy = await asyncio.wait_for(backend.health_check(), timeout=15)
+            except Exception as e:
+                logger.warning(f"⚠️ TTS health check failed: {e}")
+                healthy = False
+            
+            if not healthy:
+                # Пересоздаем коннектор: старые соединения могли оборваться
+                await self._close_connections()
+                self.stats['recycled'] += 1
+                logger.info(f"♻️ TTS connections recycled ({backend.describe()})")
+            
+            self._suspect = False
+            self._last_health_check = time.monotonic()
+            return healthy
+    
+    async def _close_connections(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._connector is not None and not self._connector.closed:
+            self._connector.pinned = False
+            await self._connector.close()
+        self._session = None
+        self._connector = None
+    
+    def close(self):
+        """Закрытие соединений и остановка event loop пула"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+        
+        if loop is None or loop.is_closed():
+            return
+        
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_connections(), loop).result(10)
+        except Exception as e:
+            logger.debug(f"TTS session pool close: {e}")
+        
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+        loop.close()
+        self._health_lock = None
+        self._last_health_check = 0.0
+
+class TTSBackend:
+    """Базовый интерфейс TTS бэкенда: синтез текста в MP3 байты и тайминги слов"""
+    
+    name = 'base'
+    
+    # TTSSessionPool для переиспользования соединений (None - соединение на каждый запрос)
+    pool = None
+    
+    async def synthesize(self, text: str, voice_name: str, rate_param: str):
+        """Возвращает (mp3_bytes, [{'word', 'start', 'end'}, ...]) - время в секундах от начала"""
+        raise NotImplementedError
+    
+    async def health_check(self) -> bool:
+        """Проверка доступности сервиса через соединения пула"""
+        return True
+    
+    def describe(self) -> str:
+        return self.name
+
+class EdgeTTSBackend(TTSBackend):
+    """Бэкенд Microsoft Edge TTS (edge_tts.Communicate)"""
+    
+    name = 'edge'
+    
+    # edge-tts отдает offset/duration в тиках по 100 нс
+    TICKS_PER_SECOND = 10_000_000
+    
+    def _create_communicate(self, text: str, voice_name: str, rate_param: str, connector=None):
+        """Создание edge_tts.Communicate с запросом WordBoundary событий и общим коннектором"""
+        # edge-tts >= 7 по умолчанию отдает SentenceBoundary
+        kwargs = {'boundary': "WordBoundary"}
+        if connector is not None:
+            kwargs['connector'] = connector
+        
+        # Старые версии edge-tts не знают connector/boundary - убираем по одному
+        while True:
+            try:
+                return edge_tts.Communicate(text=text, voice=voice_name, rate=rate_param, **kwargs)
+            except TypeError:
+                if not kwargs:
+                    raise
+                kwargs.popitem()
+    
+    async def health_check(self) -> bool:
+        connector = self.pool.connector() if self.pool else None
+        try:
+            voices = await edge_tts.list_voices(connector=connector)
+        except TypeError:
+            voices = await edge_tts.list_voices()
+        return bool(voices)
+    
+    async def synthesize(self, text: str, voice_name: str, rate_param: str):
+        connector = self.pool.connector() if self.pool else None
+        communicate = self._create_communicate(text, voice_name, rate_param, connector)
+        
+        audio_data = bytearray()
+        word_boundaries = []
+        
+        async for message in communicate.stream():
+            if message['type'] == 'audio':
+                audio_data.extend(message['data'])
+            elif message['type'] == 'WordBoundary':
+                start = message['offset'] / self.TICKS_PER_SECOND
+                end = (message['offset'] + message['duration']) / self.TICKS_PER_SECOND
+                word_boundaries.append({'word': message['text'], 'start': start, 'end': end})
+        
+        return bytes(audio_data), word_boundaries
+
+class StandInTTSBackend(TTSBackend):
+    """Клиент локального stand-in сервера (tts_standin_server.py) для нагрузочных тестов"""
+    
+    name = 'standin'
+    
+    def __init__(self, url: str = 'http://127.0.0.1:8765'):
+        self.url = url.rstrip('/')
+    
+    def describe(self) -> str:
+        return f"{self.name} ({self.url})"
+    
+    async def synthesize(self, text: str, voice_name: str, rate_param: str):
+        import base64
+        import aiohttp
+        
+        payload = {'text': text, 'voice': voice_name, 'rate': rate_param}
+        session = self.pool.session() if self.pool else None
+        if session is not None:
+            data = await self._post(session, payload)
+        else:
+            async with aiohttp.ClientSession() as session:
+                data = await self._post(session, payload)
+        
+        return base64.b64decode(data['audio']), data['words']
+    
+    async def _post(self, session, payload: dict):
+        async with session.post(f"{self.url}/synthesize", json=payload) as response:
+            if response.status == 429:
+                raise Exception(f"Stand-in TTS throttled (retry after {response.headers.get('Retry-After', '?')}s)")
+            if response.status != 200:
+                raise Exception(f"Stand-in TTS error {response.status}: {await response.text()}")
+            return await response.json()
+    
+    async def health_check(self) -> bool:
+        session = self.pool.session() if self.pool else None
+        if session is None:
+            return True
+        async with session.get(f"{self.url}/stats") as response:
+            return response.status == 200
+
+TTS_BACKENDS = {
+    'edge': EdgeTTSBackend,
+    'standin': StandInTTSBackend,
+}
+
 class SmartTTSProcessor:
     """🔧 v4.2 ИСПРАВЛЕННЫЙ процессор TTS с фиксом синхронизации"""
     
@@ -698,6 +1077,27 @@ class SmartTTSProcessor:
         self.max_retries = 7
         self.base_retry_delay = 1.5
         self.max_retry_delay = 10
+        self.request_timeout = 60
+        self.hedge_percentile = 95
+        self.min_hedge_delay = 1.0
+        
+        # Общие для всех чанков и видео: статистика задержек и circuit breaker
+        self.latency_stats = TTSLatencyStats()
+        self.circuit_breaker = TTSCircuitBreaker()
+        self._hedge_count = 0
+        
+        # TTS бэкенд (edge-tts или локальный stand-in сервер) и пул соединений,
+        # живущий между чанками и видео
+        self.session_pool = TTSSessionPool()
+        self.backend = EdgeTTSBackend()
+        
+        # Адаптивное разбиение: измеренные скорость речи и задержка от размера чанка
+        self.default_chars_per_second = 15.0
+        self.min_chunk_chars = 200
+        self._voice_chars_per_second = {}
+        self._size_latency_samples = deque(maxlen=100)
+        # Поправка прогноза длительности озвучки (паузы между фразами, хвостовая тишина)
+        self._voice_duration_factor = {}
         
         # 🔧 v4.2 ИСПРАВЛЕНИЕ: Очистка состояния для предотвращения рассинхрона
         self._reset_state()
@@ -706,61 +1106,17 @@ class SmartTTSProcessor:
         """🔧 v4.2 НОВОЕ: Сброс внутреннего состояния для предотвращения рассинхрона"""
         self._last_language = None
         self._last_voice = None
+        self._text_language = None
         self._chunk_counter = 0
+        # Тайминги слов из WordBoundary событий edge-tts (по номеру чанка)
+        self._chunk_word_boundaries = {}
+        self.last_word_timings = None
         # Принудительная очистка памяти
         gc.collect()
     
     def detect_language(self, text: str) -> str:
         """🔧 v4.2 ИСПРАВЛЕННОЕ: Улучшенное определение языка"""
-        if not text or not text.strip():
-            return 'en'
-        
-        # Более обширная выборка для анализа
-        sample = text[:500].lower()
-        
-        # Расширенные испанские символы и слова
-        spanish_chars = ['ñ', 'á', 'é', 'í', 'ó', 'ú', 'ü', '¿', '¡', 'ç']
-        spanish_words = [
-            'el', 'la', 'los', 'las', 'de', 'del', 'que', 'y', 'es', 'en', 'un', 'una', 'se', 'no',
-            'con', 'por', 'para', 'su', 'sus', 'te', 'le', 'lo', 'me', 'nos', 'como', 'más', 'muy',
-            'todo', 'todos', 'toda', 'todas', 'este', 'esta', 'estos', 'estas', 'ese', 'esa', 'esos',
-            'esas', 'aquel', 'aquella', 'aquellos', 'aquellas', 'pero', 'si', 'sí', 'también', 'cuando',
-            'donde', 'dónde', 'cómo', 'qué', 'quién', 'cuál', 'cuánto', 'tiempo', 'año', 'día', 'casa',
-            'hacer', 'ser', 'estar', 'tener', 'haber', 'poder', 'decir', 'ir', 'ver', 'dar', 'saber',
-            'querer', 'llegar', 'pasar', 'deber', 'poner', 'parecer', 'quedar', 'creer', 'hablar',
-            'llevar', 'dejar', 'seguir', 'encontrar', 'llamar', 'venir', 'pensar', 'salir', 'volver',
-            'tomar', 'conocer', 'vivir', 'sentir', 'tratar', 'mirar', 'contar', 'empezar', 'esperar'
-        ]
-        
-        # Проверяем специальные испанские символы (высокий приоритет)
-        spanish_char_count = sum(1 for char in spanish_chars if char in sample)
-        if spanish_char_count > 0:
-            logger.info(f"🔍 Spanish characters detected: {spanish_char_count}")
-            return 'es'
-        
-        # Разбиваем на слова и анализируем
-        words = sample.split()
-        if len(words) == 0:
-            return 'en'
-        
-        # Подсчитываем испанские слова
-        spanish_word_count = sum(1 for word in words if word in spanish_words)
-        spanish_percentage = spanish_word_count / len(words)
-        
-        logger.info(f"🔍 Language detection: Spanish words: {spanish_word_count}/{len(words)} ({spanish_percentage:.2%})")
-        
-        # Более строгий порог для определения испанского
-        if spanish_percentage > 0.15:  # Если более 15% слов испанские
-            return 'es'
-        
-        # Дополнительная проверка на испанские окончания
-        spanish_endings = ['ción', 'sión', 'dad', 'tad', 'mente', 'ando', 'iendo', 'ado', 'ido']
-        ending_count = sum(1 for word in words for ending in spanish_endings if word.endswith(ending))
-        if ending_count > len(words) * 0.05:  # Если более 5% слов имеют испанские окончания
-            logger.info(f"🔍 Spanish endings detected: {ending_count}")
-            return 'es'
-        
-        return 'en'
+        return detect_text_language(text)
     
     def split_text_by_paragraphs(self, text: str) -> list:
         """Умное разделение текста по абзацам"""
@@ -811,15 +1167,277 @@ class SmartTTSProcessor:
         logger.info(f"📝 Text split into {len(chunks)} chunks")
         return chunks
     
+    def configure_backend(self, config: dict):
+        """Выбор TTS бэкенда по конфигурации ('edge' или 'standin')"""
+        backend_name = config.get('tts_backend', 'edge')
+        
+        if backend_name not in TTS_BACKENDS:
+            logger.warning(f"⚠️ Unknown TTS backend '{backend_name}', using edge")
+            backend_name = 'edge'
+        
+        if backend_name == 'standin':
+            url = config.get('tts_standin_url', 'http://127.0.0.1:8765')
+            if not (isinstance(self.backend, StandInTTSBackend) and self.backend.url == url.rstrip('/')):
+                self.backend = StandInTTSBackend(url)
+        elif not isinstance(self.backend, TTS_BACKENDS[backend_name]):
+            self.backend = TTS_BACKENDS[backend_name]()
+        
+        self.backend.pool = self.session_pool if config.get('tts_session_reuse', True) else None
+        return self.backend
+    
+    def run_sync(self, coro, timeout: float = None):
+        """Запуск TTS корутины в постоянном event loop пула соединений"""
+        return self.session_pool.run(coro, timeout)
+    
+    def close_sessions(self):
+        """Закрытие пула соединений (после пакетной обработки)"""
+        self.session_pool.close()
+        self.circuit_breaker.release_probe()
+    
+    def estimate_chars_per_second(self, voice_name: str, speed: float = 1.0) -> float:
+        """Скорость речи голоса (символов в секунду): измеренная или по умолчанию"""
+        # Измеренная скорость хранится приведенной к speed = 1.0
+        measured = self._voice_chars_per_second.get(voice_name)
+        return (measured or self.default_chars_per_second) * max(0.25, speed)
+    
+    def record_chunk_metrics(self, voice_name: str, chars: int, latency: float, speech_seconds: float, speed: float = 1.0):
+        """Учет скорости речи и задержки запроса для подстройки размера чанков"""
+        self._size_latency_samples.append((chars, latency))
+        if speech_seconds > 1.0:
+            cps = chars / speech_seconds / max(0.25, speed)
+            previous = self._voice_chars_per_second.get(voice_name)
+            self._voice_chars_per_second[voice_name] = cps if previous is None else 0.8 * previous + 0.2 * cps
+    
+    def predict_duration(self, text: str, config: dict) -> float:
+        """Прогноз длительности озвучки по длине текста, скорости голоса и speed"""
+        duration = 0.0
+        for language, run_text in self.get_language_runs(text, config):
+            voice_name = self.voice_mapping[language][config['voice_preset'][language]]
+            chars_per_second = self.estimate_chars_per_second(voice_name, config.get('speed', 1.0))
+            factor = self._voice_duration_factor.get(voice_name, 1.0)
+            duration += len(run_text.strip()) / chars_per_second * factor
+        return duration
+    
+    def record_narration_duration(self, text: str, config: dict, actual_duration: float):
+        """Учет фактической длительности озвучки для уточнения следующих прогнозов: поправка делится
+        между голосами языковых фрагментов по их доле в прогнозе (как в predict_duration)"""
+        if actual_duration <= 0 or not text.strip():
+            return
+        
+        predicted = {}
+        for language, run_text in self.get_language_runs(text, config):
+            voice_name = self.voice_mapping[language][config['voice_preset'][language]]
+            chars_per_second = self.estimate_chars_per_second(voice_name, config.get('speed', 1.0))
+            factor = self._voice_duration_factor.get(voice_name, 1.0)
+            predicted[voice_name] = predicted.get(voice_name, 0.0) + len(run_text.strip()) / chars_per_second * factor
+        
+        total_prediction = sum(predicted.values())
+        if total_prediction <= 0:
+            return
+        correction = actual_duration / total_prediction
+        
+        for voice_name, voice_prediction in predicted.items():
+            share = voice_prediction / total_prediction
+            factor = self._voice_duration_factor.get(voice_name, 1.0)
+            # Первая оценка голоса принимается целиком, дальше - сглаживание 0.7/0.3
+            weight = (1.0 if voice_name not in self._voice_duration_factor else 0.3) * share
+            self._voice_duration_factor[voice_name] = factor + weight * (factor * correction - factor)
+    
+    def fit_latency_model(self):
+        """Линейная модель задержки: latency = overhead + per_char * chars (None пока мало данных)"""
+        samples = list(self._size_latency_samples)
+        if len(samples) < 5:
+            return None
+        
+        n = len(samples)
+        mean_x = sum(x for x, _ in samples) / n
+        mean_y = sum(y for _, y in samples) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+        if var_x <= 0:
+            return None
+        
+        per_char = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x
+        overhead = mean_y - per_char * mean_x
+        if per_char <= 0:
+            return None
+        return max(0.0, overhead), per_char
+    
+    def tune_target_chunk_chars(self, config: dict, voice_name: str) -> int:
+        """Целевой размер чанка в символах из целевой длительности и измерений задержки"""
+        target_seconds = config.get('tts_target_chunk_seconds', 20)
+        target_chars = target_seconds * self.estimate_chars_per_second(voice_name, config.get('speed', 1.0))
+        
+        model = self.fit_latency_model()
+        if model:
+            overhead, per_char = model
+            # Фиксированные затраты запроса не должны превышать ~20% его времени
+            overhead_floor = 4 * overhead / per_char
+            if overhead_floor > target_chars:
+                logger.info(f"📐 Request overhead {overhead:.2f}s dominates, growing chunks to {overhead_floor:.0f} chars")
+                target_chars = overhead_floor
+        
+        return int(max(self.min_chunk_chars, min(self.max_chunk_size, target_chars)))
+    
+    def split_text_adaptive(self, text: str, target_chars: int) -> list:
+        """Разбиение по предложениям на сбалансированные чанки около target_chars"""
+        import re
+        
+        sentences = []
+        for paragraph in re.split(r'\n\s*\n|\n', text):
+            for sentence in re.split(r'(?<=[.!?…])\s+', paragraph.strip()):
+                sentence = sentence.strip()
+                if not sentence:
+                    continue
+                # Слишком длинные предложения режем по словам
+                while len(sentence) > self.max_chunk_size:
+                    cut = sentence.rfind(' ', 0, self.max_chunk_size)
+                    if cut <= 0:
+                        cut = self.max_chunk_size
+                    sentences.append(sentence[:cut].strip())
+                    sentence = sentence[cut:].strip()
+                if sentence:
+                    sentences.append(sentence)
+        
+        if not sentences:
+            return []
+        
+        total_chars = sum(len(sentence) + 1 for sentence in sentences)
+        chunk_count = max(1, round(total_chars / max(1, target_chars)))
+        while total_chars / chunk_count > self.max_chunk_size:
+            chunk_count += 1
+        ideal_size = total_chars / chunk_count
+        
+        # Границы чанков - на концах предложений, ближайших к k * ideal_size
+        cumulative = []
+        position = 0
+        for sentence in sentences:
+            position += len(sentence) + 1
+            cumulative.append(position)
+        
+        boundaries = []
+        index = 0
+        for k in range(1, chunk_count):
+            target = k * ideal_size
+            while index < len(sentences) - 2 and abs(cumulative[index + 1] - target) <= abs(cumulative[index] - target):
+                index += 1
+            if index < len(sentences) - 1 and (not boundaries or index > boundaries[-1]):
+                boundaries.append(index)
+        
+        chunks = []
+        start = 0
+        for boundary in boundaries + [len(sentences) - 1]:
+            current = []
+            for sentence in sentences[start:boundary + 1]:
+                # Страховка от превышения лимита сервиса
+                if current and len(' '.join(current)) + len(sentence) + 1 > self.max_chunk_size:
+                    chunks.append(' '.join(current))
+                    current = []
+                current.append(sentence)
+            if current:
+                chunks.append(' '.join(current))
+            start = boundary + 1
+        
+        sizes = [len(chunk) for chunk in chunks]
+        logger.info(f"📝 Adaptive split: {len(chunks)} chunks, target {target_chars} chars, sizes {min(sizes)}-{max(sizes)}")
+        return chunks
+    
+    def get_language_runs(self, text: str, config: dict) -> list:
+        """Участки текста одного языка: [(язык, текст), ...]"""
+        if config.get('tts_paragraph_languages', True):
+            return split_language_runs(text)
+        return [(self.detect_language(text), text)]
+    
+    def split_text_by_language(self, text: str, config: dict) -> list:
+        """Чанки TTS с языком каждого: [(язык, чанк), ...]. Чанк не пересекает смену языка"""
+        chunks = []
+        for language, run_text in self.get_language_runs(text, config):
+            voice_name = self.voice_mapping[language][config['voice_preset'][language]]
+            chunks.extend((language, chunk) for chunk in self.split_text_for_tts(run_text, config, voice_name))
+        return chunks
+    
+    def split_text_for_tts(self, text: str, config: dict, voice_name: str) -> list:
+        """Выбор режима разбиения текста для TTS"""
+        if config.get('tts_chunk_mode', 'adaptive') == 'adaptive':
+            return self.split_text_adaptive(text, self.tune_target_chunk_chars(config, voice_name))
+        if len(text) <= self.max_chunk_size:
+            return [text]
+        return self.split_text_by_paragraphs(text)
+    
     def calculate_retry_delay(self, attempt: int) -> float:
         """Экспоненциальная задержка между попытками"""
         delay = self.base_retry_delay * (2 ** (attempt - 1))
         return min(delay, self.max_retry_delay)
     
-    async def generate_audio_chunk_with_retry(self, text_chunk: str, output_file: Path, config: dict, chunk_num: int):
+    async def synthesize_chunk(self, text: str, voice_name: str, rate_param: str):
+        """Синтез одного чанка через текущий бэкенд: MP3 байты и тайминги слов"""
+        return await self.backend.synthesize(text, voice_name, rate_param)
+    
+    async def _timed_synthesis(self, text: str, voice_name: str, rate_param: str):
+        """Одна попытка синтеза с записью задержки в гистограмму"""
+        started = time.monotonic()
+        try:
+            result = await self.synthesize_chunk(text, voice_name, rate_param)
+        except asyncio.CancelledError:
+            self.latency_stats.record(time.monotonic() - started, 'cancelled')
+            raise
+        except Exception:
+            self.latency_stats.record(time.monotonic() - started, 'error')
+            raise
+        self.latency_stats.record(time.monotonic() - started, 'ok')
+        return result
+    
+    async def synthesize_hedged(self, text: str, voice_name: str, rate_param: str, chunk_num: int, hedging: bool = True):
+        """Синтез с дублирующим запросом, если чанк дольше наблюдаемого p95 (побеждает первый)"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.request_timeout
+        
+        hedge_delay = self.latency_stats.percentile(self.hedge_percentile) if hedging else None
+        hedge_at = started + max(hedge_delay, self.min_hedge_delay) if hedge_delay else None
+        
+        pending = {asyncio.ensure_future(self._timed_synthesis(text, voice_name, rate_param))}
+        hedged = False
+        last_error = None
+        
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    self.latency_stats.record(now - started, 'timeout')
+                    raise asyncio.TimeoutError()
+                
+                wake_at = deadline if hedged or hedge_at is None else min(deadline, hedge_at)
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, wake_at - now), return_when=asyncio.FIRST_COMPLETED)
+                
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                
+                if pending and not hedged and hedge_at is not None and loop.time() >= hedge_at:
+                    hedged = True
+                    self._hedge_count += 1
+                    logger.info(f"🪁 Chunk {chunk_num} slower than p95 ({hedge_delay:.1f}s), firing hedged request")
+                    pending.add(asyncio.ensure_future(self._timed_synthesis(text, voice_name, rate_param)))
+            
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def get_latency_histogram(self) -> dict:
+        """Гистограмма задержек TTS попыток и перцентили"""
+        summary = self.latency_stats.summary()
+        summary['hedged_requests'] = self._hedge_count
+        summary['circuit_state'] = self.circuit_breaker.state
+        summary['session_pool'] = dict(self.session_pool.stats)
+        return summary
+    
+    async def generate_audio_chunk_with_retry(self, text_chunk: str, output_file: Path, config: dict, chunk_num: int, language: str = None):
         """🔧 v4.2 ИСПРАВЛЕННАЯ генерация аудио с правильным определением языка"""
         # 🔧 v4.2 КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Используем единое определение языка
-        language = self.detect_language(text_chunk)
+        # (язык абзаца из разбиения, иначе - по самому чанку)
+        language = language or self.detect_language(text_chunk)
         voice_key = config['voice_preset'][language]
         voice_name = self.voice_mapping[language][voice_key]
         
@@ -831,13 +1449,12 @@ class SmartTTSProcessor:
             logger.info(f"🔄 v4.2: Language/voice change detected: {language}/{voice_name}")
             self._last_language = language
             self._last_voice = voice_name
-            # Небольшая пауза для стабилизации
-            await asyncio.sleep(0.5)
         
         speed_percent = int((config['speed'] - 1) * 100)
         rate_param = f"+{speed_percent}%" if speed_percent >= 0 else f"{speed_percent}%"
         
         for attempt in range(self.max_retries):
+            probe = False
             try:
                 logger.info(f"🎤 v4.2: Generating chunk {chunk_num}, attempt {attempt + 1}/{self.max_retries} ({language})")
                 
@@ -851,21 +1468,31 @@ class SmartTTSProcessor:
                     except:
                         pass
                 
+                # Общий circuit breaker: при явном отказе сервиса ждут все чанки
+                probe = await self.circuit_breaker.before_request()
+                if self.backend.pool:
+                    await self.backend.pool.ensure_healthy(self.backend)
+                request_started = time.monotonic()
+                
                 # 🔧 v4.2 ИСПРАВЛЕНИЕ: Более стабильная генерация с правильным голосом
-                communicate = edge_tts.Communicate(
-                    text=text_chunk.strip(),
-                    voice=voice_name,
-                    rate=rate_param
+                # Таймаут и hedged запрос внутри synthesize_hedged
+                audio_data, word_boundaries = await self.synthesize_hedged(
+                    text_chunk.strip(), voice_name, rate_param, chunk_num, hedging=config.get('tts_hedging', True)
                 )
                 
-                # Добавляем таймаут для предотвращения зависания
-                await asyncio.wait_for(communicate.save(str(output_file)), timeout=60)
+                if audio_data:
+                    with open(output_file, 'wb') as f:
+                        f.write(audio_data)
                 
                 if output_file.exists():
                     file_size = output_file.stat().st_size
                     if file_size > 2000:
-                        logger.info(f"✅ v4.2: Chunk {chunk_num} generated successfully ({file_size} bytes, {language})")
+                        logger.info(f"✅ v4.2: Chunk {chunk_num} generated successfully ({file_size} bytes, {len(word_boundaries)} words, {language})")
+                        self._chunk_word_boundaries[chunk_num] = word_boundaries
                         self._chunk_counter += 1
+                        speech_seconds = word_boundaries[-1]['end'] if word_boundaries else 0.0
+                        self.record_chunk_metrics(voice_name, len(text_chunk), time.monotonic() - request_started, speech_seconds, config.get('speed', 1.0))
+                        self.circuit_breaker.record_success()
                         return True
                     else:
                         logger.warning(f"⚠️ Chunk {chunk_num}: File too small ({file_size} bytes)")
@@ -873,11 +1500,22 @@ class SmartTTSProcessor:
                             output_file.unlink()
                 else:
                     logger.warning(f"⚠️ Chunk {chunk_num}: File not created")
+                
+                self.circuit_breaker.record_failure()
                     
             except asyncio.TimeoutError:
                 logger.error(f"❌ Chunk {chunk_num} attempt {attempt + 1}: Timeout")
+                self.circuit_breaker.record_failure()
             except Exception as e:
                 logger.error(f"❌ Chunk {chunk_num} attempt {attempt + 1} failed: {e}")
+                self.circuit_breaker.record_failure()
+                if self.backend.pool:
+                    self.backend.pool.mark_suspect()
+            finally:
+                # CancelledError (таймаут generate_voice) не попадает в except: пробный запрос
+                # без success/failure иначе навсегда оставил бы breaker в half_open
+                if probe:
+                    self.circuit_breaker.release_probe()
                 
             if output_file.exists():
                 try:
@@ -893,6 +1531,42 @@ class SmartTTSProcessor:
         logger.error(f"❌ Chunk {chunk_num} failed after {self.max_retries} attempts")
         return False
     
+    def get_audio_duration(self, audio_file: Path) -> float:
+        """Получение длительности аудио чанка"""
+        return get_duration(audio_file)
+    
+    def build_word_timings(self, chunk_offsets: list):
+        """Сборка таймингов слов в формате результата Whisper (segments/words) со сдвигом чанков"""
+        segments = []
+        
+        for chunk_num, offset in chunk_offsets:
+            boundaries = self._chunk_word_boundaries.get(chunk_num)
+            if not boundaries:
+                # Без таймингов хотя бы одного чанка субтитры разъедутся - отдаем Whisper
+                logger.warning(f"⚠️ No word boundaries for chunk {chunk_num}, falling back to Whisper")
+                return None
+            
+            words = [
+                {'word': ' ' + b['word'], 'start': b['start'] + offset, 'end': b['end'] + offset}
+                for b in boundaries
+            ]
+            segments.append({
+                'start': words[0]['start'],
+                'end': words[-1]['end'],
+                'text': ''.join(w['word'] for w in words),
+                'words': words
+            })
+        
+        if not segments:
+            return None
+        
+        logger.info(f"⏱️ Word timings from TTS: {sum(len(s['words']) for s in segments)} words in {len(segments)} chunks")
+        return {
+            'text': ''.join(s['text'] for s in segments),
+            'segments': segments,
+            'language': self._text_language or self._last_language
+        }
+    
     def merge_audio_files_robust(self, audio_files: list, output_file: Path):
         """Надежное объединение аудио файлов"""
         try:
@@ -911,31 +1585,44 @@ class SmartTTSProcessor:
                 logger.info("✅ Single audio file copied")
                 return True
             
-            temp_list_file = output_file.parent / "temp_audio_list.txt"
+            success = False
             
-            try:
-                with open(temp_list_file, 'w', encoding='utf-8') as f:
-                    for audio_file in valid_files:
-                        escaped_path = str(audio_file).replace('\\', '/').replace("'", "'\"'\"'")
-                        f.write(f"file '{escaped_path}'\n")
-                
-                cmd = [
-                    'ffmpeg', '-f', 'concat', '-safe', '0',
-                    '-i', str(temp_list_file),
-                    '-c', 'copy', '-y', str(output_file)
-                ]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-                success = result.returncode == 0
-                
+            # Чанки одного сервиса - однотипные MP3: склеиваем кадры в процессе
+            if output_file.suffix.lower() == '.mp3' and all(f.suffix.lower() == '.mp3' for f in valid_files):
+                started = time.monotonic()
+                success = concat_mp3_files(valid_files, output_file)
                 if success:
-                    logger.info(f"✅ Merged {len(valid_files)} audio files")
+                    logger.info(f"✅ Merged {len(valid_files)} audio files in-process ({time.monotonic() - started:.2f}s)")
                 else:
-                    logger.error(f"❌ Audio merge failed: {result.stderr}")
+                    logger.info("ℹ️ Falling back to ffmpeg concat for audio merge")
+            
+            if not success:
+                # Имя списка привязано к выходному файлу: задачи в общей папке не пересекаются
+                temp_list_file = output_file.with_name(f"{output_file.stem}_concat_list.txt")
                 
-            finally:
-                if temp_list_file.exists():
-                    temp_list_file.unlink()
+                try:
+                    with open(temp_list_file, 'w', encoding='utf-8') as f:
+                        for audio_file in valid_files:
+                            escaped_path = str(audio_file).replace('\\', '/').replace("'", "'\"'\"'")
+                            f.write(f"file '{escaped_path}'\n")
+                    
+                    cmd = [
+                        'ffmpeg', '-f', 'concat', '-safe', '0',
+                        '-i', str(temp_list_file),
+                        '-c', 'copy', '-y', str(output_file)
+                    ]
+                    
+                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+                    success = result.returncode == 0
+                    
+                    if success:
+                        logger.info(f"✅ Merged {len(valid_files)} audio files")
+                    else:
+                        logger.error(f"❌ Audio merge failed: {result.stderr}")
+                
+                finally:
+                    if temp_list_file.exists():
+                        temp_list_file.unlink()
             
             if success:
                 for audio_file in valid_files:
@@ -966,32 +1653,58 @@ class SmartTTSProcessor:
                 progress_tracker.update_progress(5, "Preparing text for TTS v4.2")
             
             language = self.detect_language(text)
+            self._text_language = language
             voice_key = config['voice_preset'][language]
             if voice_key not in self.voice_mapping[language]:
                 logger.error(f"❌ Invalid voice key: {voice_key}")
                 return None
             
-            logger.info(f"🎤 v4.2: TTS for language: {language}, voice: {voice_key}")
+            self.configure_backend(config)
+            logger.info(f"🎤 v4.2: TTS for language: {language}, voice: {voice_key}, backend: {self.backend.describe()}")
+            
+            if progress_tracker:
+                progress_tracker.update_progress(10, "Splitting text")
+            
+            # Язык определяется по абзацам: смешанный сценарий озвучивается разными голосами
+            language_chunks = self.split_text_by_language(text, config)
+            for chunk_language, _ in language_chunks:
+                if config['voice_preset'][chunk_language] not in self.voice_mapping[chunk_language]:
+                    logger.error(f"❌ Invalid voice key: {config['voice_preset'][chunk_language]}")
+                    return None
+            
+            text_chunks = [chunk for _, chunk in language_chunks]
+            chunk_languages = [chunk_language for chunk_language, _ in language_chunks]
             
-            if len(text) <= self.max_chunk_size:
-                return await self.generate_single_audio(text, output_file, config, progress_tracker)
+            if len(text_chunks) <= 1:
+                result = await self.generate_single_audio(text, output_file, config, progress_tracker, chunk_languages[0] if chunk_languages else None)
             else:
-                return await self.generate_long_audio(text, output_file, config, progress_tracker)
+                result = await self.generate_long_audio(text_chunks, output_file, config, progress_tracker, chunk_languages)
+            
+            if result:
+                self.record_narration_duration(text, config, self.get_audio_duration(output_file))
+            
+            stats = self.get_latency_histogram()
+            p95 = f"{stats['p95']:.2f}s" if stats['p95'] is not None else "n/a"
+            logger.info(f"📊 TTS latency: {stats['attempts']} attempts, p95={p95}, hedged={stats['hedged_requests']}, circuit={stats['circuit_state']}")
+            logger.info(f"📊 TTS latency histogram: {stats['histogram']}")
+            return result
                 
         except Exception as e:
             logger.error(f"❌ TTS generation failed: {e}")
             logger.error(f"❌ Traceback: {traceback.format_exc()}")
             return None
     
-    async def generate_single_audio(self, text: str, output_file: Path, config: dict, progress_tracker: ModernProgressTracker = None):
+    async def generate_single_audio(self, text: str, output_file: Path, config: dict, progress_tracker: ModernProgressTracker = None, language: str = None):
         """Генерация аудио для короткого текста"""
         try:
             if progress_tracker:
                 progress_tracker.update_progress(20, "Generating single audio file")
             
-            success = await self.generate_audio_chunk_with_retry(text, output_file, config, 1)
+            success = await self.generate_audio_chunk_with_retry(text, output_file, config, 1, language)
             
             if success:
+                if config.get('tts_word_timings', True):
+                    self.last_word_timings = self.build_word_timings([(1, 0.0)])
                 if progress_tracker:
                     progress_tracker.update_progress(100, "Single audio generated")
                 return output_file
@@ -1003,33 +1716,42 @@ class SmartTTSProcessor:
             logger.error(f"❌ Single audio generation failed: {e}")
             return None
     
-    async def generate_long_audio(self, text: str, output_file: Path, config: dict, progress_tracker: ModernProgressTracker = None):
-        """Генерация аудио для длинного текста с разделением"""
+    async def generate_long_audio(self, text_chunks: list, output_file: Path, config: dict, progress_tracker: ModernProgressTracker = None,
+                                  chunk_languages: list = None):
+        """Генерация аудио для длинного текста: чанки синтезируются параллельно"""
         try:
-            if progress_tracker:
-                progress_tracker.update_progress(10, "Splitting long text")
-            
-            text_chunks = self.split_text_by_paragraphs(text)
-            temp_audio_files = []
             temp_dir = output_file.parent
             base_name = output_file.stem
+            temp_audio_files = [temp_dir / f"{base_name}_chunk_{i+1:03d}.mp3" for i in range(len(text_chunks))]
             
+            concurrency = max(1, config.get('tts_concurrency', 4))
+            semaphore = asyncio.Semaphore(concurrency)
+            started = time.monotonic()
+            completed = 0
             successful_chunks = 0
             
-            for i, chunk in enumerate(text_chunks):
-                chunk_file = temp_dir / f"{base_name}_chunk_{i+1:03d}.mp3"
-                temp_audio_files.append(chunk_file)
-                
-                if progress_tracker:
-                    progress = 20 + (i / len(text_chunks)) * 60
-                    progress_tracker.update_progress(progress, f"Generating chunk {i+1}/{len(text_chunks)}")
-                
-                success = await self.generate_audio_chunk_with_retry(chunk, chunk_file, config, i+1)
+            logger.info(f"🎤 Synthesizing {len(text_chunks)} chunks with concurrency {concurrency}")
+            
+            async def generate_chunk(index: int):
+                nonlocal completed, successful_chunks
+                async with semaphore:
+                    language = chunk_languages[index] if chunk_languages else None
+                    success = await self.generate_audio_chunk_with_retry(text_chunks[index], temp_audio_files[index], config, index + 1, language)
                 
+                completed += 1
                 if success:
                     successful_chunks += 1
+                    if successful_chunks == 1:
+                        logger.info(f"⚡ First audio chunk ready after {time.monotonic() - started:.1f}s")
                 else:
-                    logger.warning(f"⚠️ Chunk {i+1} failed, continuing with others...")
+                    logger.warning(f"⚠️ Chunk {index+1} failed, continuing with others...")
+                
+                if progress_tracker:
+                    progress = 20 + (completed / len(text_chunks)) * 60
+                    progress_tracker.update_progress(progress, f"Generated chunk {completed}/{len(text_chunks)}")
+            
+            await asyncio.gather(*(generate_chunk(i) for i in range(len(text_chunks))))
+            logger.info(f"⏱️ All chunks synthesized in {time.monotonic() - started:.1f}s")
             
             if successful_chunks == 0:
                 logger.error("❌ No chunks generated successfully")
@@ -1043,9 +1765,20 @@ class SmartTTSProcessor:
             if progress_tracker:
                 progress_tracker.update_progress(85, f"Merging {successful_chunks} audio chunks")
             
+            # Смещения чанков считаем до объединения: merge удаляет временные файлы
+            chunk_offsets = []
+            if config.get('tts_word_timings', True):
+                offset = 0.0
+                for i, chunk_file in enumerate(temp_audio_files):
+                    if chunk_file.exists() and chunk_file.stat().st_size > 2000:
+                        chunk_offsets.append((i + 1, offset))
+                        offset += self.get_audio_duration(chunk_file)
+            
             success = self.merge_audio_files_robust(temp_audio_files, output_file)
             
             if success:
+                if chunk_offsets:
+                    self.last_word_timings = self.build_word_timings(chunk_offsets)
                 if progress_tracker:
                     progress_tracker.update_progress(100, "Long text audio generated")
                 return output_file
@@ -1073,11 +1806,20 @@ class AdvancedSlideshowGenerator:
         self.random_transitions = config.get('random_transitions', False)
         self.available_transitions = list(TRANSITION_PRESETS.keys())
         
+        # Спекулятивный рендеринг: запас на ошибку прогноза и ожидание фактической длительности
+        self.speculative_margin = config.get('speculative_margin', 0.15)
+        self.speculative_timeout = 900
+        
         logger.info(f"🎬 v4.2: Advanced Slideshow Generator with {len(self.processor.motion_effects)} motion effects")
     
     def create_slideshow(self, img_folder: Path, output_file: Path, target_duration: float, 
-                        progress_tracker: ModernProgressTracker = None):
-        """🔧 v4.2: Создание слайдшоу с расширенными motion-эффектами"""
+                        progress_tracker: ModernProgressTracker = None, duration_future: Future = None,
+                        subtitles: SubtitleCompositor = None):
+        """🔧 v4.2: Создание слайдшоу с расширенными motion-эффектами (duration_future - спекулятивный режим,
+        subtitles - субтитры накладываются прямо в кадры)"""
+        # С duration_future target_duration - прогноз: рендеринг идет параллельно с TTS,
+        # а последние слайды ждут фактическую длительность и подгоняются под нее
+        out = None
         try:
             if progress_tracker:
                 progress_tracker.update_progress(5, "Loading images")
@@ -1117,46 +1859,154 @@ class AdvancedSlideshowGenerator:
             frame_count = 0
             
             # 🔧 v4.2 НОВОЕ: Случайный выбор motion-эффектов для каждого слайда
-            slide_effects = []
-            for i in range(len(processed_images)):
+            slides = []
+            for img in processed_images:
                 effect = random.choice(self.processor.motion_effects)
-                slide_effects.append(effect)
+                slides.append((img, effect, frames_per_slide))
             
+            slide_effects = [effect for _, effect, _ in slides]
             logger.info(f"🎬 v4.2: Using motion effects: {slide_effects[:5]}{'...' if len(slide_effects) > 5 else ''}")
             
-            for i, img in enumerate(processed_images):
-                if frame_count >= total_frames:
+            # Спекулятивный режим: последние слайды покрывают ошибку прогноза и рендерятся
+            # только после получения фактической длительности
+            reconcile_at = None
+            frame_limit = total_frames
+            if duration_future is not None:
+                held_slides = max(2, math.ceil(total_frames * self.speculative_margin / frames_per_slide))
+                reconcile_at = max(0, len(slides) - held_slides)
+                frame_limit = sys.maxsize
+                logger.info(f"🔮 Speculative slideshow: predicted {target_duration:.1f}s, holding last {len(slides) - reconcile_at} slides")
+            
+            i = 0
+            last_slide = None
+            while i < len(slides):
+                # Озвучка не удалась (duration_future отменен) - рендер прекращается сразу, а не у reconcile_at
+                if duration_future is not None and duration_future.cancelled():
+                    raise CancelledError()
+                
+                if i == reconcile_at:
+                    total_frames = self.reconcile_final_slides(slides, i, frame_count, duration_future, fps)
+                    frame_limit = total_frames
+                
+                if frame_count >= frame_limit or i >= len(slides):
                     break
                 
-                effect_type = slide_effects[i]
+                img, effect_type, slide_frames = slides[i]
+                last_slide = (img, effect_type)
                 
-                for frame_num in range(frames_per_slide):
-                    if frame_count >= total_frames:
+                for frame_num in range(slide_frames):
+                    if frame_count >= frame_limit:
                         break
+                    if duration_future is not None and frame_num % fps == 0 and duration_future.cancelled():
+                        raise CancelledError()
                     
-                    progress = frame_num / max(frames_per_slide - 1, 1)
+                    progress = frame_num / max(slide_frames - 1, 1)
                     
                     # 🔧 v4.2: Используем новые расширенные motion-эффекты
                     frame = self.processor.apply_advanced_motion_effect(img, effect_type, progress)
+                    if subtitles is not None:
+                        # При ошибке эффекта возвращается исходное изображение - его портить нельзя
+                        if frame is img:
+                            frame = frame.copy()
+                        subtitles.apply(frame, frame_count)
                     
                     out.write(frame)
                     frame_count += 1
                     
                     if progress_tracker and frame_count % (fps * 3) == 0:
-                        video_progress = 40 + (frame_count / total_frames) * 50
+                        video_progress = 40 + min(1.0, frame_count / max(total_frames, 1)) * 50
                         progress_tracker.update_progress(video_progress, f"Frame {frame_count}/{total_frames} (effect: {effect_type})")
+                
+                i += 1
+            
+            # Остаток короче секунды (спекулятивный режим) - последний кадр удерживается, без короткой вспышки
+            if reconcile_at is not None and last_slide is not None and frame_count < frame_limit:
+                hold_frame = self.processor.apply_advanced_motion_effect(last_slide[0], last_slide[1], 1.0)
+                while frame_count < frame_limit:
+                    frame = hold_frame
+                    if subtitles is not None:
+                        frame = hold_frame.copy()
+                        subtitles.apply(frame, frame_count)
+                    out.write(frame)
+                    frame_count += 1
             
             out.release()
+            out = None
             
             if progress_tracker:
-                progress_tracker.update_progress(100, f"Advanced slideshow v4.2 created ({len(slide_effects)} motion effects)")
+                progress_tracker.update_progress(100, f"Advanced slideshow v4.2 created ({len(slides)} motion effects)")
             
             logger.info(f"✅ v4.2: Advanced slideshow created with motion effects: {output_file}")
             return True
             
+        except CancelledError:
+            logger.info("ℹ️ Speculative slideshow cancelled (narration failed)")
+            return False
         except Exception as e:
             logger.error(f"❌ Advanced slideshow creation failed: {e}")
             return False
+        finally:
+            if out is not None:
+                out.release()
+    
+    def reconcile_final_slides(self, slides: list, start: int, rendered_frames: int, duration_future: Future, fps: int) -> int:
+        """Подгонка последних слайдов под фактическую длительность озвучки (возвращает итоговое число кадров)"""
+        actual_duration = duration_future.result(timeout=self.speculative_timeout)
+        total_frames = int(actual_duration * fps)
+        remaining = total_frames - rendered_frames
+        held = slides[start:]
+        
+        if remaining <= 0:
+            # Лишнее обрежет -shortest при объединении с аудио
+            del slides[start:]
+            logger.info(f"✂️ Speculative slideshow overshoot: {-remaining / fps:.1f}s will be trimmed")
+            return total_frames
+        
+        typical_frames = max(fps * 4, sum(frames for _, _, frames in held) // max(1, len(held)))
+        if remaining < fps and start > 0:
+            # Слайд короче секунды мелькнул бы - остаток добирает последний кадр отрендеренного слайда
+            del slides[start:]
+            logger.info(f"🎯 Speculative slideshow reconciled: actual {actual_duration:.1f}s, "
+                        f"last rendered slide held {remaining / fps:.1f}s longer (held {len(held)})")
+            return total_frames
+        slide_count = max(1, round(remaining / typical_frames))
+        
+        # Растягиваем/сжимаем удержанные слайды (каждый не короче секунды), при нехватке добавляем
+        # уже обработанные изображения
+        tail = [(img, effect) for img, effect, _ in held[:slide_count]]
+        while len(tail) < slide_count:
+            tail.append((random.choice(slides)[0], random.choice(self.processor.motion_effects)))
+        
+        base_frames, extra_frames = divmod(remaining, slide_count)
+        slides[start:] = [
+            (img, effect, base_frames + (1 if k < extra_frames else 0))
+            for k, (img, effect) in enumerate(tail)
+        ]
+        
+        logger.info(f"🎯 Speculative slideshow reconciled: actual {actual_duration:.1f}s, "
+                    f"final {slide_count} slides x {base_frames / fps:.1f}s (held {len(held)})")
+        return total_frames
+    
+    def start_speculative(self, img_folder: Path, output_file: Path, predicted_duration: float):
+        """Фоновый рендеринг по прогнозной длительности: (duration_future для фактической длительности, result_future)"""
+        duration_future = Future()
+        result_future = Future()
+        
+        def render():
+            try:
+                result_future.set_result(self.create_slideshow(
+                    img_folder, output_file, predicted_duration, None, duration_future
+                ))
+            except Exception as e:
+                result_future.set_exception(e)
+        
+        threading.Thread(target=render, name='speculative-slideshow', daemon=True).start()
+        return duration_future, result_future
+
+# Параметры видео слайдшоу, при которых дорожка копируется без перекодирования
+MERGE_VIDEO_TARGET = {'width': 1920, 'height': 1080, 'fps': 25}
+# profile_idc H.264 с 8 бит 4:2:0 (Baseline, Main, Extended, High) и эквиваленты ffprobe
+H264_COPY_PROFILES = {66, 77, 88, 100, 'Baseline', 'Constrained Baseline', 'Main', 'Extended', 'High'}
 
 class SmartVideoMerger:
     """Умный объединитель видео с поддержкой ориентации"""
@@ -1203,17 +2053,7 @@ class SmartVideoMerger:
     
     def get_video_duration(self, video_file: Path) -> float:
         """Получение длительности видео"""
-        try:
-            cmd = [
-                'ffprobe', '-i', str(video_file), '-show_entries', 'format=duration',
-                '-v', 'quiet', '-of', 'csv=p=0'
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                return float(result.stdout.strip())
-        except:
-            pass
-        return 0.0
+        return get_duration(video_file)
     
     def normalize_video_to_landscape(self, input_video: Path, output_video: Path, target_duration: float = None):
         """Нормализация видео к landscape (16:9) если оно вертикальное"""
@@ -1274,37 +2114,78 @@ class SmartVideoMerger:
             logger.error(f"❌ Video normalization error: {e}")
             return False
     
-    def merge_slideshow_audio_optimized(self, slideshow_file: Path, audio_file: Path, output_file: Path):
-        """Объединение slideshow + audio"""
+    def video_copy_blockers(self, video_file: Path) -> list:
+        """Причины, по которым видеодорожку нельзя скопировать без перекодирования (пусто - можно)"""
+        info = probe_media(video_file)
+        if not info or not info.get('has_video'):
+            return ["video not probed"]
+        
+        blockers = []
+        codec = info.get('video_codec')
+        if codec not in ('avc1', 'avc3', 'h264'):
+            blockers.append(f"codec {codec}")
+        elif info.get('video_profile') is not None and info['video_profile'] not in H264_COPY_PROFILES:
+            blockers.append(f"H.264 profile {info['video_profile']}")
+        if info.get('pixel_format') not in (None, 'yuv420p', 'yuvj420p'):
+            blockers.append(f"pixel format {info['pixel_format']}")
+        if (info['width'], info['height']) != (MERGE_VIDEO_TARGET['width'], MERGE_VIDEO_TARGET['height']):
+            blockers.append(f"size {info['width']}x{info['height']}")
+        if abs(info.get('fps', 0.0) - MERGE_VIDEO_TARGET['fps']) > 0.05:
+            blockers.append(f"fps {info.get('fps', 0.0):.2f}")
+        if info.get('rotation'):
+            blockers.append(f"rotation {info['rotation']}")
+        return blockers
+    
+    def merge_slideshow_audio_optimized(self, slideshow_file: Path, audio_file: Path, output_file: Path,
+                                        subtitle_file: Path = None, fonts_dir: Path = None):
+        """Объединение slideshow + audio: видео копируется, если уже H.264 1920x1080 25fps, иначе libx264
+        (subtitle_file - субтитры прожигаются в том же кодировании)"""
         try:
             logger.info("🔊 Merging slideshow + audio")
+            started = time.monotonic()
             
-            cmd = [
-                'ffmpeg',
-                '-i', str(slideshow_file),
-                '-i', str(audio_file),
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
-                '-c:a', 'aac',
-                '-b:a', '128k',
-                '-ar', '44100',
-                '-ac', '2',
-                '-map', '0:v',
-                '-map', '1:a',
-                '-avoid_negative_ts', 'make_zero',
-                '-async', '1',
-                '-shortest',
-                '-y', str(output_file)
-            ]
+            video_args = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23']
+            if subtitle_file:
+                blockers = ["subtitle burn"]
+                video_args = ['-vf', ass_filter(subtitle_file, fonts_dir)] + video_args
+            else:
+                blockers = self.video_copy_blockers(slideshow_file)
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            def merge(video_codec_args: list):
+                cmd = [
+                    'ffmpeg',
+                    '-i', str(slideshow_file),
+                    '-i', str(audio_file),
+                    *video_codec_args,
+                    '-c:a', 'aac',
+                    '-b:a', '128k',
+                    '-ar', '44100',
+                    '-ac', '2',
+                    '-map', '0:v',
+                    '-map', '1:a',
+                    '-avoid_negative_ts', 'make_zero',
+                    '-async', '1',
+                    '-shortest',
+                    '-y', str(output_file)
+                ]
+                return subprocess.run(cmd, capture_output=True, text=True)
+            
+            path = f"video re-encode ({', '.join(blockers)})"
+            if not blockers:
+                result = merge(['-c:v', 'copy'])
+                path = "video stream copy"
+                if result.returncode != 0:
+                    logger.warning(f"⚠️ Video stream copy failed, re-encoding: {result.stderr.strip()[-300:]}")
+                    path = "video re-encode (stream copy failed)"
+                    result = merge(video_args)
+            else:
+                result = merge(video_args)
             
             if result.returncode == 0:
-                logger.info("✅ Slideshow+audio merged successfully")
+                logger.info(f"✅ Slideshow+audio merged via {path} in {time.monotonic() - started:.1f}s")
                 return True
             else:
-                logger.error(f"❌ Slideshow+audio merge failed: {result.stderr}")
+                logger.error(f"❌ Slideshow+audio merge failed ({path}): {result.stderr}")
                 return False
             
         except Exception as e:
@@ -1312,7 +2193,8 @@ class SmartVideoMerger:
             return False
     
     def create_webcam_with_flips(self, auth_file: Path, target_duration: float, output_file: Path, config: dict):
-        """Создание webcam с flip horizontal (всегда 16:9!)"""
+        """Создание webcam с flip horizontal (всегда 16:9!): два кодирования (обычный и отраженный проход)
+        в размере overlay, цикл собирается склейкой без перекодирования"""
         try:
             logger.info("📹 Creating webcam with horizontal flips (16:9 format)")
             
@@ -1321,28 +2203,25 @@ class SmartVideoMerger:
                 logger.error("❌ Invalid webcam duration")
                 return False
             
-            auth_size_percent = config.get('auth_size_percent', 15)
-            
-            main_width, main_height = 1920, 1080
-            auth_width = int(main_width * auth_size_percent / 100)
-            auth_height = int(auth_width * 9 / 16)
-            
+            auth_width, auth_height, _, _ = self.webcam_geometry(config)
             logger.info(f"📹 Webcam size: {auth_width}x{auth_height}")
             
-            if target_duration <= auth_duration:
+            def encode(vf_filter: str, duration: float, target: Path):
                 cmd = [
                     'ffmpeg', '-i', str(auth_file),
-                    '-t', str(target_duration),
-                    '-vf', f'scale={auth_width}:{auth_height}',
+                    '-t', str(duration),
+                    '-vf', vf_filter,
                     '-r', '20',
                     '-c:v', 'libx264',
                     '-preset', 'fast',
                     '-crf', '28',
-                    '-c:a', 'aac',
-                    '-y', str(output_file)
+                    '-an',
+                    '-y', str(target)
                 ]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True)
+                return subprocess.run(cmd, capture_output=True, text=True)
+            
+            if target_duration <= auth_duration:
+                result = encode(f'scale={auth_width}:{auth_height}', target_duration, output_file)
                 
                 if result.returncode == 0:
                     logger.info("✅ Webcam trimmed successfully (16:9)")
@@ -1350,116 +2229,96 @@ class SmartVideoMerger:
                 else:
                     logger.error(f"❌ Webcam trim failed: {result.stderr}")
                     return False
-            else:
-                cycles_needed = math.ceil(target_duration / auth_duration)
-                logger.info(f"🔄 Creating {cycles_needed} cycles with flips")
-                
-                temp_dir = output_file.parent
-                cycle_files = []
-                
-                for cycle in range(cycles_needed):
-                    cycle_file = temp_dir / f"temp_webcam_cycle_{cycle}.mp4"
-                    cycle_files.append(cycle_file)
-                    
-                    if cycle % 2 == 0:
-                        vf_filter = f'scale={auth_width}:{auth_height}'
-                    else:
-                        vf_filter = f'hflip,scale={auth_width}:{auth_height}'
-                    
-                    if cycle == cycles_needed - 1:
-                        remaining_duration = target_duration - (cycle * auth_duration)
-                        cycle_duration = min(auth_duration, remaining_duration)
-                    else:
-                        cycle_duration = auth_duration
-                    
-                    cmd = [
-                        'ffmpeg', '-i', str(auth_file),
-                        '-t', str(cycle_duration),
-                        '-vf', vf_filter,
-                        '-r', '20',
-                        '-c:v', 'libx264',
-                        '-preset', 'fast',
-                        '-crf', '28',
-                        '-c:a', 'aac',
-                        '-y', str(cycle_file)
-                    ]
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    
+            
+            cycles_needed = math.ceil(target_duration / auth_duration)
+            logger.info(f"🔄 Creating {cycles_needed} cycles with flips from 2 encodes")
+            
+            temp_dir = output_file.parent
+            variants = [temp_dir / "temp_webcam_normal.mp4", temp_dir / "temp_webcam_flipped.mp4"]
+            temp_list = temp_dir / "temp_webcam_cycles_list.txt"
+            
+            try:
+                for variant, vf_filter in zip(variants, (f'scale={auth_width}:{auth_height}',
+                                                         f'hflip,scale={auth_width}:{auth_height}')):
+                    result = encode(vf_filter, auth_duration, variant)
                     if result.returncode != 0:
-                        logger.error(f"❌ Failed to create cycle {cycle}: {result.stderr}")
-                        for temp_file in cycle_files:
-                            if temp_file.exists():
-                                temp_file.unlink()
+                        logger.error(f"❌ Failed to encode {variant.name}: {result.stderr}")
                         return False
-                    
-                    flip_status = "FLIPPED" if cycle % 2 == 1 else "NORMAL"
-                    logger.info(f"✅ Cycle {cycle + 1} created ({flip_status}) - 16:9")
                 
-                temp_list = temp_dir / "temp_webcam_cycles_list.txt"
+                logger.info("✅ Webcam variants encoded (NORMAL + FLIPPED)")
                 
-                try:
-                    with open(temp_list, 'w', encoding='utf-8') as f:
-                        for cycle_file in cycle_files:
-                            escaped_path = str(cycle_file).replace('\\', '/').replace("'", "'\"'\"'")
-                            f.write(f"file '{escaped_path}'\n")
-                    
-                    cmd = [
-                        'ffmpeg', '-f', 'concat', '-safe', '0',
-                        '-i', str(temp_list),
-                        '-t', str(target_duration),
-                        '-c', 'copy',
-                        '-y', str(output_file)
-                    ]
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True)
+                with open(temp_list, 'w', encoding='utf-8') as f:
+                    for cycle in range(cycles_needed):
+                        escaped_path = str(variants[cycle % 2]).replace('\\', '/').replace("'", "'\"'\"'")
+                        f.write(f"file '{escaped_path}'\n")
+                
+                cmd = [
+                    'ffmpeg', '-f', 'concat', '-safe', '0',
+                    '-i', str(temp_list),
+                    '-t', str(target_duration),
+                    '-c', 'copy',
+                    '-y', str(output_file)
+                ]
+                
+                result = subprocess.run(cmd, capture_output=True, text=True)
+                
+                if result.returncode == 0:
+                    logger.info(f"✅ Webcam with flips created (16:9) - {cycles_needed} cycles")
+                    return True
+                else:
+                    logger.error(f"❌ Webcam cycles concat failed: {result.stderr}")
+                    return False
                     
-                    if result.returncode == 0:
-                        logger.info(f"✅ Webcam with flips created (16:9) - {cycles_needed} cycles")
-                        return True
-                    else:
-                        logger.error(f"❌ Webcam cycles concat failed: {result.stderr}")
-                        return False
+            finally:
+                for temp_file in [temp_list] + variants:
+                    if temp_file.exists():
+                        temp_file.unlink()
                         
-                finally:
-                    if temp_list.exists():
-                        temp_list.unlink()
-                    for temp_file in cycle_files:
-                        if temp_file.exists():
-                            temp_file.unlink()
-                            
         except Exception as e:
             logger.error(f"❌ Webcam with flips creation error: {e}")
             return False
     
+    def webcam_geometry(self, config: dict):
+        """Размер и позиция webcam в кадре 1920x1080: (ширина, высота, x, y)"""
+        auth_size_percent = config.get('auth_size_percent', 15)
+        auth_position = config.get('auth_position', 'bottom_left')
+        
+        main_width, main_height = 1920, 1080
+        auth_width = int(main_width * auth_size_percent / 100)
+        auth_height = int(auth_width * 9 / 16)
+        
+        if auth_position == 'bottom_left':
+            x, y = 0, main_height - auth_height
+        elif auth_position == 'bottom_right':
+            x, y = main_width - auth_width, main_height - auth_height
+        elif auth_position == 'top_left':
+            x, y = 0, 0
+        elif auth_position == 'top_right':
+            x, y = main_width - auth_width, 0
+        else:
+            x, y = 0, main_height - auth_height
+        return auth_width, auth_height, x, y
+    
     def overlay_webcam_optimized(self, slideshow_file: Path, webcam_file: Path, output_file: Path, config: dict):
         """Overlay webcam (всегда 16:9 формат!)"""
         try:
             logger.info("🎬 Overlaying webcam (16:9 format)")
             
-            auth_size_percent = config.get('auth_size_percent', 15)
             auth_position = config.get('auth_position', 'bottom_left')
+            auth_width, auth_height, x, y = self.webcam_geometry(config)
             
-            main_width, main_height = 1920, 1080
-            auth_width = int(main_width * auth_size_percent / 100)
-            auth_height = int(auth_width * 9 / 16)
-            
-            if auth_position == 'bottom_left':
-                x, y = 0, main_height - auth_height
-            elif auth_position == 'bottom_right':
-                x, y = main_width - auth_width, main_height - auth_height
-            elif auth_position == 'top_left':
-                x, y = 0, 0
-            elif auth_position == 'top_right':
-                x, y = main_width - auth_width, 0
+            # create_webcam_with_flips уже кодирует в размере overlay - повторное масштабирование не нужно
+            webcam_info = probe_media(webcam_file)
+            if webcam_info and (webcam_info['width'], webcam_info['height']) == (auth_width, auth_height):
+                overlay_graph = f'[0:v][1:v]overlay={x}:{y}[out]'
             else:
-                x, y = 0, main_height - auth_height
+                overlay_graph = f'[1:v]scale={auth_width}:{auth_height}[webcam];[0:v][webcam]overlay={x}:{y}[out]'
             
             cmd = [
                 'ffmpeg',
                 '-i', str(slideshow_file),
                 '-i', str(webcam_file),
-                '-filter_complex', f'[1:v]scale={auth_width}:{auth_height}[webcam];[0:v][webcam]overlay={x}:{y}[out]',
+                '-filter_complex', overlay_graph,
                 '-map', '[out]',
                 '-map', '0:a',
                 '-c:v', 'libx264',
@@ -1598,9 +2457,153 @@ class SmartVideoMerger:
             logger.error(f"❌ Traceback: {traceback.format_exc()}")
             return False
     
+    def clip_duration(self, clip_file: Path) -> float:
+        """Длительность интро/аутро в сборке: по видеопотоку, как его обрезает clip_filter"""
+        info = probe_media(clip_file)
+        if not info:
+            return 0.0
+        return info['video_duration'] or info['duration']
+    
+    def clip_filter(self, clip_file: Path, input_index: int, label: str):
+        """Цепочки нормализации интро/аутро к 1920x1080 25fps + стерео 44.1 кГц (тишина, если звука нет)"""
+        info = probe_media(clip_file)
+        duration = self.clip_duration(clip_file)
+        
+        if self.orientation_detector.is_vertical_video(clip_file):
+            scale = 'scale=608:1080,pad=1920:1080:(1920-608)/2:0:black'
+        else:
+            scale = 'scale=1920:1080'
+        video = (f"[{input_index}:v]{scale},fps=25,setsar=1,format=yuv420p,"
+                 f"trim=duration={duration:.3f},setpts=PTS-STARTPTS[v{label}]")
+        if info['has_audio']:
+            audio = (f"[{input_index}:a]aresample=44100,aformat=sample_fmts=fltp:channel_layouts=stereo,"
+                     f"apad,atrim=duration={duration:.3f},asetpts=PTS-STARTPTS[a{label}]")
+        else:
+            audio = f"anullsrc=r=44100:cl=stereo,atrim=duration={duration:.3f}[a{label}]"
+        return [video, audio]
+    
+    def render_final_single_pass(self, slideshow_file: Path, audio_file: Path,
+                                 intro_file: Path, outro_file: Path, auth_file: Path,
+                                 output_file: Path, config: dict, progress_tracker: ModernProgressTracker = None,
+                                 subtitle_file: Path = None, fonts_dir: Path = None):
+        """Финальное видео одним запуском ffmpeg: озвучка, прожиг субтитров, webcam с отражениями,
+        нормализация интро/аутро и склейка в одном filter_complex - одно кодирование вместо пяти"""
+        try:
+            started = time.monotonic()
+            if progress_tracker:
+                progress_tracker.update_progress(10, "Single-pass render: building filtergraph")
+            
+            main_duration = min(self.get_video_duration(slideshow_file), self.get_video_duration(audio_file))
+            if main_duration <= 0:
+                logger.error("❌ Invalid slideshow or audio duration")
+                return False
+            
+            inputs = []
+            graph = []
+            segments = []
+            components = []
+            
+            def add_input(media_file: Path, *options) -> int:
+                inputs.extend([*options, '-i', str(media_file)])
+                return inputs.count('-i') - 1
+            
+            add_input(slideshow_file)
+            add_input(audio_file)
+            
+            if intro_file and intro_file.exists():
+                graph += self.clip_filter(intro_file, add_input(intro_file), 'intro')
+                segments.append('intro')
+                components.append("intro")
+            
+            main_chain = f"[0:v]trim=duration={main_duration:.3f},setpts=PTS-STARTPTS"
+            if subtitle_file:
+                main_chain += f",{ass_filter(subtitle_file, fonts_dir)}"
+                components.append("slideshow+audio+subtitles")
+            else:
+                components.append("slideshow+audio")
+            main_chain += ",scale=1920:1080,fps=25,setsar=1,format=yuv420p"
+            
+            auth_duration = self.get_video_duration(auth_file) if auth_file and auth_file.exists() else 0.0
+            if auth_duration > 0:
+                # Зацикленный webcam: каждый второй проход отражается по горизонтали
+                auth_index = add_input(auth_file, '-stream_loop', '-1')
+                auth_width, auth_height, x, y = self.webcam_geometry(config)
+                graph.append(f"{main_chain}[base]")
+                graph.append(f"[{auth_index}:v]scale={auth_width}:{auth_height},"
+                             f"hflip=enable='mod(floor(t/{auth_duration:.3f}),2)'[webcam]")
+                graph.append(f"[base][webcam]overlay={x}:{y}:shortest=1,format=yuv420p[vmain]")
+                components[-1] += "+webcam-FLIPS"
+            else:
+                graph.append(f"{main_chain}[vmain]")
+            graph.append(f"[1:a]aresample=44100,aformat=sample_fmts=fltp:channel_layouts=stereo,"
+                         f"apad,atrim=duration={main_duration:.3f},asetpts=PTS-STARTPTS[amain]")
+            segments.append('main')
+            
+            if outro_file and outro_file.exists():
+                graph += self.clip_filter(outro_file, add_input(outro_file), 'outro')
+                segments.append('outro')
+                components.append("outro")
+            
+            concat_inputs = ''.join(f"[v{name}][a{name}]" for name in segments)
+            graph.append(f"{concat_inputs}concat=n={len(segments)}:v=1:a=1[vout][aout]")
+            
+            cmd = [
+                'ffmpeg', *inputs,
+                '-filter_complex', ';'.join(graph),
+                '-map', '[vout]', '-map', '[aout]',
+                '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
+                '-c:a', 'aac', '-b:a', '128k', '-ar', '44100', '-ac', '2',
+                '-movflags', '+faststart',
+                '-y', str(output_file)
+            ]
+            
+            logger.info(f"🎬 SINGLE PASS: {' → '.join(components)} in one encode")
+            if progress_tracker:
+                progress_tracker.update_progress(20, f"Single-pass render: {'+'.join(components)}")
+            
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            
+            if result.returncode != 0 or not output_file.exists():
+                logger.error(f"❌ Single-pass render failed: {result.stderr[-2000:]}")
+                return False
+            
+            final_duration = self.get_video_duration(output_file)
+            if final_duration <= 0:
+                logger.error("❌ Invalid final duration")
+                return False
+            
+            if progress_tracker:
+                progress_tracker.update_progress(100, f"SINGLE PASS SUCCESS: {'+'.join(components)}")
+            file_size = output_file.stat().st_size / (1024 * 1024)
+            logger.info(f"✅ SINGLE PASS: final video in {time.monotonic() - started:.1f}s")
+            logger.info(f"📊 Size: {file_size:.1f}MB, Duration: {final_duration:.1f}s")
+            return True
+        
+        except Exception as e:
+            logger.error(f"❌ Single-pass render error: {e}")
+            return False
+    
     def create_final_video_optimized(self, slideshow_file: Path, audio_file: Path, 
                                    intro_file: Path, outro_file: Path, auth_file: Path,
-                                   output_file: Path, config: dict, progress_tracker: ModernProgressTracker = None):
+                                   output_file: Path, config: dict, progress_tracker: ModernProgressTracker = None,
+                                   subtitle_file: Path = None, fonts_dir: Path = None):
+        """Финальное видео: одним проходом ffmpeg (single_pass_render), при ошибке - поэтапная сборка.
+        subtitle_file - субтитры прожигаются в том же кодировании"""
+        # Без интро/аутро/webcam/субтитров поэтапная сборка - не больше одного кодирования (или копирование)
+        composed = subtitle_file or any(f and f.exists() for f in (intro_file, outro_file, auth_file))
+        if config.get('single_pass_render', True) and composed:
+            if self.render_final_single_pass(slideshow_file, audio_file, intro_file, outro_file, auth_file,
+                                             output_file, config, progress_tracker, subtitle_file, fonts_dir):
+                return True
+            logger.warning("⚠️ Single-pass render failed, falling back to step-by-step assembly")
+        
+        return self.create_final_video_stepwise(slideshow_file, audio_file, intro_file, outro_file, auth_file,
+                                                output_file, config, progress_tracker, subtitle_file, fonts_dir)
+    
+    def create_final_video_stepwise(self, slideshow_file: Path, audio_file: Path, 
+                                    intro_file: Path, outro_file: Path, auth_file: Path,
+                                    output_file: Path, config: dict, progress_tracker: ModernProgressTracker = None,
+                                    subtitle_file: Path = None, fonts_dir: Path = None):
         """Умное создание финального видео с поддержкой всех ориентаций"""
         try:
             if progress_tracker:
@@ -1615,7 +2618,8 @@ class SmartVideoMerger:
             slideshow_with_audio = temp_dir / "temp_slideshow_audio_SMART.mp4"
             temp_files.append(slideshow_with_audio)
             
-            success = self.merge_slideshow_audio_optimized(slideshow_file, audio_file, slideshow_with_audio)
+            success = self.merge_slideshow_audio_optimized(slideshow_file, audio_file, slideshow_with_audio,
+                                                           subtitle_file, fonts_dir)
             if not success:
                 logger.error("❌ Failed to create slideshow+audio")
                 return False
@@ -1751,12 +2755,17 @@ class SmartVideoMerger:
             logger.error(f"❌ Traceback: {traceback.format_exc()}")
             return False
 
+# Коды языка для метаданных дорожки субтитров (ISO 639-2)
+SUBTITLE_LANGUAGE_CODES = {
+    'en': 'eng', 'es': 'spa', 'ru': 'rus', 'uk': 'ukr', 'de': 'ger', 'fr': 'fre', 'it': 'ita', 'pt': 'por'
+}
+
 class AdvancedSubtitleProcessor:
     """🔧 v4.2 УЛУЧШЕННЫЙ процессор субтитров с исправлением синхронизации"""
     
     def __init__(self):
         self.check_ffmpeg()
-        # Модель Whisper будет загружаться отдельно для каждого видео
+        # Модель Whisper берется из общего пула процесса (одна загрузка на пакет)
     
     def check_ffmpeg(self):
         """Проверка FFmpeg"""
@@ -1770,61 +2779,7 @@ class AdvancedSubtitleProcessor:
     
     def detect_language(self, text: str) -> str:
         """🔧 v4.2 ДОБАВЛЕНО: Определение языка в AdvancedSubtitleProcessor"""
-        if not text or not text.strip():
-            return 'en'
-        
-        # Более обширная выборка для анализа
-        sample = text[:500].lower()
-        
-        # Расширенные испанские символы и слова
-        spanish_chars = ['ñ', 'á', 'é', 'í', 'ó', 'ú', 'ü', '¿', '¡', 'ç']
-        spanish_words = [
-            'el', 'la', 'los', 'las', 'de', 'del', 'que', 'y', 'es', 'en', 'un', 'una', 'se', 'no',
-            'con', 'por', 'para', 'su', 'sus', 'te', 'le', 'lo', 'me', 'nos', 'como', 'más', 'muy',
-            'todo', 'todos', 'toda', 'todas', 'este', 'esta', 'estos', 'estas', 'ese', 'esa', 'esos',
-            'esas', 'aquel', 'aquella', 'aquellos', 'aquellas', 'pero', 'si', 'sí', 'también', 'cuando',
-            'donde', 'dónde', 'cómo', 'qué', 'quién', 'cuál', 'cuánto', 'tiempo', 'año', 'día', 'casa',
-            'hacer', 'ser', 'estar', 'tener', 'haber', 'poder', 'decir', 'ir', 'ver', 'dar', 'saber',
-            'querer', 'llegar', 'pasar', 'deber', 'poner', 'parecer', 'quedar', 'creer', 'hablar',
-            'llevar', 'dejar', 'seguir', 'encontrar', 'llamar', 'venir', 'pensar', 'salir', 'volver',
-            'tomar', 'conocer', 'vivir', 'sentir', 'tratar', 'mirar', 'contar', 'empezar', 'esperar'
-        ]
-        
-        # Проверяем специальные испанские символы (высокий приоритет)
-        spanish_char_count = sum(1 for char in spanish_chars if char in sample)
-        if spanish_char_count > 0:
-            logger.info(f"🔍 Spanish characters detected: {spanish_char_count}")
-            return 'es'
-        
-        # Разбиваем на слова и анализируем
-        words = sample.split()
-        if len(words) == 0:
-            return 'en'
-        
-        # Подсчитываем испанские слова
-        spanish_word_count = sum(1 for word in words if word in spanish_words)
-        spanish_percentage = spanish_word_count / len(words)
-        
-        logger.info(f"🔍 Language detection: Spanish words: {spanish_word_count}/{len(words)} ({spanish_percentage:.2%})")
-        
-        # Более строгий порог для определения испанского
-        if spanish_percentage > 0.15:  # Если более 15% слов испанские
-            return 'es'
-        
-        # Дополнительная проверка на испанские окончания
-        spanish_endings = ['ción', 'sión', 'dad', 'tad', 'mente', 'ando', 'iendo', 'ado', 'ido']
-        ending_count = sum(1 for word in words for ending in spanish_endings if word.endswith(ending))
-        if ending_count > len(words) * 0.05:  # Если более 5% слов имеют испанские окончания
-            logger.info(f"🔍 Spanish endings detected: {ending_count}")
-            return 'es'
-        
-        return 'en'
-    
-    def _get_whisper_model(self):
-        """Загрузка новой модели Whisper"""
-        logger.info("🔄 Loading Whisper model")
-        gc.collect()
-        return whisper.load_model("base")
+        return detect_text_language(text)
     
     def find_subtitle_files(self, subtitles_folder: Path):
         """Поиск всех файлов субтитров"""
@@ -1906,178 +2861,127 @@ class AdvancedSubtitleProcessor:
             logger.error(f"❌ Audio extraction failed: {e}")
             return False
     
-    def generate_styled_subtitles(self, audio_file: Path, subtitle_file: Path, config: dict, progress_tracker: ModernProgressTracker = None, text_content: str = None):
-        """Генерация стилизованных субтитров"""
+    def generate_styled_subtitles(self, audio_file: Path, subtitle_file: Path, config: dict, progress_tracker: ModernProgressTracker = None, text_content: str = None):
+        """Генерация стилизованных субтитров"""
+        try:
+            if progress_tracker:
+                progress_tracker.update_progress(10, "Loading Whisper model")
+
+            if progress_tracker:
+                mode = 'aligning script' if text_content and config.get('subtitle_alignment', True) else 'transcribing audio'
+                progress_tracker.update_progress(30, f"Whisper: {mode}")
+            
+            # Известный текст сценария выравнивается по аудио; без него (или при сбое) - транскрипция
+            # с языком сценария, без отдельного прохода определения языка
+            result = word_timings(audio_file, config, text_content)
+
+            if progress_tracker:
+                progress_tracker.update_progress(70, "Creating styled subtitles")
+            
+            return self.write_styled_subtitles(result, subtitle_file, config, progress_tracker)
+        
+        except Exception as e:
+            logger.error(f"❌ Subtitle generation failed: {e}")
+            logger.error(f"❌ Traceback: {traceback.format_exc()}")
+            return False
+    
+    def start_styled_subtitles(self, voice_file: Path, subtitle_file: Path, config: dict, word_timings: dict = None, text_content: str = None):
+        """Фоновая генерация субтитров прямо из озвучки: Future с результатом True/False"""
+        job = Future()
+        config = dict(config)
+        
+        def run():
+            try:
+                if word_timings:
+                    logger.info("⏱️ Using TTS word boundaries for subtitles (Whisper skipped)")
+                    if config.get('transcript_cache', True):
+                        save_transcript(voice_file, 'tts', {'source': 'tts'}, word_timings, source='tts')
+                    job.set_result(self.write_styled_subtitles(word_timings, subtitle_file, config))
+                else:
+                    job.set_result(self.generate_styled_subtitles(voice_file, subtitle_file, config, None, text_content))
+            except Exception as e:
+                logger.error(f"❌ Background subtitle generation failed: {e}")
+                job.set_result(False)
+        
+        threading.Thread(target=run, name='subtitles', daemon=True).start()
+        return job
+    
+    def restyle_subtitles(self, voice_file: Path, subtitle_file: Path, config: dict, progress_tracker: ModernProgressTracker = None):
+        """Перестилизация без распознавания: ASS из сохраненных таймингов озвучки"""
+        result = load_latest_transcript(voice_file)
+        if result is None:
+            logger.error(f"❌ No saved word timings for {voice_file.name} - full subtitle generation needed")
+            return False
+        
+        started = time.monotonic()
+        success = self.write_styled_subtitles(result, subtitle_file, config, progress_tracker)
+        if success:
+            logger.info(f"🎨 Subtitles restyled from saved timings in {(time.monotonic() - started) * 1000:.0f} ms")
+        return success
+    
+    def write_styled_subtitles(self, result, subtitle_file: Path, config: dict, progress_tracker: ModernProgressTracker = None):
+        """Запись стилизованных субтитров из готовых таймингов слов (Whisper или TTS WordBoundary)"""
         try:
-            if progress_tracker:
-                progress_tracker.update_progress(10, "Loading Whisper model")
-
-            model = self._get_whisper_model()
-
-            if progress_tracker:
-                progress_tracker.update_progress(30, "Transcribing audio")
-
-            result = model.transcribe(
-                str(audio_file),
-                fp16=False,
-                verbose=False,
-                word_timestamps=True
-            )
-
-            if progress_tracker:
-                progress_tracker.update_progress(70, "Creating styled subtitles")
-            
             subtitle_preset_key = config.get('subtitle_preset', 'poppins_extra_bold')
             subtitle_preset = SUBTITLE_PRESETS[subtitle_preset_key]
             
             position_key = config.get('subtitle_position', 'bottom')
             position_preset = SUBTITLE_POSITIONS[position_key]
             
-            ass_content = self.whisper_to_styled_ass(result, config, subtitle_preset, position_preset)
-            
-            with open(subtitle_file, 'w', encoding='utf-8') as f:
-                f.write(ass_content)
+            # 🔧 v4.2 ИСПРАВЛЕНИЕ: Более точная обработка offset для синхронизации
+            ir = SubtitleIR.from_result(result, config.get('subtitle_offset', 0.0))
+            write_ass(ir, subtitle_file, self.styled_ass_header(subtitle_preset, position_preset),
+                      compile_formatter(preset_style(subtitle_preset['name']),
+                                        subtitle_preset['primary_color'], subtitle_preset['secondary_color']))
+            export_plain_subtitles(ir, subtitle_file, config.get('subtitle_export_formats'))
             
             if progress_tracker:
                 progress_tracker.update_progress(100, f"Styled subtitles: {subtitle_preset['name']}")
 
-            logger.info("✅ Subtitles generated")
+            logger.info(f"✅ Subtitles generated ({len(ir)} events)")
             if result['segments']:
                 logger.info(f"📝 First segment preview: {result['segments'][0]['text'][:50]}")
             return True
             
         except Exception as e:
-            logger.error(f"❌ Subtitle generation failed: {e}")
+            logger.error(f"❌ Subtitle writing failed: {e}")
             logger.error(f"❌ Traceback: {traceback.format_exc()}")
             return False
     
-    def whisper_to_styled_ass(self, result, config: dict, subtitle_preset: dict, position_preset: dict):
-        """🔧 v4.2 ИСПРАВЛЕННАЯ: Конвертация в ASS с продвинутыми стилями и фиксом синхронизации"""
-        
-        primary_color = subtitle_preset['primary_color']
-        secondary_color = subtitle_preset['secondary_color']
-        font_size = subtitle_preset['font_size']
-        font_name = subtitle_preset['font_name']
-        outline = subtitle_preset['outline']
-        shadow = subtitle_preset['shadow']
-        
-        alignment = position_preset['alignment']
-        margin_v = position_preset['margin_v']
-        
-        ass_content = f"""[Script Info]
-Title: Enhanced Styled Subtitles v4.2 - {subtitle_preset['name']} ({position_preset['name']}) - Sync Fixed
-ScriptType: v4.00+
-
-[V4+ Styles]
-Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
-Style: Default,{font_name},{font_size},{primary_color},{secondary_color},&H000000,&H80000000,1,0,0,0,100,100,0,0,1,{outline},{shadow},{alignment},10,10,{margin_v},1
-
-[Events]
-Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
-
-"""
-        
-        # 🔧 v4.2 ИСПРАВЛЕНИЕ: Более точная обработка offset для синхронизации
-        subtitle_offset = config.get('subtitle_offset', 0.0)
-        
-        for segment in result['segments']:
-            if 'words' in segment and segment['words']:
-                words = segment['words']
-                word_chunks = self.group_words_into_chunks(words, max_words=4)
-                
-                for chunk in word_chunks:
-                    if not chunk:
-                        continue
-                    
-                    # 🔧 v4.2 ИСПРАВЛЕНИЕ: Более точное время с учетом синхронизации
-                    start_time = chunk[0]['start'] + subtitle_offset
-                    end_time = chunk[-1]['end'] + subtitle_offset
-                    
-                    text = self.format_styled_text(chunk, primary_color, secondary_color, subtitle_preset)
-                    
-                    if text.strip():
-                        start_ass = self.seconds_to_ass_time(max(0, start_time))
-                        end_ass = self.seconds_to_ass_time(max(0.1, end_time))
-                        
-                        ass_content += f"Dialogue: 0,{start_ass},{end_ass},Default,,0,0,0,,{text}\n"
-        
-        return ass_content
-    
-    def format_styled_text(self, word_chunk, primary_color, secondary_color, subtitle_preset):
-        """Форматирование текста с продвинутыми стилями"""
-        formatted_words = []
-        
-        preset_name = subtitle_preset['name']
-        
-        for i, word_data in enumerate(word_chunk):
-            word = word_data['word'].strip().upper()
-            
-            if 'Rainbow' in preset_name:
-                colors = ['&H00FFFF&', '&HFF00FF&', '&H0080FF&', '&H00FF80&', '&H8000FF&']
-                color = colors[i % len(colors)]
-                formatted_words.append(f"{{\\c{color}}}{word}{{\\r}}")
-            elif 'Neon' in preset_name or 'Fire' in preset_name:
-                if i % 2 == 0:
-                    formatted_words.append(f"{{\\c{primary_color}\\blur2}}{word}{{\\r}}")
-                else:
-                    formatted_words.append(f"{{\\c{secondary_color}}}{word}{{\\r}}")
-            elif 'Matrix' in preset_name:
-                if i % 3 == 0:
-                    formatted_words.append(f"{{\\c{primary_color}\\fscx120\\fscy120}}{word}{{\\r}}")
-                else:
-                    formatted_words.append(f"{{\\c{secondary_color}}}{word}{{\\r}}")
-            elif 'Poppins' in preset_name or 'Montserrat' in preset_name or 'Roboto' in preset_name:
-                if i % 2 == 0:
-                    formatted_words.append(f"{{\\c{primary_color}\\b1}}{word}{{\\r}}")
-                else:
-                    formatted_words.append(f"{{\\c{secondary_color}\\b0}}{word}{{\\r}}")
-            else:
-                if i % 2 == 0:
-                    formatted_words.append(f"{{\\c{primary_color}}}{word}{{\\r}}")
-                else:
-                    formatted_words.append(f"{{\\c{secondary_color}}}{word}{{\\r}}")
-        
-        return " ".join(formatted_words)
-    
-    def group_words_into_chunks(self, words, max_words=4):
-        """Группировка слов в чанки"""
-        chunks = []
-        current_chunk = []
-        
-        for word in words:
-            current_chunk.append(word)
-            
-            if len(current_chunk) >= max_words:
-                chunks.append(current_chunk)
-                current_chunk = []
-        
-        if current_chunk:
-            chunks.append(current_chunk)
-        
-        return chunks
-    
-    def seconds_to_ass_time(self, seconds):
-        """Конвертация секунд в ASS формат"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        centisecs = int((seconds % 1) * 100)
-        
-        return f"{hours}:{minutes:02d}:{secs:02d}.{centisecs:02d}"
+    def styled_ass_header(self, subtitle_preset: dict, position_preset: dict) -> str:
+        """Заголовок ASS со стилем пресета и позицией"""
+        return ass_header(
+            f"Enhanced Styled Subtitles v4.2 - {subtitle_preset['name']} ({position_preset['name']}) - Sync Fixed",
+            subtitle_preset['font_name'], subtitle_preset['font_size'],
+            subtitle_preset['primary_color'], subtitle_preset['secondary_color'],
+            subtitle_preset['outline'], subtitle_preset['shadow'],
+            position_preset['alignment'], position_preset['margin_v']
+        )
     
-    def add_styled_subtitles_to_video(self, video_file: Path, subtitle_file: Path, output_file: Path, progress_tracker: ModernProgressTracker = None):
-        """Добавление стилизованных субтитров к видео"""
+    def add_styled_subtitles_to_video(self, video_file: Path, subtitle_file: Path, output_file: Path, progress_tracker: ModernProgressTracker = None,
+                                      audio_file: Path = None, fonts_dir: Path = None):
+        """Добавление стилизованных субтитров к видео (с audio_file - озвучка подмешивается в том же проходе,
+        fonts_dir - папка шрифтов пресетов для libass)"""
         try:
             if progress_tracker:
                 progress_tracker.update_progress(20, "Preparing subtitle overlay")
             
-            subtitle_path_escaped = str(subtitle_file).replace('\\', '\\\\').replace(':', '\\:')
             
-            cmd = [
-                'ffmpeg', '-i', str(video_file),
-                '-vf', f"ass='{subtitle_path_escaped}'",
-                '-c:a', 'copy', '-y', str(output_file)
-            ]
+            if audio_file:
+                cmd = [
+                    'ffmpeg', '-i', str(video_file), '-i', str(audio_file),
+                    '-vf', ass_filter(subtitle_file, fonts_dir),
+                    '-map', '0:v', '-map', '1:a',
+                    '-c:a', 'aac', '-b:a', '128k', '-ar', '44100', '-ac', '2',
+                    '-avoid_negative_ts', 'make_zero',
+                    '-shortest', '-y', str(output_file)
+                ]
+            else:
+                cmd = [
+                    'ffmpeg', '-i', str(video_file),
+                    '-vf', ass_filter(subtitle_file, fonts_dir),
+                    '-c:a', 'copy', '-y', str(output_file)
+                ]
             
             if progress_tracker:
                 progress_tracker.update_progress(50, "Adding styled subtitles to video")
@@ -2096,6 +3000,38 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
             logger.error(f"❌ Subtitle overlay error: {e}")
             return False
 
+    def mux_soft_subtitles(self, video_file: Path, subtitle_file: Path, output_file: Path, codec: str = 'mov_text',
+                           offset: float = 0.0, language: str = None):
+        """Субтитры отдельной дорожкой: видео и аудио копируются без перекодирования (offset - сдвиг дорожки)"""
+        try:
+            started = time.monotonic()
+            cmd = ['ffmpeg', '-i', str(video_file)]
+            if offset > 0:
+                cmd += ['-itsoffset', f'{offset:.3f}']
+            cmd += [
+                '-i', str(subtitle_file),
+                '-map', '0:v', '-map', '0:a?', '-map', '1:0',
+                '-c:v', 'copy', '-c:a', 'copy', '-c:s', codec,
+                '-metadata:s:s:0', f"language={SUBTITLE_LANGUAGE_CODES.get(language, 'und')}",
+                '-disposition:s:0', 'default'
+            ]
+            if output_file.suffix.lower() in ('.mp4', '.m4v', '.mov'):
+                cmd += ['-movflags', '+faststart']
+            cmd += ['-y', str(output_file)]
+            
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            
+            if result.returncode == 0:
+                logger.info(f"💬 Soft subtitles muxed ({codec}, offset {offset:.2f}s) in {time.monotonic() - started:.1f}s")
+                return True
+            else:
+                logger.error(f"❌ Soft subtitle mux failed: {result.stderr}")
+                return False
+        
+        except Exception as e:
+            logger.error(f"❌ Soft subtitle mux error: {e}")
+            return False
+
 class EnhancedVideoProductionPipeline:
     """🔧 v4.2 РАСШИРЕННЫЙ основной пайплайн с продвинутыми motion-эффектами и исправлениями"""
     
@@ -2107,6 +3043,10 @@ class EnhancedVideoProductionPipeline:
         
         # 🔧 v4.2 НОВОЕ: Счетчик видео для принудительной рандомизации субтитров
         self._video_counter = 0
+        # Озвучка, подготовленная в пакетном режиме: папка -> длительность
+        self._prepared_voices = {}
+        # Папки шрифтов, для которых кэш fontconfig прогрет и шрифты пресетов проверены
+        self._prepared_fonts_dirs = set()
         
         logger.info("🚀 Enhanced Video Production Pipeline v4.2 initialized")
         logger.info("✅ v4.2 NEW FEATURES:")
@@ -2148,6 +3088,58 @@ class EnhancedVideoProductionPipeline:
             'subtitle_position': 'bottom',
             'subtitle_offset': 0.0,
             'word_timestamps': True,
+            # Папка шрифтов пресетов для libass ('' - fonts/ рядом со скриптами, если есть)
+            'fonts_dir': '',
+            # Дополнительно SRT/VTT рядом с ASS: ['srt', 'vtt']
+            'subtitle_export_formats': [],
+            # Тайминги слов из edge-tts WordBoundary вместо Whisper
+            'tts_word_timings': True,
+            # Дублирующий запрос для чанков дольше p95
+            'tts_hedging': True,
+            # Разбиение текста: 'adaptive' (по предложениям) или 'paragraph'
+            'tts_chunk_mode': 'adaptive',
+            'tts_target_chunk_seconds': 20,
+            'tts_concurrency': 4,
+            # TTS бэкенд: 'edge' или 'standin' (локальный сервер для нагрузочных тестов)
+            'tts_backend': 'edge',
+            'tts_standin_url': 'http://127.0.0.1:8765',
+            # Постоянный пул соединений TTS между чанками и видео
+            'tts_session_reuse': True,
+            # Язык и голос по абзацам (смешанные en/es сценарии)
+            'tts_paragraph_languages': True,
+            
+            # Профиль Whisper: 'fast', 'balanced' или 'accurate'
+            'transcription_profile': 'balanced',
+            # Выравнивание известного текста вместо свободной транскрипции
+            'subtitle_alignment': True,
+            # Whisper в отдельном долгоживущем процессе (без конкуренции с рендером за GIL)
+            'transcription_worker': True,
+            # Длинная озвучка (от 10 мин) распознается фрагментами по паузам в нескольких процессах
+            'transcription_workers': 'auto',
+            # Тайминги слов сохраняются рядом с озвучкой: смена стиля субтитров без Whisper
+            'transcript_cache': True,
+            # Движок распознавания и размер модели: по умолчанию прежний openai-whisper base.
+            # 'auto' включается явно: движок - faster-whisper int8 / torch int8, если установлены,
+            # модель - по длительности озвучки и числу потоков CPU (меняет тайминги и текст субтитров)
+            'transcription_backend': 'openai',
+            'whisper_model': 'base',
+            # Пакетный режим: сначала озвучка всех папок, затем одно распознавание всех файлов батчами
+            'batch_transcription': False,
+            'transcription_batch_size': 16,
+            # Слайдшоу рендерится параллельно с TTS по прогнозу длительности озвучки
+            'speculative_slideshow': True,
+            'speculative_margin': 0.15,
+            # Субтитры накладываются в кадры при рендере слайдшоу (без отдельного прожига и перекодирования);
+            # слайдшоу ждет готовые субтитры, поэтому спекулятивный старт отключается
+            'subtitle_compositing': False,
+            'subtitle_compositing_verify': True,
+            # 'burn' - субтитры в кадре; 'soft' - отдельной дорожкой без перекодирования видео
+            # (soft_subtitle_codec: mov_text или webvtt в MP4, ass - финальное видео в MKV)
+            'subtitle_mode': 'burn',
+            'soft_subtitle_codec': 'mov_text',
+            # Финальное видео одним запуском ffmpeg (прожиг, webcam, интро/аутро, склейка - одно кодирование);
+            # при ошибке - прежняя поэтапная сборка
+            'single_pass_render': True,
             
             # Пресеты переходов
             'transition_preset': 'smooth_fade',
@@ -2209,6 +3201,172 @@ class EnhancedVideoProductionPipeline:
         
         return True, "OK"
     
+    def generate_voice(self, text_content: str, voice_file: Path, config: dict, tracker: ModernProgressTracker) -> float:
+        """Генерация озвучки: длительность аудио в секундах (0.0 при ошибке)"""
+        folder_name = voice_file.parent.parent.name
+        try:
+            # Постоянный event loop TTS: соединения переиспользуются между видео
+            self.tts_processor.run_sync(
+                asyncio.wait_for(
+                    self.tts_processor.text_to_speech(text_content, voice_file, config, tracker),
+                    timeout=600
+                )
+            )
+            
+            if not voice_file.exists():
+                logger.error(f"❌ TTS failed for {folder_name}")
+                return 0.0
+            
+            file_size = voice_file.stat().st_size
+            if file_size < 2000:
+                logger.error(f"❌ Generated audio file too small: {file_size} bytes")
+                return 0.0
+            
+            logger.info(f"✅ Enhanced TTS v4.2 successful: {file_size} bytes")
+        
+        except asyncio.TimeoutError:
+            logger.error(f"❌ TTS timeout for {folder_name}")
+            return 0.0
+        except Exception as e:
+            logger.error(f"❌ TTS error for {folder_name}: {e}")
+            return 0.0
+        
+        audio_duration = self.video_merger.get_video_duration(voice_file)
+        if audio_duration <= 0:
+            logger.error(f"❌ Invalid audio duration: {audio_duration}")
+            return 0.0
+        
+        logger.info(f"📏 Audio duration: {audio_duration:.1f} seconds")
+        return audio_duration
+    
+    def restyle_video(self, video_folder: Path, ui_config: dict = None):
+        """Новый стиль субтитров для готового видео: сохраненные тайминги, существующие озвучка и слайдшоу"""
+        folder_name = video_folder.name
+        tracker = ModernProgressTracker(self.progress_callback)
+        
+        try:
+            config = self.load_config(video_folder)
+            if ui_config:
+                config.update(ui_config)
+                self.save_config(video_folder, config)
+            self.prepare_subtitle_fonts(config)
+            
+            voice_file = video_folder / 'voice' / f'{folder_name}_voice_v42.mp3'
+            slideshow_file = video_folder / 'slideshow' / f'{folder_name}_slideshow_v42.mp4'
+            subtitle_file = video_folder / 'subtitles' / f'{folder_name}_subtitles_v42.ass'
+            slideshow_with_subs = video_folder / 'output' / f'{folder_name}_slideshow_subs_v42.mp4'
+            final_video = video_folder / 'output' / f'{folder_name}_final_ENHANCED_v42.mp4'
+            
+            if not voice_file.exists() or not slideshow_file.exists():
+                # Слайдшоу с наложенными в рендере субтитрами (subtitle_compositing) не сохраняется
+                logger.error(f"❌ {folder_name}: voice or clean slideshow missing - process the video first")
+                return False
+            
+            tracker.set_stage("🎨 Restyling subtitles from saved word timings", 4)
+            if not self.subtitle_processor.restyle_subtitles(voice_file, subtitle_file, config, tracker):
+                return False
+            
+            if config.get('subtitle_mode', 'burn') == 'soft':
+                # Субтитры - отдельная дорожка: видео не пересобирается, меняется только дорожка
+                return self.restyle_soft_subtitles(video_folder, subtitle_file, config, tracker)
+            
+            fonts_dir = resolve_fonts_dir(config.get('fonts_dir'))
+            main_video, final_subtitle_file = slideshow_with_subs, None
+            if config.get('single_pass_render', True):
+                # Прожиг войдет в единственное кодирование финальной сборки
+                main_video, final_subtitle_file = slideshow_file, subtitle_file
+            elif not self.subtitle_processor.add_styled_subtitles_to_video(
+                slideshow_file, subtitle_file, slideshow_with_subs, tracker, audio_file=voice_file,
+                fonts_dir=fonts_dir
+            ):
+                logger.error(f"❌ Failed to burn restyled subtitles for {folder_name}")
+                return False
+            tracker.complete_stage()
+            
+            tracker.set_stage("🎞️ Final assembly with restyled subtitles", 5)
+            components = {}
+            for name in ('intro', 'outro', 'auth'):
+                if config.get(f'enable_{name}', True):
+                    components[name] = self.video_merger.find_video_file(video_folder / name)
+            
+            success = self.video_merger.create_final_video_optimized(
+                slideshow_file=main_video,
+                audio_file=voice_file,
+                intro_file=components.get('intro'),
+                outro_file=components.get('outro'),
+                auth_file=components.get('auth'),
+                output_file=final_video,
+                config=config,
+                progress_tracker=tracker,
+                subtitle_file=final_subtitle_file,
+                fonts_dir=fonts_dir
+            )
+            
+            if slideshow_with_subs.exists():
+                slideshow_with_subs.unlink()
+            
+            if success and final_video.exists():
+                logger.info(f"✅ {folder_name}: restyled video ready")
+                return True
+            logger.error(f"❌ Failed to assemble restyled video for {folder_name}")
+            return False
+        
+        except Exception as e:
+            logger.error(f"❌ Restyle failed for {folder_name}: {e}")
+            return False
+    
+    def restyle_soft_subtitles(self, video_folder: Path, subtitle_file: Path, config: dict,
+                               tracker: ModernProgressTracker):
+        """Замена дорожки субтитров в готовом видео (soft-режим): потоки копируются, старая дорожка отбрасывается"""
+        folder_name = video_folder.name
+        final_video = video_folder / 'output' / f'{folder_name}_final_ENHANCED_v42.mp4'
+        soft_codec = config.get('soft_subtitle_codec', 'mov_text')
+        
+        # Готовое видео могло быть собрано с другим кодеком дорожки (MP4 или MKV)
+        candidates = [path for path in (final_video.with_suffix('.mkv'), final_video) if path.exists()]
+        if not candidates:
+            logger.error(f"❌ {folder_name}: final video missing - process the video first")
+            return False
+        source_video = max(candidates, key=lambda path: path.stat().st_mtime)
+        if soft_codec == 'ass':
+            # ASS со стилями хранит только MKV
+            final_video = final_video.with_suffix('.mkv')
+        tracker.complete_stage()
+        
+        tracker.set_stage("💬 Muxing restyled subtitle track", 5)
+        intro_file = None
+        if config.get('enable_intro', True):
+            intro_file = self.video_merger.find_video_file(video_folder / 'intro')
+        intro_offset = self.video_merger.clip_duration(intro_file) if intro_file else 0.0
+        
+        text_file = next((video_folder / 'text').glob('*.txt'), None)
+        language = None
+        if text_file:
+            with open(text_file, 'r', encoding='utf-8') as f:
+                language = self.tts_processor.detect_language(f.read().strip())
+        
+        temp_video = final_video.with_name(f'{final_video.stem}_restyle{final_video.suffix}')
+        success = self.subtitle_processor.mux_soft_subtitles(
+            source_video, subtitle_file, temp_video, soft_codec, intro_offset, language
+        )
+        if not success:
+            temp_video.unlink(missing_ok=True)
+            logger.error(f"❌ Failed to mux restyled subtitles for {folder_name}")
+            return False
+        
+        os.replace(temp_video, final_video)
+        tracker.complete_stage()
+        logger.info(f"✅ {folder_name}: restyled subtitle track muxed into {final_video.name}")
+        return True
+    
+    def prepare_subtitle_fonts(self, config: dict):
+        """Прогрев кэша fontconfig и проверка шрифтов для папки шрифтов из config (один раз на папку, в фоне)"""
+        fonts_dir = resolve_fonts_dir(config.get('fonts_dir'))
+        if fonts_dir in self._prepared_fonts_dirs:
+            return
+        self._prepared_fonts_dirs.add(fonts_dir)
+        start_font_preparation(SUBTITLE_PRESETS, fonts_dir)
+    
     def process_single_video(self, video_folder: Path, ui_config: dict = None):
         """🔧 v4.2 РАСШИРЕННАЯ обработка одной папки с продвинутыми эффектами"""
         folder_name = video_folder.name
@@ -2230,6 +3388,7 @@ class EnhancedVideoProductionPipeline:
             if ui_config:
                 config.update(ui_config)
                 self.save_config(video_folder, config)
+            self.prepare_subtitle_fonts(config)
             
             is_valid, error_msg = self.validate_folder(video_folder)
             if not is_valid:
@@ -2291,7 +3450,6 @@ class EnhancedVideoProductionPipeline:
             # Файлы для процесса
             slideshow_with_subs = video_folder / 'output' / f'{folder_name}_slideshow_subs_v42.mp4'
             final_video = video_folder / 'output' / f'{folder_name}_final_ENHANCED_v42.mp4'
-            temp_audio_for_subs = video_folder / 'output' / f'{folder_name}_slideshow_audio_v42.wav'
             
             tracker.complete_stage()
             
@@ -2310,107 +3468,130 @@ class EnhancedVideoProductionPipeline:
             logger.info(f"🔍 v4.2: Text language detected: {detected_language}")
             logger.info(f"📝 v4.2: Text preview: {text_content[:100]}...")
             
-            try:
-                asyncio.run(
-                    asyncio.wait_for(
-                        self.tts_processor.text_to_speech(text_content, voice_file, config, tracker),
-                        timeout=600
-                    )
+            # Озвучка уже готова (пакетный режим) - TTS и спекулятивный старт не нужны
+            prepared_duration = self._prepared_voices.pop(video_folder, None)
+            soft_subtitles = config.get('subtitle_mode', 'burn') == 'soft'
+            compositing = (config.get('subtitle_compositing', False) and not soft_subtitles
+                           and not subtitle_config['use_existing_file'])
+            
+            # Спекулятивный старт слайдшоу: рендеринг по прогнозу длительности идет параллельно с TTS
+            speculative = None
+            if prepared_duration is None and not compositing and config.get('speculative_slideshow', True):
+                predicted_duration = self.tts_processor.predict_duration(text_content, config)
+                speculative = AdvancedSlideshowGenerator(config).start_speculative(
+                    video_folder / 'img', slideshow_file, predicted_duration
                 )
-
-                if not voice_file.exists():
-                    logger.error(f"❌ TTS failed for {folder_name}")
-                    return False
-
-                file_size = voice_file.stat().st_size
-                if file_size < 2000:
-                    logger.error(f"❌ Generated audio file too small: {file_size} bytes")
-                    return False
-
-                logger.info(f"✅ Enhanced TTS v4.2 successful: {file_size} bytes ({detected_language})")
-
-            except asyncio.TimeoutError:
-                logger.error(f"❌ TTS timeout for {folder_name}")
-                return False
-            except Exception as e:
-                logger.error(f"❌ TTS error for {folder_name}: {e}")
-                return False
             
-            audio_duration = self.video_merger.get_video_duration(voice_file)
+            if prepared_duration is not None:
+                audio_duration = prepared_duration
+                logger.info(f"♻️ Using narration prepared in batch mode ({audio_duration:.1f}s)")
+            else:
+                audio_duration = self.generate_voice(text_content, voice_file, config, tracker)
             if audio_duration <= 0:
-                logger.error(f"❌ Invalid audio duration: {audio_duration}")
+                if speculative:
+                    speculative[0].cancel()
+                    speculative[1].result()
                 return False
             
-            logger.info(f"📏 Audio duration: {audio_duration:.1f} seconds")
+            if speculative:
+                speculative[0].set_result(audio_duration)
+                logger.info(f"🔮 Narration prediction error: {predicted_duration - audio_duration:+.1f}s")
+            
+            # Тайминги слов из WordBoundary событий edge-tts (если есть - Whisper не нужен)
+            tts_word_timings = None
+            if config.get('tts_word_timings', True):
+                if prepared_duration is not None:
+                    tts_word_timings = load_transcript(voice_file, 'tts', {'source': 'tts'})
+                else:
+                    tts_word_timings = self.tts_processor.last_word_timings
+            
+            # Субтитры готовятся из TTS MP3 параллельно со слайдшоу - без промежуточного видео
+            subtitle_job = None
+            if not subtitle_config['use_existing_file']:
+                config.update({
+                    'subtitle_preset': subtitle_config['preset'],
+                    'subtitle_position': subtitle_config['position']
+                })
+                subtitle_job = self.subtitle_processor.start_styled_subtitles(
+                    voice_file, subtitle_file, config, tts_word_timings, text_content
+                )
             tracker.complete_stage()
             
             # Этап 3: Создание слайдшоу с продвинутыми motion-эффектами
             tracker.set_stage(f"🎬 Creating advanced slideshow v4.2 (20+ motion effects)", 3)
             
-            slideshow_gen = AdvancedSlideshowGenerator(config)
-            success = slideshow_gen.create_slideshow(
-                video_folder / 'img', slideshow_file, audio_duration, tracker
-            )
+            subtitles = self.start_subtitle_compositor(subtitle_job, subtitle_file, config) if compositing else None
+            
+            if speculative:
+                success = speculative[1].result()
+            elif subtitles is not None:
+                # Слайдшоу с субтитрами в кадрах - сразу временный файл этапа 4; чистого слайдшоу
+                # для перестилизации не остается
+                if slideshow_file.exists():
+                    slideshow_file.unlink()
+                slideshow_gen = AdvancedSlideshowGenerator(config)
+                try:
+                    success = slideshow_gen.create_slideshow(
+                        video_folder / 'img', slideshow_with_subs, audio_duration, tracker, subtitles=subtitles
+                    )
+                finally:
+                    subtitles.close()
+            else:
+                slideshow_gen = AdvancedSlideshowGenerator(config)
+                success = slideshow_gen.create_slideshow(
+                    video_folder / 'img', slideshow_file, audio_duration, tracker
+                )
             
             if not success:
                 logger.error(f"❌ Failed to create advanced slideshow for {folder_name}")
+                if subtitle_job:
+                    subtitle_job.result()
                 return False
             
             tracker.complete_stage()
             
-            # Этап 4: Создание slideshow с субтитрами (с исправлением синхронизации)
-            if subtitle_config['use_existing_file']:
+            # Этап 4: Субтитры и озвучка накладываются на слайдшоу за одно кодирование
+            if subtitles is not None:
+                tracker.set_stage("🌈 Subtitles composited into slideshow frames (burn-in skipped)", 4)
+                logger.info(f"🔤 Subtitles composited in render: {subtitles.stats['blended_frames']} frames, "
+                            f"{subtitles.stats['events']} events - no separate burn-in encode")
+            
+            elif subtitle_config['use_existing_file']:
                 tracker.set_stage(f"🌈 Using existing subtitle file: {subtitle_config['subtitle_file'].name}", 4)
-                
-                temp_slideshow_audio = video_folder / 'output' / f'{folder_name}_temp_slideshow_SMART.mp4'
-                
-                success = self.video_merger.merge_slideshow_audio_optimized(slideshow_file, voice_file, temp_slideshow_audio)
-                if not success:
-                    logger.error(f"❌ Failed to merge slideshow with audio for {folder_name}")
-                    return False
-                
-                success = self.subtitle_processor.add_styled_subtitles_to_video(
-                    temp_slideshow_audio, subtitle_config['subtitle_file'], slideshow_with_subs, tracker
-                )
-                
-                if not success:
-                    logger.error(f"❌ Failed to add existing subtitles for {folder_name}")
-                    return False
-                
-                if temp_slideshow_audio.exists():
-                    temp_slideshow_audio.unlink()
+                burn_subtitle_file = subtitle_config['subtitle_file']
                 
             else:
                 preset_name = SUBTITLE_PRESETS[subtitle_config['preset']]['name']
                 position_name = SUBTITLE_POSITIONS[subtitle_config['position']]['name']
                 tracker.set_stage(f"🌈 Creating {preset_name} subtitles at {position_name} (sync fixed)", 4)
                 
-                temp_slideshow_audio = video_folder / 'output' / f'{folder_name}_temp_slideshow_SMART.mp4'
-                
-                success = self.video_merger.merge_slideshow_audio_optimized(slideshow_file, voice_file, temp_slideshow_audio)
-                if not success:
-                    logger.error(f"❌ Failed to merge slideshow with audio for {folder_name}")
-                    return False
-                
-                if not self.subtitle_processor.extract_audio_from_merged_video(temp_slideshow_audio, temp_audio_for_subs, tracker):
-                    logger.error(f"❌ Failed to extract audio for subtitles from {folder_name}")
-                    return False
-                
-                config.update({
-                    'subtitle_preset': subtitle_config['preset'],
-                    'subtitle_position': subtitle_config['position']
-                })
-                
-                if not self.subtitle_processor.generate_styled_subtitles(temp_audio_for_subs, subtitle_file, config, tracker):
+                if not subtitle_job.result():
                     logger.error(f"❌ Failed to generate styled subtitles for {folder_name}")
                     return False
+                burn_subtitle_file = subtitle_file
+            
+            main_video = slideshow_with_subs
+            final_subtitle_file = None
+            if soft_subtitles:
+                # Субтитры добавятся дорожкой в финальное видео - прожиг не нужен
+                main_video = slideshow_file
+                logger.info(f"💬 Soft subtitles: burn-in skipped, {burn_subtitle_file.name} will be muxed as a track")
+            
+            elif subtitles is None and config.get('single_pass_render', True):
+                # Прожиг войдет в единственное кодирование финальной сборки
+                main_video = slideshow_file
+                final_subtitle_file = burn_subtitle_file
+                logger.info(f"🔥 Subtitles will be burned during the single-pass final render")
+            
+            elif subtitles is None:
+                success = self.subtitle_processor.add_styled_subtitles_to_video(
+                    slideshow_file, burn_subtitle_file, slideshow_with_subs, tracker, audio_file=voice_file,
+                    fonts_dir=resolve_fonts_dir(config.get('fonts_dir'))
+                )
                 
-                if not self.subtitle_processor.add_styled_subtitles_to_video(temp_slideshow_audio, subtitle_file, slideshow_with_subs, tracker):
+                if not success:
                     logger.error(f"❌ Failed to add styled subtitles for {folder_name}")
                     return False
-                
-                if temp_slideshow_audio.exists():
-                    temp_slideshow_audio.unlink()
             
             tracker.complete_stage()
             
@@ -2418,28 +3599,49 @@ class EnhancedVideoProductionPipeline:
             transition_name = TRANSITION_PRESETS[config.get('transition_preset', 'smooth_fade')]['name']
             tracker.set_stage(f"🎞️ Final assembly v4.2 with {transition_name} transitions", 5)
             
+            assembled_video = final_video
+            if soft_subtitles:
+                soft_codec = config.get('soft_subtitle_codec', 'mov_text')
+                if soft_codec == 'ass':
+                    # ASS со стилями хранит только MKV
+                    final_video = final_video.with_suffix('.mkv')
+                assembled_video = video_folder / 'output' / f'{folder_name}_final_nosubs_v42.mp4'
+            
             success = self.video_merger.create_final_video_optimized(
-                slideshow_file=slideshow_with_subs,
+                slideshow_file=main_video,
                 audio_file=voice_file,
                 intro_file=intro_file,
                 outro_file=outro_file,
                 auth_file=auth_file,
-                output_file=final_video,
+                output_file=assembled_video,
                 config=config,
-                progress_tracker=tracker
+                progress_tracker=tracker,
+                subtitle_file=final_subtitle_file,
+                fonts_dir=resolve_fonts_dir(config.get('fonts_dir'))
             )
             
             if not success:
                 logger.error(f"❌ Failed to create enhanced final video for {folder_name}")
                 return False
             
+            if soft_subtitles:
+                # Основной контент начинается после интро - дорожка субтитров сдвигается на его длительность
+                intro_offset = self.video_merger.clip_duration(intro_file) if intro_file else 0.0
+                success = self.subtitle_processor.mux_soft_subtitles(
+                    assembled_video, burn_subtitle_file, final_video, soft_codec, intro_offset, detected_language
+                )
+                assembled_video.unlink(missing_ok=True)
+                if not success:
+                    logger.error(f"❌ Failed to mux soft subtitles for {folder_name}")
+                    return False
+            
             # Пропускаем оставшиеся этапы
             for stage_num in range(6, 9):
                 tracker.completed_stages = stage_num
                 tracker.complete_stage()
             
             # Очистка временных файлов
-            temp_files = [temp_audio_for_subs, slideshow_with_subs]
+            temp_files = [slideshow_with_subs]
             for temp_file in temp_files:
                 if temp_file.exists():
                     temp_file.unlink()
@@ -2478,6 +3680,87 @@ class EnhancedVideoProductionPipeline:
             logger.error(f"❌ Traceback: {traceback.format_exc()}")
             return False
     
+    def start_subtitle_compositor(self, subtitle_job: Future, subtitle_file: Path, config: dict):
+        """Субтитры в кадрах слайдшоу: ждет готовый ASS и проверяет спрайты против libass (None - нужен прожиг)"""
+        if not subtitle_job.result():
+            return None
+        
+        fonts_dir = resolve_fonts_dir(config.get('fonts_dir'))
+        if config.get('subtitle_compositing_verify', True):
+            try:
+                if not verify_against_libass(subtitle_file, samples=2, fonts_dir=fonts_dir)['ok']:
+                    logger.warning("⚠️ Subtitle sprites differ from libass, burning subtitles instead")
+                    return None
+            except Exception as e:
+                logger.warning(f"⚠️ Subtitle sprite check failed ({e}), burning subtitles instead")
+                return None
+        
+        compositor = SubtitleCompositor(subtitle_file, fonts_dir=fonts_dir)
+        return compositor if compositor.start() else None
+    
+    def prepare_batch_voice(self, video_folder: Path, ui_config: dict = None):
+        """Пакетный режим, фаза 1: озвучка папки. (озвучка, config, текст) для распознавания или None"""
+        folder_name = video_folder.name
+        tracker = ModernProgressTracker(self.progress_callback)
+        
+        try:
+            self.create_folder_structure(video_folder)
+            config = self.load_config(video_folder)
+            if ui_config:
+                config.update(ui_config)
+            
+            is_valid, error_msg = self.validate_folder(video_folder)
+            if not is_valid:
+                logger.error(f"❌ {folder_name}: {error_msg}")
+                return None
+            
+            text_file = next((video_folder / 'text').glob('*.txt'))
+            with open(text_file, 'r', encoding='utf-8') as f:
+                text_content = f.read().strip()
+            if not text_content:
+                return None
+            
+            voice_file = video_folder / 'voice' / f'{folder_name}_voice_v42.mp3'
+            tracker.set_stage(f"🎤 Batch narration: {folder_name}", 2)
+            audio_duration = self.generate_voice(text_content, voice_file, config, tracker)
+            if audio_duration <= 0:
+                return None
+            
+            self._prepared_voices[video_folder] = audio_duration
+            tts_word_timings = self.tts_processor.last_word_timings if config.get('tts_word_timings', True) else None
+            if tts_word_timings:
+                # Тайминги TTS уже есть - Whisper для этой папки не нужен
+                save_transcript(voice_file, 'tts', {'source': 'tts'}, tts_word_timings, source='tts')
+                return None
+            return voice_file, config, text_content
+        
+        except Exception as e:
+            logger.error(f"❌ Batch narration failed for {folder_name}: {e}")
+            return None
+    
+    def prepare_batch(self, video_folders: list, ui_config: dict = None):
+        """Пакетный режим: озвучка всех папок, затем одно пакетное распознавание всех файлов"""
+        started = time.monotonic()
+        jobs = []
+        for i, video_folder in enumerate(video_folders, 1):
+            if self.progress_callback:
+                self.progress_callback(f"🎤 Batch narration {i}/{len(video_folders)}: {video_folder.name}")
+            job = self.prepare_batch_voice(video_folder, ui_config)
+            if job:
+                jobs.append(job)
+        
+        if jobs:
+            if self.progress_callback:
+                self.progress_callback(f"📦 Batch transcription of {len(jobs)} narrations")
+            try:
+                saved = batch_word_timings(jobs)
+                logger.info(f"📦 Batch transcription: {saved}/{len(jobs)} narrations ready")
+            except Exception as e:
+                # Не готовые тайминги будут получены обычным путем при сборке видео
+                logger.warning(f"⚠️ Batch transcription failed ({e}), videos will be transcribed one by one")
+        
+        logger.info(f"📦 Batch preparation: {len(self._prepared_voices)} narrations in {time.monotonic() - started:.1f}s")
+    
     def process_all_videos(self, root_path: Path, ui_config: dict = None, progress_callback=None):
         """Обработка всех видео папок с настройками из UI"""
         self.progress_callback = progress_callback
@@ -2497,6 +3780,13 @@ class EnhancedVideoProductionPipeline:
         success_count = 0
         total_count = len(video_folders)
         
+        self._prepared_voices = {}
+        self._prepared_fonts_dirs = set()
+        batch_config = {**self.get_default_config(), **(ui_config or {})}
+        self.prepare_subtitle_fonts(batch_config)
+        if batch_config.get('batch_transcription', False) and total_count > 1:
+            self.prepare_batch(video_folders, ui_config)
+        
         for i, video_folder in enumerate(video_folders, 1):
             overall_message = f"🚀 ENHANCED v4.2 Processing {i}/{total_count}: {video_folder.name}"
             if progress_callback:
@@ -2506,6 +3796,9 @@ class EnhancedVideoProductionPipeline:
             if success:
                 success_count += 1
         
+        self.tts_processor.close_sessions()
+        logger.info(f"🔌 TTS session pool: {self.tts_processor.session_pool.stats}")
+        
         logger.info(f"🎉 ENHANCED v4.2 Processing complete! Success: {success_count}/{total_count}")
         return success_count == total_count
 
@@ -2660,6 +3953,7 @@ class ModernVideoProductionGUI:
         self.start_button.pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Button(button_frame, text="🔄 Refresh", command=self.scan_folders).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="🎨 Restyle Subtitles", command=self.start_restyle).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Button(button_frame, text="💾 Save Settings", command=self.save_all_settings).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Button(button_frame, text="📋 View Logs", command=self.show_logs).pack(side=tk.LEFT)
     
@@ -3276,6 +4570,39 @@ class ModernVideoProductionGUI:
         thread = threading.Thread(target=run_production, daemon=True)
         thread.start()
     
+    def start_restyle(self):
+        """Новый стиль субтитров для выбранных (или всех) готовых видео без повторного распознавания"""
+        if self.is_processing:
+            messagebox.showwarning("Warning", "Production is already running!")
+            return
+        
+        if not self.root_path.get():
+            messagebox.showerror("Error", "Please select a root folder first")
+            return
+        
+        items = self.folder_tree.selection() or self.folder_tree.get_children()
+        folder_names = [self.folder_tree.item(item)['values'][0] for item in items]
+        if not folder_names:
+            messagebox.showerror("Error", "No video folders to restyle")
+            return
+        
+        ui_config = self.get_ui_config()
+        self.is_processing = True
+        self.progress_bar.start()
+        self.add_log(f"🎨 Restyling subtitles for {len(folder_names)} videos from saved word timings...")
+        
+        def run_restyle():
+            try:
+                root_path = Path(self.root_path.get())
+                self.pipeline.progress_callback = self.update_progress
+                results = [self.pipeline.restyle_video(root_path / str(name), ui_config) for name in folder_names]
+                self.root.after(0, self.production_complete, all(results))
+            except Exception as e:
+                logger.error(f"Restyle error: {e}")
+                self.root.after(0, self.production_error, str(e))
+        
+        threading.Thread(target=run_restyle, daemon=True).start()
+    
     def update_progress(self, message: str):
         """Обновление прогресса"""
         self.root.after(0, lambda: self.progress_var.set(message))
@@ -3419,10 +4746,10 @@ def main():
     except ImportError:
         missing_deps.append("numpy")
     
-    try:
-        import whisper
+    # Только наличие пакета: whisper и torch загружает процесс распознавания, а не GUI
+    if importlib.util.find_spec('whisper') is not None:
         print("✅ Whisper found")
-    except ImportError:
+    else:
         missing_deps.append("openai-whisper")
     
     try:
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SUBTITLE FONTS
+Шрифты пресетов субтитров для libass: своя папка шрифтов, прогретый кэш fontconfig и проверка шрифтов
+• Папка fonts/ рядом со скриптами (или config 'fonts_dir') передается ass-фильтру как fontsdir
+• fc-cache при старте: системные шрифты (по умолчанию все пресеты берутся из них) и папка шрифтов,
+  если она есть - первый прожиг ждет прогрева, а не сканирует шрифты сам
+• Проверка: каждый шрифт из SUBTITLE_PRESETS находится (в папке или в системе), а не подменяется
+
+Проверка: python subtitle_fonts.py [--fonts-dir DIR]
+"""
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import logging
+import threading
+import subprocess
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_FONTS_DIR = Path(__file__).resolve().parent / 'fonts'
+FONT_TOOL_TIMEOUT = 120
+# libass ищет шрифт по семейству, полному и PostScript имени
+FONT_NAME_FORMAT = '%{family}\n%{fullname}\n%{postscriptname}\n'
+
+# Прогрев кэша fontconfig: папка шрифтов (None - только системные) -> событие готовности
+_font_cache_ready = {}
+_font_cache_lock = threading.Lock()
+
+def resolve_fonts_dir(configured: str = None):
+    """Папка шрифтов: из config, иначе fonts/ рядом со скриптами (None - только системные шрифты)"""
+    path = Path(configured).expanduser() if configured else BUNDLED_FONTS_DIR
+    if path.is_dir():
+        return path.resolve()
+    if configured:
+        logger.warning(f"⚠️ Fonts directory not found: {path}, using system fonts")
+    return None
+
+def _escape_filter_path(path: Path) -> str:
+    return str(path).replace('\\', '\\\\').replace(':', '\\:')
+
+def ass_filter(subtitle_file: Path, fonts_dir: Path = None) -> str:
+    """ass-фильтр ffmpeg для файла субтитров (с fontsdir, если папка шрифтов есть).
+    Если прогрев кэша fontconfig запущен, сначала дожидается его"""
+    wait_font_cache(fonts_dir)
+    value = f"ass='{_escape_filter_path(subtitle_file)}'"
+    if fonts_dir:
+        value += f":fontsdir='{_escape_filter_path(fonts_dir)}'"
+    return value
+
+def prewarm_font_cache(fonts_dir: Path = None) -> bool:
+    """fc-cache для системных шрифтов и папки шрифтов (если задана): libass читает готовый кэш"""
+    if shutil.which('fc-cache') is None:
+        logger.debug("fc-cache not available, font cache not prewarmed")
+        return False
+    
+    started = time.monotonic()
+    commands = [['fc-cache']]
+    if fonts_dir:
+        commands.append(['fc-cache', str(fonts_dir)])
+    for cmd in commands:
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=FONT_TOOL_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"⚠️ {' '.join(cmd)} failed: {e}")
+            return False
+        if result.returncode != 0:
+            logger.warning(f"⚠️ {' '.join(cmd)} failed: {result.stderr.strip()}")
+            return False
+    
+    logger.info(f"🔤 Font cache ready (system{f' + {fonts_dir}' if fonts_dir else ''}) "
+                f"in {time.monotonic() - started:.1f}s")
+    return True
+
+def wait_font_cache(fonts_dir: Path = None, timeout: float = FONT_TOOL_TIMEOUT) -> bool:
+    """Ожидание прогрева кэша для папки шрифтов (True - прогрев не запускался или завершен)"""
+    with _font_cache_lock:
+        ready = _font_cache_ready.get(fonts_dir)
+    if ready is None or ready.is_set():
+        return True
+    
+    logger.info("⏳ Waiting for font cache prewarm before subtitle burn-in")
+    return ready.wait(timeout)
+
+def _font_names(output: str) -> set:
+    """Имена из вывода fc-scan/fc-list: семейства, полные и PostScript имена (fontconfig разделяет их запятыми)"""
+    names = set()
+    for line in output.splitlines():
+        for name in line.split(','):
+            if name.strip():
+                names.add(name.strip().lower())
+    return names
+
+def _list_font_names(cmd: list) -> set:
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=FONT_TOOL_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return set()
+    return _font_names(result.stdout)
+
+def fonts_dir_names(fonts_dir: Path) -> set:
+    """Все имена шрифтов из папки (как их ищет libass: семейство, полное имя, PostScript имя)"""
+    if fonts_dir is None or shutil.which('fc-scan') is None:
+        return set()
+    return _list_font_names(['fc-scan', '--format', FONT_NAME_FORMAT, str(fonts_dir)])
+
+def system_font_names() -> set:
+    """Имена установленных в системе шрифтов (fc-match подставил бы похожий, поэтому полный список)"""
+    return _list_font_names(['fc-list', '--format', FONT_NAME_FORMAT])
+
+def validate_preset_fonts(presets: dict, fonts_dir: Path = None) -> dict:
+    """Шрифт каждого пресета -> 'fonts_dir' / 'system' / None (libass подставит другой шрифт)"""
+    if shutil.which('fc-list') is None:
+        logger.debug("fc-list not available, subtitle fonts not validated")
+        return {}
+    
+    bundled = fonts_dir_names(fonts_dir)
+    installed = system_font_names()
+    resolved = {}
+    for font_name in sorted({preset['font_name'] for preset in presets.values()}):
+        if font_name.lower() in bundled:
+            resolved[font_name] = 'fonts_dir'
+        elif font_name.lower() in installed:
+            resolved[font_name] = 'system'
+        else:
+            resolved[font_name] = None
+    
+    missing = [name for name, source in resolved.items() if source is None]
+    if missing:
+        users = [key for key, preset in presets.items() if preset['font_name'] in missing]
+        logger.warning(f"⚠️ Subtitle fonts not installed: {', '.join(missing)} - presets {', '.join(users)} "
+                       f"will fall back to another font (add them to {fonts_dir or BUNDLED_FONTS_DIR})")
+    else:
+        logger.info(f"✅ All {len(resolved)} subtitle preset fonts resolve")
+    return resolved
+
+def prepare_subtitle_fonts(presets: dict, fonts_dir: Path = None, ready: threading.Event = None) -> dict:
+    """Прогрев кэша fontconfig, затем проверка шрифтов пресетов (ready - прожиг может начинаться)"""
+    try:
+        prewarm_font_cache(fonts_dir)
+    finally:
+        if ready is not None:
+            ready.set()
+    return validate_preset_fonts(presets, fonts_dir)
+
+def start_font_preparation(presets: dict, fonts_dir: Path = None) -> threading.Thread:
+    """Подготовка шрифтов в фоне при старте: TTS и рендер не ждут, первый прожиг ждет только fc-cache"""
+    ready = threading.Event()
+    with _font_cache_lock:
+        _font_cache_ready[fonts_dir] = ready
+    thread = threading.Thread(target=prepare_subtitle_fonts, args=(presets, fonts_dir, ready),
+                              name='subtitle-fonts', daemon=True)
+    thread.start()
+    return thread
+
+def main():
+    parser = argparse.ArgumentParser(description="Subtitle preset font check")
+    parser.add_argument('--fonts-dir', help="fonts directory (default: fonts/ next to the scripts)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    from recoverr4fix_subtitle import SUBTITLE_PRESETS
+    fonts_dir = resolve_fonts_dir(args.fonts_dir)
+    resolved = prepare_subtitle_fonts(SUBTITLE_PRESETS, fonts_dir)
+    print(json.dumps({'fonts_dir': str(fonts_dir) if fonts_dir else None, 'fonts': resolved}, indent=2))
+    return 0 if resolved and all(resolved.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
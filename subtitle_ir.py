@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SUBTITLE IR
+Компактное промежуточное представление субтитров и потоковая запись ASS/SRT/VTT
+• Слова и события хранятся в массивах (array), а не в списках словарей
+• Форматирование пресета компилируется один раз: теги по позиции слова в событии
+• Запись идет построчно прямо в файл - линейное время и постоянная память на длинных текстах
+• Общее для обоих пайплайнов (v4.2 и legacy)
+
+Экспорт сохраненных таймингов: python subtitle_ir.py voice.mp3 --format srt
+"""
+
+import sys
+import time
+import argparse
+import logging
+from array import array
+from pathlib import Path
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORDS = 4
+# Конец события не раньше этой отметки (как в прежнем ASS)
+MIN_EVENT_END = 0.1
+WRITE_BUFFER_BYTES = 1 << 16
+
+ASS_HEADER_TEMPLATE = """[Script Info]
+Title: {title}
+ScriptType: v4.00+
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,{font_name},{font_size},{primary_color},{secondary_color},&H000000,&H80000000,1,0,0,0,100,100,0,0,1,{outline},{shadow},{alignment},10,10,{margin_v},1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+
+"""
+
+class SubtitleIR:
+    """Слова (текст + начало/конец) и события (диапазон слов + время показа) в плоских массивах"""
+    
+    def __init__(self):
+        self.words = []
+        self.word_starts = array('d')
+        self.word_ends = array('d')
+        self.event_first = array('I')
+        self.event_last = array('I')
+        self.event_starts = array('d')
+        self.event_ends = array('d')
+    
+    def __len__(self):
+        return len(self.event_first)
+    
+    def add_event(self, words: list, starts: list, ends: list, start: float, end: float):
+        """Событие из подряд идущих слов (время события уже со смещением)"""
+        first = len(self.words)
+        self.words.extend(words)
+        self.word_starts.extend(starts)
+        self.word_ends.extend(ends)
+        self.event_first.append(first)
+        self.event_last.append(len(self.words))
+        self.event_starts.append(max(0.0, start))
+        self.event_ends.append(max(MIN_EVENT_END, end))
+    
+    def event_words(self, index: int) -> list:
+        return self.words[self.event_first[index]:self.event_last[index]]
+    
+    def events(self):
+        """(начало, конец, слова) каждого события"""
+        for i in range(len(self.event_first)):
+            yield self.event_starts[i], self.event_ends[i], self.words[self.event_first[i]:self.event_last[i]]
+    
+    @classmethod
+    def from_result(cls, result: dict, offset: float = 0.0, max_words: int = DEFAULT_MAX_WORDS,
+                    segment_fallback: bool = False) -> 'SubtitleIR':
+        """IR из результата transcribe: события по max_words слов; сегменты без таймингов слов -
+        одним событием на весь текст сегмента (segment_fallback) или пропускаются"""
+        ir = cls()
+        for segment in result.get('segments', []):
+            words = segment.get('words')
+            if words:
+                for i in range(0, len(words), max_words):
+                    chunk = words[i:i + max_words]
+                    ir.add_event(
+                        [word['word'].strip().upper() for word in chunk],
+                        [word['start'] for word in chunk],
+                        [word['end'] for word in chunk],
+                        chunk[0]['start'] + offset,
+                        chunk[-1]['end'] + offset
+                    )
+            elif segment_fallback:
+                text_words = segment.get('text', '').upper().split()
+                if text_words:
+                    ir.add_event(
+                        text_words,
+                        [segment['start']] * len(text_words),
+                        [segment['end']] * len(text_words),
+                        segment['start'] + offset,
+                        segment['end'] + offset
+                    )
+        return ir
+
+@lru_cache(maxsize=None)
+def _word_tags(style: str, primary_color: str, secondary_color: str) -> tuple:
+    """Цикл тегов по позиции слова для стиля пресета"""
+    if style == 'rainbow':
+        return tuple(f"{{\\c{color}}}" for color in ('&H00FFFF&', '&HFF00FF&', '&H0080FF&', '&H00FF80&', '&H8000FF&'))
+    if style == 'glow':
+        return (f"{{\\c{primary_color}\\blur2}}", f"{{\\c{secondary_color}}}")
+    if style == 'matrix':
+        return (f"{{\\c{primary_color}\\fscx120\\fscy120}}", f"{{\\c{secondary_color}}}", f"{{\\c{secondary_color}}}")
+    if style == 'bold':
+        return (f"{{\\c{primary_color}\\b1}}", f"{{\\c{secondary_color}\\b0}}")
+    return (f"{{\\c{primary_color}}}", f"{{\\c{secondary_color}}}")
+
+def preset_style(preset_name: str) -> str:
+    """Стиль форматирования слов по имени пресета (определяется один раз на файл, не на слово)"""
+    if 'Rainbow' in preset_name:
+        return 'rainbow'
+    if 'Neon' in preset_name or 'Fire' in preset_name:
+        return 'glow'
+    if 'Matrix' in preset_name:
+        return 'matrix'
+    if 'Poppins' in preset_name or 'Montserrat' in preset_name or 'Roboto' in preset_name:
+        return 'bold'
+    return 'alternate'
+
+def compile_formatter(style: str, primary_color: str, secondary_color: str):
+    """Функция слова события -> текст ASS с тегами; теги построены заранее"""
+    tags = _word_tags(style, primary_color, secondary_color)
+    # Теги для событий до DEFAULT_MAX_WORDS слов без вычисления остатка на каждом слове
+    cycle = tuple(tags[i % len(tags)] for i in range(max(DEFAULT_MAX_WORDS, len(tags))))
+    
+    def format_words(words: list) -> str:
+        if len(words) > len(cycle):
+            return " ".join(f"{tags[i % len(tags)]}{word}{{\\r}}" for i, word in enumerate(words))
+        return " ".join(f"{tag}{word}{{\\r}}" for tag, word in zip(cycle, words))
+    
+    return format_words
+
+def ass_header(title: str, font_name: str, font_size, primary_color: str, secondary_color: str,
+               outline, shadow, alignment, margin_v) -> str:
+    return ASS_HEADER_TEMPLATE.format(
+        title=title, font_name=font_name, font_size=font_size, primary_color=primary_color,
+        secondary_color=secondary_color, outline=outline, shadow=shadow, alignment=alignment, margin_v=margin_v
+    )
+
+def ass_time(seconds: float) -> str:
+    """Секунды -> H:MM:SS.cc (сотые отбрасываются, как в прежнем seconds_to_ass_time)"""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    centisecs = int((seconds % 1) * 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centisecs:02d}"
+
+def _clock_time(seconds: float, separator: str) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+def srt_time(seconds: float) -> str:
+    return _clock_time(seconds, ',')
+
+def vtt_time(seconds: float) -> str:
+    return _clock_time(seconds, '.')
+
+def _write_lines(path: Path, lines) -> int:
+    """Построчная запись через временный файл (незаконченный файл не подменяет готовый)"""
+    path = Path(path)
+    temp_path = path.with_name(f".{path.name}.part")
+    with open(temp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_BYTES) as f:
+        f.writelines(lines)
+        size = f.tell()
+    temp_path.replace(path)
+    return size
+
+def write_ass(ir: SubtitleIR, path: Path, header: str, formatter) -> int:
+    """ASS: заголовок стиля и по строке Dialogue на событие"""
+    def lines():
+        yield header
+        for start, end, words in ir.events():
+            yield f"Dialogue: 0,{ass_time(start)},{ass_time(end)},Default,,0,0,0,,{formatter(words)}\n"
+    return _write_lines(path, lines())
+
+def write_srt(ir: SubtitleIR, path: Path) -> int:
+    def lines():
+        for number, (start, end, words) in enumerate(ir.events(), 1):
+            yield f"{number}\n{srt_time(start)} --> {srt_time(end)}\n{' '.join(words)}\n\n"
+    return _write_lines(path, lines())
+
+def write_vtt(ir: SubtitleIR, path: Path) -> int:
+    def lines():
+        yield "WEBVTT\n\n"
+        for start, end, words in ir.events():
+            yield f"{vtt_time(start)} --> {vtt_time(end)}\n{' '.join(words)}\n\n"
+    return _write_lines(path, lines())
+
+SUBTITLE_WRITERS = {'srt': write_srt, 'vtt': write_vtt}
+
+def export_plain_subtitles(ir: SubtitleIR, subtitle_file: Path, formats) -> list:
+    """SRT/VTT рядом с ASS (то же имя, другое расширение): список записанных файлов"""
+    written = []
+    for fmt in formats or ():
+        writer = SUBTITLE_WRITERS.get(fmt.lower().lstrip('.'))
+        if writer is None:
+            logger.warning(f"⚠️ Unknown subtitle export format: {fmt}")
+            continue
+        path = Path(subtitle_file).with_suffix(f".{fmt.lower().lstrip('.')}")
+        writer(ir, path)
+        written.append(path)
+    return written
+
+def synthetic_result(word_count: int) -> dict:
+    """Длинный транскрипт для замера: слова по 0.3 с, сегменты по 12 слов"""
+    segments = []
+    for first in range(0, word_count, 12):
+        words = [
+            {'word': f' word{i}', 'start': i * 0.3, 'end': i * 0.3 + 0.25}
+            for i in range(first, min(first + 12, word_count))
+        ]
+        segments.append({'start': words[0]['start'], 'end': words[-1]['end'], 'text': '', 'words': words})
+    return {'segments': segments}
+
+def benchmark(word_counts: list, output_dir: Path) -> list:
+    """Время построения IR и записи ASS для транскриптов разной длины (рост должен быть линейным)"""
+    formatter = compile_formatter('bold', '&HFFFFFF&', '&HF0F0F0&')
+    header = ass_header('Benchmark', 'Arial Black', 28, '&HFFFFFF&', '&HF0F0F0&', 3, 2, 2, 60)
+    rows = []
+    for word_count in word_counts:
+        result = synthetic_result(word_count)
+        started = time.perf_counter()
+        ir = SubtitleIR.from_result(result)
+        size = write_ass(ir, output_dir / f'benchmark_{word_count}.ass', header, formatter)
+        elapsed = time.perf_counter() - started
+        rows.append({'words': word_count, 'events': len(ir), 'bytes': size, 'seconds': round(elapsed, 4),
+                     'us_per_word': round(elapsed / word_count * 1e6, 2)})
+        logger.info(f"📝 {word_count} words -> {len(ir)} events in {elapsed * 1000:.0f} ms")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Subtitle export from saved word timings")
+    parser.add_argument('audio', nargs='?', help="narration with a transcript sidecar")
+    parser.add_argument('--format', choices=sorted(SUBTITLE_WRITERS), default='srt')
+    parser.add_argument('--offset', type=float, default=0.0)
+    parser.add_argument('--benchmark', type=int, nargs='*', metavar='WORDS', help="time IR + ASS writing on synthetic transcripts")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    if args.benchmark is not None:
+        import json
+        import tempfile
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rows = benchmark(args.benchmark or [1000, 10000, 100000], Path(temp_dir))
+        print(json.dumps(rows, indent=2))
+        return 0
+    
+    if not args.audio:
+        parser.error("audio file or --benchmark required")
+    
+    from transcript_cache import load_latest_transcript
+    result = load_latest_transcript(Path(args.audio))
+    if result is None:
+        logger.error(f"❌ No saved word timings for {args.audio}")
+        return 1
+    
+    ir = SubtitleIR.from_result(result, args.offset, segment_fallback=True)
+    written = export_plain_subtitles(ir, Path(args.audio), [args.format])
+    logger.info(f"✅ {len(ir)} subtitle events -> {written[0]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SUBTITLE SPRITES
+Наложение субтитров прямо в кадры слайдшоу вместо отдельного прожига ass-фильтром
+• Каждое событие ASS растрируется один раз самим libass (ffmpeg ass) в спрайт
+• Спрайт = цвет на черном фоне + пропускание фона (рендер на черном и на белом)
+• Смешивание только в прямоугольнике спрайта; спрайты читаются потоком по мере показа
+• Проверка: кадр с наложенным спрайтом сравнивается с прожигом того же кадра через libass
+
+Проверка: python subtitle_sprites.py subtitles.ass --verify
+"""
+
+import sys
+import math
+import json
+import queue
+import argparse
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+from subtitle_fonts import ass_filter, resolve_fonts_dir
+
+logger = logging.getLogger(__name__)
+
+# Рендер листа спрайтов: одно событие на кадр, кадр длиной в целое число сотых секунды
+SHEET_SLOT_CENTISECONDS = 4
+PREFETCH_SPRITES = 8
+VERIFY_MIN_PSNR = 40.0
+
+class SubtitleSprite:
+    """Растр события в пределах прямоугольника: premultiplied цвет (BGR) и пропускание фона 0..255"""
+    
+    __slots__ = ('y0', 'y1', 'x0', 'x1', 'color', 'transmission')
+    
+    def __init__(self, y0: int, y1: int, x0: int, x1: int, color, transmission):
+        self.y0, self.y1, self.x0, self.x1 = y0, y1, x0, x1
+        self.color = color
+        self.transmission = transmission
+    
+    def blend(self, frame):
+        """Наложение на кадр BGR uint8 (на месте): фон * пропускание + цвет"""
+        roi = frame[self.y0:self.y1, self.x0:self.x1]
+        mixed = (roi.astype(np.uint16) * self.transmission + 127) // 255 + self.color
+        np.minimum(mixed, 255, out=mixed)
+        roi[...] = mixed
+
+def ass_time_ms(value: str) -> int:
+    hours, minutes, seconds = value.strip().split(':')
+    secs, centis = seconds.split('.')
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(secs)) * 1000 + int(centis.ljust(2, '0')[:2]) * 10
+
+def _ass_time(ms: int) -> str:
+    centis = ms // 10
+    return f"{centis // 360000}:{centis // 6000 % 60:02d}:{centis // 100 % 60:02d}.{centis % 100:02d}"
+
+def read_ass_events(subtitle_file: Path) -> tuple:
+    """(строки файла без Dialogue, [(начало мс, конец мс, слой, поля после времени), ...] по времени начала)"""
+    header = []
+    events = []
+    with open(subtitle_file, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            if line.startswith('Dialogue:'):
+                layer, start, end, rest = line[len('Dialogue:'):].split(',', 3)
+                events.append((ass_time_ms(start), ass_time_ms(end), layer.strip(), rest.rstrip()))
+            else:
+                header.append(line)
+    events.sort(key=lambda event: event[0])
+    return header, events
+
+def write_sprite_sheet(header: list, events: list, sheet_file: Path):
+    """ASS, где событие k показывается только в кадре k листа"""
+    slot_ms = SHEET_SLOT_CENTISECONDS * 10
+    with open(sheet_file, 'w', encoding='utf-8') as f:
+        f.writelines(header)
+        for k, (_, _, layer, rest) in enumerate(events):
+            f.write(f"Dialogue: {layer},{_ass_time(k * slot_ms)},{_ass_time((k + 1) * slot_ms)},{rest}\n")
+
+def _sheet_process(sheet_file: Path, background: str, width: int, height: int, frame_count: int, fonts_dir: Path = None):
+    """ffmpeg: лист спрайтов на сплошном фоне, сырые кадры BGR в stdout"""
+    rate = 100 / SHEET_SLOT_CENTISECONDS
+    cmd = [
+        'ffmpeg', '-v', 'error',
+        '-f', 'lavfi', '-i', f"color=c={background}:s={width}x{height}:r={rate:g}",
+        '-vf', f"format=bgr24,{ass_filter(sheet_file, fonts_dir)}",
+        '-frames:v', str(frame_count),
+        '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1'
+    ]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=width * height * 3)
+
+def _read_frame(stream, frame_bytes: int, width: int, height: int):
+    data = stream.read(frame_bytes)
+    if len(data) != frame_bytes:
+        return None
+    return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+
+def sprite_from_renders(on_black, on_white):
+    """Спрайт из рендеров на черном (= premultiplied цвет) и белом (разница = пропускание фона)"""
+    covered = (on_black != 0).any(axis=2) | (on_white != 255).any(axis=2)
+    rows = np.flatnonzero(covered.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(covered.any(axis=0))
+    y0, y1, x0, x1 = int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+    
+    color = on_black[y0:y1, x0:x1].astype(np.uint16)
+    transmission = (on_white[y0:y1, x0:x1].astype(np.int16) - color).clip(0, 255).astype(np.uint16)
+    return SubtitleSprite(y0, y1, x0, x1, color, transmission)
+
+def render_sprites(header: list, events: list, width: int, height: int, work_dir: Path, fonts_dir: Path = None):
+    """Генератор спрайтов событий по порядку (None - пустое событие); ffmpeg рендерит лист потоком"""
+    sheet_file = work_dir / 'sprite_sheet.ass'
+    write_sprite_sheet(header, events, sheet_file)
+    
+    frame_bytes = width * height * 3
+    black = _sheet_process(sheet_file, 'black', width, height, len(events), fonts_dir)
+    white = _sheet_process(sheet_file, 'white', width, height, len(events), fonts_dir)
+    try:
+        for k in range(len(events)):
+            on_black = _read_frame(black.stdout, frame_bytes, width, height)
+            on_white = _read_frame(white.stdout, frame_bytes, width, height)
+            if on_black is None or on_white is None:
+                raise RuntimeError(f"libass sprite rendering stopped at event {k}/{len(events)}")
+            yield sprite_from_renders(on_black, on_white)
+    finally:
+        for process in (black, white):
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+class SubtitleCompositor:
+    """Субтитры ASS для кадров слайдшоу: apply(кадр, номер кадра) накладывает активное событие"""
+    
+    def __init__(self, subtitle_file: Path, width: int = 1920, height: int = 1080, fps: int = 25, fonts_dir: Path = None):
+        self.subtitle_file = Path(subtitle_file)
+        self.fonts_dir = fonts_dir
+        self.width = width
+        self.height = height
+        self.fps = fps
+        
+        self.events = []
+        self._sprites = None
+        self._reader = None
+        self._stop = threading.Event()
+        self._work_dir = None
+        self._next = 0
+        self._current = None
+        self._current_end = -1
+        self.stats = {'events': 0, 'blended_frames': 0, 'sprite_pixels': 0}
+    
+    def start(self) -> bool:
+        """Разбор ASS и запуск фонового растрирования (False - наложение невозможно, нужен прожиг)"""
+        try:
+            header, self.events = read_ass_events(self.subtitle_file)
+            
+            # Одновременные события libass раздвигает друг от друга - одиночные спрайты этого не повторят
+            for previous, following in zip(self.events, self.events[1:]):
+                if following[0] < previous[1]:
+                    logger.warning("⚠️ Overlapping subtitle events, in-render compositing disabled")
+                    return False
+            
+            self._work_dir = Path(tempfile.mkdtemp(prefix='subtitle_sprites_'))
+            self._sprites = queue.Queue(maxsize=PREFETCH_SPRITES)
+            generator = render_sprites(header, self.events, self.width, self.height, self._work_dir, self.fonts_dir)
+            
+            def prefetch():
+                try:
+                    for sprite in generator:
+                        while not self._stop.is_set():
+                            try:
+                                self._sprites.put(sprite, timeout=0.5)
+                                break
+                            except queue.Full:
+                                pass
+                        if self._stop.is_set():
+                            break
+                except Exception as e:
+                    self._sprites.put(e)
+                finally:
+                    generator.close()
+            
+            self._reader = threading.Thread(target=prefetch, name='subtitle-sprites', daemon=True)
+            self._reader.start()
+            self.stats['events'] = len(self.events)
+            logger.info(f"🔤 Compositing {len(self.events)} subtitle events into slideshow frames")
+            return True
+        
+        except Exception as e:
+            logger.error(f"❌ Subtitle sprite setup failed: {e}")
+            return False
+    
+    def _take_sprite(self):
+        item = self._sprites.get()
+        if isinstance(item, Exception):
+            raise item
+        return item
+    
+    def apply(self, frame, frame_index: int):
+        """Наложение события, активного в момент кадра (как ass-фильтр: начало <= t < конец)"""
+        t = int(frame_index * 1000 / self.fps)
+        
+        while self._next < len(self.events) and self.events[self._next][0] <= t:
+            sprite = self._take_sprite()
+            self._current, self._current_end = sprite, self.events[self._next][1]
+            self._next += 1
+            if sprite is not None:
+                self.stats['sprite_pixels'] += (sprite.y1 - sprite.y0) * (sprite.x1 - sprite.x0)
+        
+        if self._current is not None and t < self._current_end:
+            self._current.blend(frame)
+            self.stats['blended_frames'] += 1
+        return frame
+    
+    def close(self):
+        """Остановка растрирования и удаление временных файлов"""
+        self._stop.set()
+        if self._reader is not None:
+            self._reader.join(timeout=5)
+            self._reader = None
+        if self._work_dir is not None:
+            for path in self._work_dir.glob('*'):
+                path.unlink()
+            self._work_dir.rmdir()
+            self._work_dir = None
+
+def test_background(width: int, height: int):
+    """Детерминированный фон проверки: градиент с шумом"""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.integers(0, 64, size=(height, width, 3))
+    return ((gradient + noise) % 256).astype(np.uint8)
+
+def libass_reference(background, subtitle_file: Path, t_ms: int, fps: int, fonts_dir: Path = None):
+    """Тот же кадр, прожженный ass-фильтром в момент t_ms"""
+    height, width = background.shape[:2]
+    cmd = [
+        'ffmpeg', '-v', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:0',
+        '-vf', f"setpts=PTS+{t_ms / 1000:.3f}/TB,{ass_filter(subtitle_file, fonts_dir)}",
+        '-frames:v', '1', '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1'
+    ]
+    result = subprocess.run(cmd, input=background.tobytes(), capture_output=True)
+    if result.returncode != 0 or len(result.stdout) != background.nbytes:
+        raise RuntimeError(f"libass reference render failed: {result.stderr.decode(errors='replace')[-300:]}")
+    return np.frombuffer(result.stdout, dtype=np.uint8).reshape(background.shape)
+
+def verify_against_libass(subtitle_file: Path, width: int = 1920, height: int = 1080, fps: int = 25,
+                          samples: int = 3, background=None, fonts_dir: Path = None) -> dict:
+    """Сравнение наложенных спрайтов с прожигом libass на нескольких событиях (PSNR в прямоугольнике спрайта)"""
+    header, events = read_ass_events(subtitle_file)
+    if not events:
+        return {'ok': True, 'events': 0}
+    
+    background = test_background(width, height) if background is None else background
+    step = max(1, len(events) // samples)
+    picked = events[::step][:samples]
+    
+    report = {'events': len(picked), 'max_diff': 0, 'psnr': []}
+    with tempfile.TemporaryDirectory(prefix='subtitle_verify_') as work_dir:
+        sprites = list(render_sprites(header, picked, width, height, Path(work_dir), fonts_dir))
+        for (start, end, _, _), sprite in zip(picked, sprites):
+            # Кадр в середине события
+            t_ms = int(math.ceil((start + end) / 2 * fps / 1000) * 1000 / fps)
+            reference = libass_reference(background, subtitle_file, t_ms, fps, fonts_dir)
+            composited = background.copy()
+            if sprite is not None:
+                sprite.blend(composited)
+            
+            diff = np.abs(composited.astype(np.int16) - reference)
+            report['max_diff'] = max(report['max_diff'], int(diff.max()))
+            if sprite is None:
+                report['psnr'].append(float('inf') if not diff.any() else 0.0)
+                continue
+            box = diff[sprite.y0:sprite.y1, sprite.x0:sprite.x1].astype(np.float64)
+            mse = float((box ** 2).mean())
+            report['psnr'].append(float('inf') if mse == 0 else 10 * math.log10(255 ** 2 / mse))
+    
+    report['min_psnr'] = min(report['psnr'])
+    report['ok'] = report['min_psnr'] >= VERIFY_MIN_PSNR
+    icon = '✅' if report['ok'] else '❌'
+    logger.info(f"{icon} Subtitle sprites vs libass: min PSNR {report['min_psnr']:.1f} dB, "
+                f"max pixel diff {report['max_diff']} ({report['events']} events)")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Subtitle sprite compositing check")
+    parser.add_argument('subtitles', help="ASS file")
+    parser.add_argument('--verify', action='store_true', help="compare composited sprites with libass burn-in")
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--size', default='1920x1080')
+    parser.add_argument('--fonts-dir', help="fonts directory for libass (default: fonts/ next to the scripts)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    width, height = (int(value) for value in args.size.split('x'))
+    report = verify_against_libass(Path(args.subtitles), width, height, samples=args.samples,
+                                   fonts_dir=resolve_fonts_dir(args.fonts_dir))
+    report['psnr'] = [round(value, 2) if math.isfinite(value) else 'inf' for value in report.get('psnr', [])]
+    if 'min_psnr' in report and math.isfinite(report['min_psnr']):
+        report['min_psnr'] = round(report['min_psnr'], 2)
+    print(json.dumps(report, indent=2, default=str))
+    return 0 if report['ok'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
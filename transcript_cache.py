@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TRANSCRIPT CACHE
+Тайминги слов сохраняются рядом с озвучкой в компактном sidecar-файле (*.words.json.gz)
+• Ключ: хэш аудио, модель Whisper и параметры распознавания
+• Смена пресета, позиции или смещения субтитров не требует повторного распознавания
+• Последняя запись файла используется для мгновенной перестилизации готового видео
+"""
+
+import gzip
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = '.words.json.gz'
+SIDECAR_VERSION = 1
+# Записей на один файл озвучки (разные параметры распознавания)
+MAX_ENTRIES = 4
+
+def sidecar_path(audio_file: Path) -> Path:
+    audio_file = Path(audio_file)
+    return audio_file.with_name(audio_file.stem + SIDECAR_SUFFIX)
+
+def audio_hash(audio_file: Path) -> str:
+    """Хэш содержимого аудио (новая озвучка с тем же именем - другой ключ)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(audio_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def transcript_key(audio_digest: str, model_size: str, options: dict) -> str:
+    """Ключ записи: хэш аудио + модель + параметры распознавания"""
+    payload = json.dumps({'audio': audio_digest, 'model': model_size, 'options': options}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def compact_result(result: dict) -> list:
+    """Сегменты в компактном виде: [начало, конец, текст, [[слово, начало, конец], ...]]"""
+    return [
+        [
+            round(segment['start'], 3), round(segment['end'], 3), segment.get('text', ''),
+            [[word['word'], round(word['start'], 3), round(word['end'], 3)] for word in segment.get('words', [])]
+        ]
+        for segment in result.get('segments', [])
+    ]
+
+def expand_result(segments: list, language: str = None) -> dict:
+    """Обратно в формат результата transcribe"""
+    expanded = [
+        {
+            'id': i, 'start': start, 'end': end, 'text': text,
+            'words': [{'word': word, 'start': word_start, 'end': word_end} for word, word_start, word_end in words]
+        }
+        for i, (start, end, text, words) in enumerate(segments)
+    ]
+    return {'text': ''.join(segment['text'] for segment in expanded), 'segments': expanded, 'language': language}
+
+def _read_sidecar(path: Path) -> dict:
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') == SIDECAR_VERSION:
+            return data
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Unreadable transcript sidecar {path.name}: {e}")
+    return {'version': SIDECAR_VERSION, 'entries': {}}
+
+def load_transcript(audio_file: Path, model_size: str, options: dict):
+    """Тайминги из sidecar для этой озвучки и параметров (None - нет записи)"""
+    path = sidecar_path(audio_file)
+    if not path.exists():
+        return None
+    
+    key = transcript_key(audio_hash(audio_file), model_size, options)
+    entry = _read_sidecar(path)['entries'].get(key)
+    if entry is None:
+        return None
+    
+    logger.info(f"♻️ Word timings from {path.name} ({entry['source']}, Whisper skipped)")
+    return expand_result(entry['segments'], entry.get('language'))
+
+def save_transcript(audio_file: Path, model_size: str, options: dict, result: dict, source: str = 'whisper') -> bool:
+    """Запись таймингов в sidecar (старые записи сверх MAX_ENTRIES вытесняются)"""
+    path = sidecar_path(audio_file)
+    try:
+        digest = audio_hash(audio_file)
+        data = _read_sidecar(path) if path.exists() else {'version': SIDECAR_VERSION, 'entries': {}}
+        
+        # Записи для прежней озвучки с тем же именем больше не нужны
+        entries = {key: entry for key, entry in data['entries'].items() if entry.get('audio') == digest}
+        entries[transcript_key(digest, model_size, options)] = {
+            'audio': digest,
+            'source': source,
+            'created': time.time(),
+            'language': result.get('language'),
+            'segments': compact_result(result),
+        }
+        data['entries'] = dict(sorted(entries.items(), key=lambda item: item[1]['created'])[-MAX_ENTRIES:])
+        
+        temp_path = path.with_name(f".{path.name}.part")
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        temp_path.replace(path)
+        return True
+    
+    except Exception as e:
+        logger.warning(f"⚠️ Could not save transcript sidecar for {Path(audio_file).name}: {e}")
+        return False
+
+def load_latest_transcript(audio_file: Path):
+    """Последние сохраненные тайминги этой озвучки (для перестилизации, None - нет)"""
+    path = sidecar_path(audio_file)
+    if not path.exists():
+        return None
+    
+    digest = audio_hash(audio_file)
+    entries = [entry for entry in _read_sidecar(path)['entries'].values() if entry.get('audio') == digest]
+    if not entries:
+        return None
+    
+    entry = max(entries, key=lambda e: e['created'])
+    return expand_result(entry['segments'], entry.get('language'))
@@ -0,0 +1,862 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WHISPER TRANSCRIPTION PROFILES
+Профили распознавания для субтитров: скорость против точности
+• fast / balanced / accurate: beam size, best_of, temperature fallback, condition_on_previous_text
+• Язык сценария передается в Whisper - без отдельного прохода определения языка
+• Бенчмарк профилей: real-time factor и ошибка таймингов слов
+• Принудительное выравнивание известного текста сценария (DTW по cross-attention Whisper)
+• Аудио декодируется один раз в 16 кГц массив в памяти и передается в Whisper без временных файлов
+• Длинная озвучка режется по паузам и распознается фрагментами параллельно в нескольких процессах
+  (пул процессов общий для всех видео - модель загружается в каждом процессе один раз)
+• Движок (openai / faster-whisper int8 / torch int8) и размер модели - из config, 'auto' - по аудио и CPU
+• Пакетный режим: окна нескольких файлов декодируются вместе (батч whisper.decode)
+
+Бенчмарк: python transcription.py voice.mp3 --text script.txt [--reference words.json]
+Фрагменты: python transcription.py voice.mp3 --workers 4
+Движки: python transcription.py a.mp3 b.mp3 --backends openai faster-whisper-int8 torch-int8
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import atexit
+import argparse
+import logging
+import threading
+import subprocess
+import multiprocessing
+from pathlib import Path
+from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from whisper_pool import get_whisper_pool
+from transcription_backends import (TRANSCRIPTION_BACKENDS, DEFAULT_BACKEND, get_backend, available_backends,
+                                    resolve_backend_name, choose_model_size)
+from media_probe import get_duration
+from language_detector import split_language_runs
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_PROFILES = {
+    'fast': {
+        'name': 'Fast (greedy, no fallback)',
+        'beam_size': None,
+        'best_of': None,
+        'temperature': 0.0,
+        'condition_on_previous_text': False,
+    },
+    'balanced': {
+        'name': 'Balanced (greedy, short fallback)',
+        'beam_size': None,
+        'best_of': 2,
+        'temperature': (0.0, 0.2, 0.4),
+        'condition_on_previous_text': True,
+    },
+    'accurate': {
+        'name': 'Accurate (beam search, full fallback)',
+        'beam_size': 5,
+        'best_of': 5,
+        'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        'condition_on_previous_text': True,
+    },
+}
+
+DEFAULT_PROFILE = 'balanced'
+
+# Частота дискретизации, с которой работает Whisper
+WHISPER_SAMPLE_RATE = 16000
+
+# Выравнивание: окно Whisper 30 с, слова у правого края окна переносятся в следующее
+ALIGN_EDGE_MARGIN = 1.5
+ALIGN_WORD_SURPLUS = 1.2
+ALIGN_MAX_WORDS = 150
+SENTENCE_END = ('.', '!', '?', '…')
+
+# Параллельное распознавание фрагментов: длина фрагмента, с какой длительности включается, поиск пауз
+SEGMENT_TARGET_SECONDS = 180.0
+SEGMENTED_MIN_SECONDS = 600.0
+ENERGY_FRAME_SECONDS = 0.02
+MIN_SILENCE_SECONDS = 0.3
+SILENCE_ABOVE_FLOOR_DB = 12.0
+SILENCE_MAX_DB = -35.0
+
+# Пакетный режим: окна файлов (разрез по паузам, не длиннее 30 с) декодируются батчами
+BATCH_SIZE = 16
+# Батчевый decode есть только у моделей openai-whisper (в том числе квантизованных)
+BATCH_BACKENDS = ('openai', 'torch-int8')
+# Профиль в ключе кэша для результатов пакетного режима (жадное декодирование при T=0)
+BATCH_PROFILE = 'batch'
+BATCH_WINDOW_TARGET_SECONDS = 20.0
+BATCH_WINDOW_MAX_SECONDS = 30.0
+# Окно считается тишиной (как в whisper.transcribe)
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+
+def get_transcribe_options(profile_name: str = DEFAULT_PROFILE, language: str = None) -> dict:
+    """Параметры model.transcribe для профиля (language=None - Whisper определяет язык сам)"""
+    if profile_name not in TRANSCRIPTION_PROFILES:
+        logger.warning(f"⚠️ Unknown transcription profile '{profile_name}', using {DEFAULT_PROFILE}")
+        profile_name = DEFAULT_PROFILE
+    
+    options = {'fp16': False, 'verbose': False, 'word_timestamps': True}
+    for key, value in TRANSCRIPTION_PROFILES[profile_name].items():
+        if key != 'name' and value is not None:
+            options[key] = value
+    if language:
+        options['language'] = language
+    return options
+
+def language_hint(text: str):
+    """Язык сценария для Whisper: None для пустого или смешанного текста"""
+    if not text or not text.strip():
+        return None
+    languages = {language for language, _ in split_language_runs(text)}
+    return languages.pop() if len(languages) == 1 else None
+
+def load_audio(audio_file: Path):
+    """Декодирование аудио (MP3/WAV/видео) в моно float32 массив 16 кГц в памяти"""
+    import whisper
+    return whisper.load_audio(str(audio_file))
+
+def audio_length(audio) -> float:
+    """Длительность: для пути - по заголовкам файла, для массива - по числу сэмплов"""
+    if isinstance(audio, (str, Path)):
+        return get_duration(audio)
+    return len(audio) / WHISPER_SAMPLE_RATE
+
+def resolve_model(config: dict, audio_seconds: float, threads: int = None) -> tuple:
+    """(движок, размер модели) из config: 'auto' в whisper_model - подбор по длительности аудио и потокам"""
+    backend_name = resolve_backend_name(config.get('transcription_backend', DEFAULT_BACKEND))
+    model_size = config.get('whisper_model', 'base')
+    if model_size == 'auto':
+        model_size = choose_model_size(
+            audio_seconds, backend_name, threads,
+            time_budget=config.get('transcription_time_budget', 0.25),
+            max_seconds=config.get('transcription_max_seconds', 180.0),
+            max_size=config.get('whisper_max_model', 'small')
+        )
+    return backend_name, model_size
+
+def transcribe_audio(audio_file, config: dict, language: str = None, model_size: str = 'base'):
+    """Распознавание аудио (путь или массив 16 кГц) по профилю из config['transcription_profile']"""
+    profile_name = config.get('transcription_profile', DEFAULT_PROFILE)
+    options = get_transcribe_options(profile_name, language)
+    backend = get_backend(config.get('transcription_backend', DEFAULT_BACKEND))
+    audio = str(audio_file) if isinstance(audio_file, Path) else audio_file
+    
+    started = time.monotonic()
+    with get_whisper_pool().acquire(model_size, backend=backend.name) as model:
+        result = backend.transcribe(model, audio, options)
+    elapsed = time.monotonic() - started
+    
+    audio_duration = audio_length(audio_file) or result_duration(result)
+    rtf = elapsed / audio_duration if audio_duration > 0 else 0.0
+    logger.info(f"🎧 Whisper '{profile_name}' {backend.name}/{model_size} ({language or 'auto'}): "
+                f"{elapsed:.1f}s, RTF {rtf:.2f}")
+    return result
+
+def _get_tokenizer(model, language: str):
+    from whisper.tokenizer import get_tokenizer
+    try:
+        return get_tokenizer(model.is_multilingual, num_languages=model.num_languages, language=language, task='transcribe')
+    except (TypeError, AttributeError):
+        return get_tokenizer(model.is_multilingual, language=language, task='transcribe')
+
+def _window_mel(model, samples):
+    from whisper.audio import log_mel_spectrogram, pad_or_trim
+    try:
+        mel = log_mel_spectrogram(pad_or_trim(samples), model.dims.n_mels)
+    except TypeError:
+        mel = log_mel_spectrogram(pad_or_trim(samples))
+    return mel.to(model.device)
+
+def _map_script_words(words: list, timings: list) -> list:
+    """Тайминги токенов Whisper -> слова сценария (по символьным позициям в общем тексте)"""
+    spans = []
+    position = 0
+    for timing in timings:
+        spans.append((position, position + len(timing.word), timing))
+        position += len(timing.word)
+    
+    mapped = []
+    position = 0
+    span_index = 0
+    for word in words:
+        # Текст окна кодируется как ' ' + ' '.join(words)
+        word_start = position + 1
+        word_end = word_start + len(word)
+        position = word_end
+        
+        while span_index < len(spans) and spans[span_index][1] <= word_start:
+            span_index += 1
+        covering = []
+        k = span_index
+        while k < len(spans) and spans[k][0] < word_end:
+            covering.append(spans[k][2])
+            k += 1
+        if not covering:
+            return None
+        
+        mapped.append({
+            'word': ' ' + word,
+            'start': float(covering[0].start),
+            'end': float(covering[-1].end),
+            'probability': float(sum(t.probability for t in covering) / len(covering)),
+        })
+    return mapped
+
+def _fit_token_budget(tokenizer, batch: list, max_tokens: int):
+    """Самый длинный префикс слов, текст которого укладывается в max_tokens: (слова, токены).
+    Лимит ALIGN_MAX_WORDS считает слова, а кириллица занимает в несколько раз больше токенов"""
+    tokens = tokenizer.encode(' ' + ' '.join(batch))
+    if len(tokens) <= max_tokens:
+        return batch, tokens
+    
+    low, high = 1, len(batch) - 1
+    fitted = batch[:1], tokenizer.encode(' ' + batch[0])
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = tokenizer.encode(' ' + ' '.join(batch[:middle]))
+        if len(candidate) <= max_tokens:
+            fitted = batch[:middle], candidate
+            low = middle + 1
+        else:
+            high = middle - 1
+    return fitted
+
+def _group_sentences(words: list) -> list:
+    """Слова -> сегменты по концам предложений (формат сегментов Whisper)"""
+    segments = []
+    current = []
+    for word in words:
+        current.append(word)
+        if word['word'].rstrip('"»)\'').endswith(SENTENCE_END) or len(current) >= 40:
+            segments.append(current)
+            current = []
+    if current:
+        segments.append(current)
+    
+    return [
+        {'start': seg[0]['start'], 'end': seg[-1]['end'], 'text': ''.join(w['word'] for w in seg), 'words': seg}
+        for seg in segments
+    ]
+
+def align_script(audio_file, text: str, language: str = None, model_size: str = 'base'):
+    """Выравнивание известного текста по аудио (путь или массив 16 кГц): формат transcribe или None"""
+    import whisper
+    from whisper.audio import SAMPLE_RATE, N_SAMPLES, HOP_LENGTH
+    from whisper.timing import find_alignment
+    
+    words = text.split()
+    if not words:
+        return None
+    
+    started = time.monotonic()
+    audio = audio_file if not isinstance(audio_file, (str, Path)) else whisper.load_audio(str(audio_file))
+    audio_seconds = len(audio) / SAMPLE_RATE
+    if audio_seconds <= 0:
+        return None
+    
+    window_seconds = N_SAMPLES / SAMPLE_RATE
+    words_per_second = len(words) / audio_seconds
+    aligned = []
+    cursor = 0
+    window_start = 0.0
+    
+    with get_whisper_pool().acquire(model_size) as model:
+        tokenizer = _get_tokenizer(model, language or language_hint(text) or 'en')
+        # find_alignment добавляет sot-последовательность, no_timestamps и eot к токенам текста
+        max_text_tokens = model.dims.n_text_ctx - len(tokenizer.sot_sequence) - 2
+        
+        while cursor < len(words):
+            if window_start >= audio_seconds - 0.05:
+                logger.warning(f"⚠️ Alignment ran out of audio with {len(words) - cursor} words left")
+                return None
+            
+            start_sample = int(window_start * SAMPLE_RATE)
+            samples = audio[start_sample:start_sample + N_SAMPLES]
+            last_window = start_sample + N_SAMPLES >= len(audio)
+            
+            # Слов с запасом: лишние сожмутся у правого края окна и будут отброшены
+            if last_window:
+                batch = words[cursor:cursor + ALIGN_MAX_WORDS]
+            else:
+                expected = math.ceil(window_seconds * words_per_second * ALIGN_WORD_SURPLUS) + 3
+                batch = words[cursor:cursor + min(expected, ALIGN_MAX_WORDS)]
+            
+            batch, text_tokens = _fit_token_budget(tokenizer, batch, max_text_tokens)
+            timings = find_alignment(model, tokenizer, text_tokens, _window_mel(model, samples), len(samples) // HOP_LENGTH)
+            mapped = _map_script_words(batch, timings) if timings else None
+            if not mapped:
+                logger.warning("⚠️ Alignment window could not be mapped to script words")
+                return None
+            
+            window_length = len(samples) / SAMPLE_RATE
+            if last_window and cursor + len(batch) == len(words):
+                accepted = mapped
+            else:
+                accepted = []
+                for word in mapped:
+                    if word['end'] > window_length - ALIGN_EDGE_MARGIN:
+                        break
+                    accepted.append(word)
+                # Все слова уложились - последнее могло поглотить речь следующих слов
+                if len(accepted) == len(mapped) and len(accepted) > 1:
+                    accepted.pop()
+                accepted = accepted or mapped[:1]
+            
+            for word in accepted:
+                word['start'] += window_start
+                word['end'] += window_start
+            aligned.extend(accepted)
+            cursor += len(accepted)
+            
+            # Следующее окно начинается с конца последнего принятого слова
+            window_start = max(window_start + 0.5, accepted[-1]['end'])
+    
+    elapsed = time.monotonic() - started
+    logger.info(f"🧭 Forced alignment: {len(aligned)} words in {elapsed:.1f}s (RTF {elapsed / audio_seconds:.2f})")
+    return {
+        'text': ' ' + ' '.join(words),
+        'segments': _group_sentences(aligned),
+        'language': language or language_hint(text),
+    }
+
+def frame_energy_db(samples, frame_seconds: float = ENERGY_FRAME_SECONDS):
+    """Энергия (dBFS) кадров float-массива 16 кГц (неполный последний кадр отбрасывается)"""
+    frame_samples = int(WHISPER_SAMPLE_RATE * frame_seconds)
+    count = len(samples) // frame_samples
+    if count == 0:
+        return np.zeros(0, np.float32)
+    frames = np.asarray(samples[:count * frame_samples], np.float32).reshape(count, frame_samples)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-5))
+
+def audio_energy_db(audio_file: Path, frame_seconds: float = ENERGY_FRAME_SECONDS):
+    """Энергия (dBFS) кадров аудио: потоковый декод ffmpeg без загрузки всего файла в память"""
+    frame_samples = int(WHISPER_SAMPLE_RATE * frame_seconds)
+    cmd = [
+        'ffmpeg', '-nostdin', '-threads', '0', '-i', str(audio_file),
+        '-f', 's16le', '-ac', '1', '-ar', str(WHISPER_SAMPLE_RATE), '-'
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    
+    levels = []
+    tail = b''
+    chunk_bytes = frame_samples * 2 * 500
+    while True:
+        chunk = process.stdout.read(chunk_bytes)
+        if not chunk:
+            break
+        data = tail + chunk
+        usable = len(data) - len(data) % (frame_samples * 2)
+        tail = data[usable:]
+        if usable:
+            # В памяти только уровни кадров, не сэмплы
+            samples = np.frombuffer(data[:usable], np.int16).astype(np.float32) / 32768.0
+            levels.append(frame_energy_db(samples, frame_seconds))
+    process.wait()
+    
+    if not levels:
+        return np.zeros(0, np.float32)
+    return np.concatenate(levels)
+
+def silence_split_points(energy_db, frame_seconds: float = ENERGY_FRAME_SECONDS,
+                         target_seconds: float = SEGMENT_TARGET_SECONDS) -> list:
+    """Точки разреза (с) в середине пауз, ближайших к каждому шагу target_seconds"""
+    total = len(energy_db) * frame_seconds
+    if total <= target_seconds * 1.5:
+        return []
+    
+    # Порог тишины - над уровнем фонового шума (10-й перцентиль)
+    threshold = min(np.percentile(energy_db, 10) + SILENCE_ABOVE_FLOOR_DB, SILENCE_MAX_DB)
+    silent = energy_db < threshold
+    
+    min_frames = max(1, int(MIN_SILENCE_SECONDS / frame_seconds))
+    pauses = []
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], silent.astype(np.int8), [0]))))
+    for start, end in zip(edges[0::2], edges[1::2]):
+        if end - start >= min_frames:
+            pauses.append((start + end) / 2 * frame_seconds)
+    
+    points = []
+    previous = 0.0
+    target = target_seconds
+    while target < total - target_seconds / 2:
+        window = [p for p in pauses if previous + target_seconds / 2 < p < target + target_seconds / 2]
+        if window:
+            point = min(window, key=lambda p: abs(p - target))
+        else:
+            point = target
+            logger.warning(f"⚠️ No pause near {target:.0f}s, hard split (a word may be cut at the seam)")
+        points.append(round(point, 3))
+        previous = point
+        target = point + target_seconds
+    return points
+
+def load_audio_range(audio_file: Path, start: float, duration: float = None):
+    """Декод фрагмента аудио в массив 16 кГц (-ss после -i: точная позиция сэмпла)"""
+    cmd = ['ffmpeg', '-nostdin', '-threads', '0', '-i', str(audio_file), '-ss', f'{start:.3f}']
+    if duration is not None:
+        cmd += ['-t', f'{duration:.3f}']
+    cmd += ['-f', 's16le', '-ac', '1', '-ar', str(WHISPER_SAMPLE_RATE), '-']
+    output = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+def shift_result(result: dict, offset: float) -> dict:
+    """Сдвиг таймингов сегментов и слов результата transcribe на offset секунд"""
+    for segment in result.get('segments', []):
+        segment['start'] += offset
+        segment['end'] += offset
+        for word in segment.get('words', []):
+            word['start'] += offset
+            word['end'] += offset
+    return result
+
+def merge_results(results: list) -> dict:
+    """Склейка уже сдвинутых результатов фрагментов в один результат transcribe"""
+    segments = []
+    for result in results:
+        segments.extend(result.get('segments', []))
+    for i, segment in enumerate(segments):
+        segment['id'] = i
+    return {
+        'text': ''.join(result.get('text', '') for result in results),
+        'segments': segments,
+        'language': next((result['language'] for result in results if result.get('language')), None),
+    }
+
+def segment_worker_count(config: dict) -> int:
+    """Число процессов распознавания фрагментов (config['transcription_workers'], 'auto' - по ядрам)"""
+    workers = config.get('transcription_workers', 1)
+    if workers == 'auto':
+        workers = min(4, (os.cpu_count() or 2) // 2)
+    return max(1, int(workers))
+
+def _init_segment_worker(threads: int):
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+_segment_executor = None
+_segment_executor_key = None
+_segment_executor_lock = threading.Lock()
+
+def get_segment_executor(workers: int, threads: int) -> ProcessPoolExecutor:
+    """Долгоживущий пул процессов для фрагментов: модели Whisper остаются загруженными между видео
+    (пул пересоздается только при смене числа процессов/потоков)"""
+    global _segment_executor, _segment_executor_key
+    with _segment_executor_lock:
+        if _segment_executor is not None and _segment_executor_key == (workers, threads):
+            return _segment_executor
+        if _segment_executor is not None:
+            _segment_executor.shutdown(wait=False)
+        else:
+            atexit.register(shutdown_segment_executor)
+        _segment_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_segment_worker, initargs=(threads,))
+        _segment_executor_key = (workers, threads)
+        logger.info(f"🧵 Segment transcription pool started ({workers} processes x {threads} threads)")
+        return _segment_executor
+
+def shutdown_segment_executor():
+    """Остановка пула фрагментов (модели выгружаются вместе с процессами)"""
+    global _segment_executor, _segment_executor_key
+    with _segment_executor_lock:
+        executor, _segment_executor, _segment_executor_key = _segment_executor, None, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+def _transcribe_segment(audio_file: str, start: float, duration: float, options: dict, model_size: str,
+                        backend_name: str = DEFAULT_BACKEND):
+    """Распознавание одного фрагмента в процессе-исполнителе: (результат со сдвигом, секунды)"""
+    started = time.monotonic()
+    audio = load_audio_range(Path(audio_file), start, duration)
+    backend = get_backend(backend_name)
+    with get_whisper_pool().acquire(model_size, backend=backend.name) as model:
+        result = backend.transcribe(model, audio, options)
+    return shift_result(result, start), time.monotonic() - started
+
+def transcribe_segmented(audio_file: Path, config: dict, language: str = None, model_size: str = 'base',
+                         workers: int = None):
+    """Распознавание длинной озвучки: разрез по паузам, фрагменты параллельно в процессах, склейка со сдвигом"""
+    workers = workers or segment_worker_count(config)
+    profile_name = config.get('transcription_profile', DEFAULT_PROFILE)
+    options = get_transcribe_options(profile_name, language)
+    
+    started = time.monotonic()
+    points = silence_split_points(audio_energy_db(audio_file), target_seconds=config.get('segment_target_seconds', SEGMENT_TARGET_SECONDS))
+    bounds = list(zip([0.0] + points, points + [None]))
+    threads = max(1, (os.cpu_count() or workers) // workers)
+    
+    executor = get_segment_executor(workers, threads)
+    try:
+        futures = [
+            executor.submit(_transcribe_segment, str(audio_file), start, end - start if end is not None else None,
+                            options, model_size, config.get('transcription_backend', DEFAULT_BACKEND))
+            for start, end in bounds
+        ]
+        outputs = [future.result() for future in futures]
+    except BrokenProcessPool:
+        # Упавший процесс ломает весь пул - следующий вызов создаст новый
+        shutdown_segment_executor()
+        raise
+    
+    elapsed = time.monotonic() - started
+    result = merge_results([output for output, _ in outputs])
+    
+    # Ускорение: суммарное время фрагментов (последовательный прогон) к реальному времени
+    busy = sum(seconds for _, seconds in outputs)
+    speedup = busy / elapsed if elapsed > 0 else 0.0
+    used = min(workers, len(bounds))
+    audio_duration = get_duration(audio_file) or result_duration(result)
+    logger.info(f"⚡ Segmented Whisper: {len(bounds)} segments on {used} processes x {threads} threads, "
+                f"{elapsed:.1f}s (RTF {elapsed / audio_duration if audio_duration else 0:.2f}), "
+                f"speedup {speedup:.2f}x ({speedup / used:.0%} per process)")
+    result['segmented'] = {'segments': len(bounds), 'processes': used, 'threads': threads,
+                           'seconds': round(elapsed, 2), 'speedup': round(speedup, 2)}
+    return result
+
+def batch_transcribe(audio_files: list, languages: list = None, model_size: str = 'base',
+                     batch_size: int = BATCH_SIZE, backend_name: str = DEFAULT_BACKEND) -> list:
+    """Пакетное распознавание нескольких файлов: окна до 30 с (разрез по паузам) всех файлов группы
+    декодируются вместе батчами whisper.decode, тайминги слов - выравниванием текста каждого окна.
+    Результаты в формате transcribe, по одному на файл"""
+    import torch
+    import whisper
+    from whisper.audio import HOP_LENGTH
+    from whisper.timing import find_alignment
+    
+    languages = list(languages or [None] * len(audio_files))
+    if backend_name not in BATCH_BACKENDS:
+        raise ValueError(f"Batch transcription is not supported by backend '{backend_name}'")
+    
+    words = [[] for _ in audio_files]
+    detected = [None] * len(audio_files)
+    started = time.monotonic()
+    total_audio = 0.0
+    window_count = 0
+    batch_count = 0
+    
+    with get_whisper_pool().acquire(model_size, backend=backend_name) as model:
+        # Файлы группами по batch_size: в памяти только аудио текущей группы
+        for group_start in range(0, len(audio_files), batch_size):
+            windows = []
+            for index in range(group_start, min(group_start + batch_size, len(audio_files))):
+                audio = load_audio(audio_files[index])
+                total_audio += len(audio) / WHISPER_SAMPLE_RATE
+                points = silence_split_points(frame_energy_db(audio), target_seconds=BATCH_WINDOW_TARGET_SECONDS)
+                edges = [0.0] + points + [len(audio) / WHISPER_SAMPLE_RATE]
+                for start, end in zip(edges, edges[1:]):
+                    # Окно Whisper - не длиннее 30 с
+                    while start < end:
+                        stop = min(end, start + BATCH_WINDOW_MAX_SECONDS)
+                        samples = audio[int(start * WHISPER_SAMPLE_RATE):int(stop * WHISPER_SAMPLE_RATE)]
+                        if len(samples) > HOP_LENGTH:
+                            windows.append((index, start, samples))
+                        start = stop
+            window_count += len(windows)
+            
+            # DecodingOptions.language общий для батча - окна группируются по языку файла
+            by_language = {}
+            for window in windows:
+                by_language.setdefault(languages[window[0]], []).append(window)
+            
+            for language, group in by_language.items():
+                options = whisper.DecodingOptions(language=language, without_timestamps=True, fp16=False, temperature=0.0)
+                for i in range(0, len(group), batch_size):
+                    batch = group[i:i + batch_size]
+                    mels = [_window_mel(model, samples) for _, _, samples in batch]
+                    results = whisper.decode(model, torch.stack(mels), options)
+                    batch_count += 1
+                    
+                    for (index, offset, samples), mel, result in zip(batch, mels, results):
+                        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                            continue
+                        tokenizer = _get_tokenizer(model, language or result.language)
+                        text_tokens = [token for token in result.tokens if token < tokenizer.eot]
+                        if not text_tokens:
+                            continue
+                        
+                        detected[index] = detected[index] or result.language
+                        for timing in find_alignment(model, tokenizer, text_tokens, mel, len(samples) // HOP_LENGTH):
+                            if timing.word.strip():
+                                words[index].append({
+                                    'word': timing.word,
+                                    'start': round(offset + float(timing.start), 3),
+                                    'end': round(offset + float(timing.end), 3),
+                                    'probability': float(timing.probability),
+                                })
+    
+    elapsed = time.monotonic() - started
+    logger.info(f"📦 Batched Whisper {backend_name}/{model_size}: {len(audio_files)} files, {window_count} windows "
+                f"in {batch_count} batches of up to {batch_size}, {elapsed:.1f}s "
+                f"(RTF {elapsed / total_audio if total_audio else 0:.3f})")
+    
+    return [
+        {
+            'text': ''.join(word['word'] for word in file_words),
+            'segments': _group_sentences(file_words),
+            'language': detected[index] or languages[index],
+        }
+        for index, file_words in enumerate(words)
+    ]
+
+def subtitle_word_timings(audio_file: Path, config: dict, text_content: str = None, model_size: str = 'base'):
+    """Тайминги слов для субтитров: выравнивание текста сценария, при неудаче - транскрипция"""
+    language = language_hint(text_content)
+    audio = audio_file
+    
+    if text_content and config.get('subtitle_alignment', True):
+        # Один декод в памяти на выравнивание и запасную транскрипцию
+        try:
+            audio = load_audio(audio_file)
+        except Exception as e:
+            logger.warning(f"⚠️ In-memory audio decode failed ({e}), Whisper will read the file")
+        
+        try:
+            result = align_script(audio, text_content, language, model_size)
+            if result:
+                return result
+        except Exception as e:
+            logger.warning(f"⚠️ Forced alignment failed ({e}), falling back to transcription")
+    
+    if (isinstance(audio_file, (str, Path)) and segment_worker_count(config) > 1
+            and get_duration(audio_file) >= config.get('segmented_min_seconds', SEGMENTED_MIN_SECONDS)):
+        try:
+            return transcribe_segmented(Path(audio_file), config, language, model_size)
+        except Exception as e:
+            logger.warning(f"⚠️ Segmented transcription failed ({e}), transcribing in one pass")
+    
+    return transcribe_audio(audio, config, language, model_size)
+
+def result_duration(result: dict) -> float:
+    segments = result.get('segments') or []
+    return segments[-1]['end'] if segments else 0.0
+
+def normalize_word(word: str) -> str:
+    return re.sub(r'[^\w]', '', word.lower())
+
+def result_words(result: dict) -> list:
+    """Слова результата transcribe: [(нормализованное слово, начало, конец), ...]"""
+    words = []
+    for segment in result.get('segments', []):
+        for word in segment.get('words', []):
+            normalized = normalize_word(word['word'])
+            if normalized:
+                words.append((normalized, word['start'], word['end']))
+    return words
+
+def timing_error(result: dict, reference: dict) -> dict:
+    """Ошибка таймингов слов относительно эталона (совпадающие слова выравниваются по тексту)"""
+    words = result_words(result)
+    reference_words = result_words(reference)
+    if not words or not reference_words:
+        return {'matched': 0, 'reference_words': len(reference_words), 'mean_error': None, 'p95_error': None}
+    
+    matcher = SequenceMatcher(None, [w for w, _, _ in words], [w for w, _, _ in reference_words], autojunk=False)
+    errors = []
+    for block in matcher.get_matching_blocks():
+        for k in range(block.size):
+            _, start, end = words[block.a + k]
+            _, ref_start, ref_end = reference_words[block.b + k]
+            errors.append((abs(start - ref_start) + abs(end - ref_end)) / 2)
+    
+    errors.sort()
+    return {
+        'matched': len(errors),
+        'reference_words': len(reference_words),
+        'mean_error': sum(errors) / len(errors) if errors else None,
+        'p95_error': errors[min(len(errors) - 1, int(len(errors) * 0.95))] if errors else None,
+    }
+
+def benchmark_profiles(audio_file: Path, reference: dict = None, language: str = None,
+                       profiles: list = None, model_size: str = 'base') -> list:
+    """Бенчмарк профилей: время, RTF и ошибка таймингов (эталон - TTS тайминги или профиль accurate)"""
+    profiles = profiles or list(TRANSCRIPTION_PROFILES)
+    audio_duration = get_duration(audio_file)
+    pool = get_whisper_pool()
+    
+    # Прогрев: загрузка модели не должна попасть в замер первого профиля
+    with pool.acquire(model_size):
+        pass
+    
+    results = {}
+    report = []
+    for profile_name in profiles:
+        options = get_transcribe_options(profile_name, language)
+        started = time.monotonic()
+        with pool.acquire(model_size) as model:
+            results[profile_name] = model.transcribe(str(audio_file), **options)
+        elapsed = time.monotonic() - started
+        
+        duration = audio_duration or result_duration(results[profile_name])
+        report.append({
+            'profile': profile_name,
+            'seconds': round(elapsed, 2),
+            'rtf': round(elapsed / duration, 3) if duration > 0 else None,
+            'words': len(result_words(results[profile_name])),
+        })
+    
+    if reference is None:
+        if 'accurate' not in results:
+            with pool.acquire(model_size) as model:
+                results['accurate'] = model.transcribe(str(audio_file), **get_transcribe_options('accurate', language))
+        reference = results['accurate']
+        reference_name = 'accurate'
+    else:
+        reference_name = 'reference'
+    
+    for row in report:
+        error = timing_error(results[row['profile']], reference)
+        row['timing_reference'] = reference_name
+        row['matched_words'] = error['matched']
+        row['mean_timing_error'] = round(error['mean_error'], 3) if error['mean_error'] is not None else None
+        row['p95_timing_error'] = round(error['p95_error'], 3) if error['p95_error'] is not None else None
+        logger.info(f"📊 {row['profile']}: {row['seconds']}s, RTF {row['rtf']}, "
+                    f"timing error {row['mean_timing_error']}s (p95 {row['p95_timing_error']}s)")
+    
+    return report
+
+def benchmark_segmented(audio_file: Path, workers: int, language: str = None, model_size: str = 'base',
+                        profile_name: str = DEFAULT_PROFILE) -> dict:
+    """Сравнение распознавания фрагментами в workers процессах с одним проходом: ускорение и ошибка на швах"""
+    config = {'transcription_profile': profile_name}
+    audio_duration = get_duration(audio_file)
+    
+    with get_whisper_pool().acquire(model_size):
+        pass
+    started = time.monotonic()
+    single = transcribe_audio(audio_file, config, language, model_size)
+    single_seconds = time.monotonic() - started
+    
+    segmented = transcribe_segmented(audio_file, config, language, model_size, workers)
+    stats = segmented['segmented']
+    error = timing_error(segmented, single)
+    
+    report = {
+        'audio_seconds': round(audio_duration, 1),
+        'single_pass_seconds': round(single_seconds, 2),
+        'segmented_seconds': stats['seconds'],
+        'segments': stats['segments'],
+        'processes': stats['processes'],
+        'threads_per_process': stats['threads'],
+        'cores': os.cpu_count(),
+        'speedup': round(single_seconds / stats['seconds'], 2) if stats['seconds'] else None,
+        'matched_words': error['matched'],
+        'reference_words': error['reference_words'],
+        'mean_timing_error': round(error['mean_error'], 3) if error['mean_error'] is not None else None,
+    }
+    report['speedup_per_process'] = round(report['speedup'] / stats['processes'], 2) if report['speedup'] else None
+    logger.info(f"📊 Segmented x{stats['processes']}: {report['segmented_seconds']}s vs single pass "
+                f"{report['single_pass_seconds']}s, speedup {report['speedup']}x")
+    return report
+
+def benchmark_backends(audio_files: list, backends: list = None, model_size: str = 'base',
+                       profile_name: str = DEFAULT_PROFILE) -> list:
+    """Бенчмарк движков на общем наборе файлов: RTF и ошибка таймингов слов.
+    Эталон файла - тайминги TTS из sidecar-кэша, иначе openai-whisper с профилем accurate"""
+    from transcript_cache import load_transcript
+    
+    backends = backends or available_backends()
+    references = {}
+    for audio_file in audio_files:
+        reference = load_transcript(audio_file, 'tts', {'source': 'tts'})
+        if reference is None:
+            with get_whisper_pool().acquire(model_size) as model:
+                reference = model.transcribe(str(audio_file), **get_transcribe_options('accurate'))
+            references[audio_file] = (reference, 'openai-accurate')
+        else:
+            references[audio_file] = (reference, 'tts')
+    
+    report = []
+    for backend_name in backends:
+        if not TRANSCRIPTION_BACKENDS[backend_name].available():
+            logger.warning(f"⚠️ Backend '{backend_name}' is not installed, skipped")
+            continue
+        backend = get_backend(backend_name)
+        options = get_transcribe_options(profile_name)
+        
+        # Прогрев: загрузка модели не попадает в замер
+        with get_whisper_pool().acquire(model_size, backend=backend_name):
+            pass
+        
+        total_seconds = 0.0
+        total_audio = 0.0
+        errors = []
+        matched = 0
+        reference_words = 0
+        for audio_file in audio_files:
+            started = time.monotonic()
+            with get_whisper_pool().acquire(model_size, backend=backend_name) as model:
+                result = backend.transcribe(model, str(audio_file), options)
+            total_seconds += time.monotonic() - started
+            
+            reference, _ = references[audio_file]
+            total_audio += get_duration(audio_file) or result_duration(reference)
+            error = timing_error(result, reference)
+            matched += error['matched']
+            reference_words += error['reference_words']
+            if error['mean_error'] is not None:
+                errors.append((error['mean_error'], error['matched']))
+        
+        mean_error = sum(e * n for e, n in errors) / matched if matched else None
+        row = {
+            'backend': backend_name,
+            'model': model_size,
+            'files': len(audio_files),
+            'seconds': round(total_seconds, 2),
+            'rtf': round(total_seconds / total_audio, 3) if total_audio > 0 else None,
+            'matched_words': matched,
+            'reference_words': reference_words,
+            'mean_timing_error': round(mean_error, 3) if mean_error is not None else None,
+            'references': sorted({kind for _, kind in references.values()}),
+        }
+        report.append(row)
+        logger.info(f"📊 {backend_name}/{model_size}: RTF {row['rtf']}, timing error {row['mean_timing_error']}s "
+                    f"({matched}/{reference_words} words)")
+    
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Whisper transcription profiles")
+    parser.add_argument('audio', nargs='+', help="narration audio (mp3/wav); several files with --backends")
+    parser.add_argument('--text', help="script text file: its language is passed to Whisper")
+    parser.add_argument('--reference', help="JSON with reference word timings (Whisper result format, e.g. TTS word boundaries)")
+    parser.add_argument('--profiles', nargs='+', choices=list(TRANSCRIPTION_PROFILES))
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--workers', type=int, help="compare segmented parallel transcription on N processes with a single pass")
+    parser.add_argument('--backends', nargs='*', choices=list(TRANSCRIPTION_BACKENDS),
+                        help="compare transcription backends on all given files (no names - every installed backend)")
+    args = parser.parse_args()
+    
+    if len(args.audio) > 1 and args.backends is None:
+        parser.error("several audio files are only supported with --backends")
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    language = language_hint(Path(args.text).read_text(encoding='utf-8')) if args.text else None
+    reference = json.loads(Path(args.reference).read_text(encoding='utf-8')) if args.reference else None
+    
+    if args.backends is not None:
+        report = benchmark_backends([Path(audio) for audio in args.audio], args.backends, args.model)
+    elif args.workers:
+        report = benchmark_segmented(Path(args.audio[0]), args.workers, language, args.model)
+    else:
+        report = benchmark_profiles(Path(args.audio[0]), reference, language, args.profiles, args.model)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TRANSCRIPTION BACKENDS
+Движки распознавания за общим интерфейсом: загрузка модели и transcribe в формате openai-whisper
+• openai: openai-whisper fp32 (текущий движок, нужен и для выравнивания текста)
+• faster-whisper-int8: CTranslate2 int8 на CPU (если установлен faster_whisper)
+• torch-int8: openai-whisper с динамической int8 квантизацией Linear слоев
+• Размер модели подбирается по длительности аудио и бюджету CPU (whisper_model 'auto', по выбору)
+"""
+
+import os
+import logging
+import importlib.util
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'openai'
+MODEL_SIZES = ('tiny', 'base', 'small', 'medium')
+
+# Ориентировочный RTF на 4 потоках CPU (секунды распознавания на секунду аудио)
+ESTIMATED_RTF = {
+    'openai': {'tiny': 0.06, 'base': 0.12, 'small': 0.35, 'medium': 1.0},
+    'torch-int8': {'tiny': 0.04, 'base': 0.08, 'small': 0.22, 'medium': 0.6},
+    'faster-whisper-int8': {'tiny': 0.02, 'base': 0.03, 'small': 0.08, 'medium': 0.22},
+}
+REFERENCE_THREADS = 4
+
+class TranscriptionBackend:
+    """Базовый движок: load() - модель для пула, transcribe() - результат в формате openai-whisper"""
+    
+    name = None
+    
+    @classmethod
+    def available(cls) -> bool:
+        return True
+    
+    def load(self, model_size: str, device: str = None):
+        raise NotImplementedError
+    
+    def transcribe(self, model, audio, options: dict) -> dict:
+        raise NotImplementedError
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """openai-whisper как есть (fp32 на CPU)"""
+    
+    name = 'openai'
+    
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec('whisper') is not None
+    
+    def load(self, model_size: str, device: str = None):
+        import whisper
+        return whisper.load_model(model_size, device=device) if device else whisper.load_model(model_size)
+    
+    def transcribe(self, model, audio, options: dict) -> dict:
+        return model.transcribe(audio, **options)
+
+class TorchInt8Backend(OpenAIWhisperBackend):
+    """openai-whisper с torch.quantization.quantize_dynamic (int8 веса Linear слоев, только CPU)"""
+    
+    name = 'torch-int8'
+    
+    @classmethod
+    def available(cls) -> bool:
+        return super().available() and importlib.util.find_spec('torch') is not None
+    
+    def load(self, model_size: str, device: str = None):
+        import torch
+        import whisper
+        
+        model = whisper.load_model(model_size, device='cpu')
+        # whisper.model.Linear - подкласс nn.Linear, который quantize_dynamic не заменяет
+        for module in model.modules():
+            if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+                module.__class__ = torch.nn.Linear
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class FasterWhisperInt8Backend(TranscriptionBackend):
+    """CTranslate2 (faster-whisper) с int8 вычислениями на CPU"""
+    
+    name = 'faster-whisper-int8'
+    
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec('faster_whisper') is not None
+    
+    def load(self, model_size: str, device: str = None):
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_size, device=device or 'cpu', compute_type='int8',
+                            cpu_threads=int(os.environ.get('OMP_NUM_THREADS', 0) or 0))
+    
+    def transcribe(self, model, audio, options: dict) -> dict:
+        temperature = options.get('temperature', 0.0)
+        segments, info = model.transcribe(
+            audio,
+            language=options.get('language'),
+            beam_size=options.get('beam_size') or 1,
+            best_of=options.get('best_of') or 1,
+            temperature=list(temperature) if isinstance(temperature, tuple) else temperature,
+            condition_on_previous_text=options.get('condition_on_previous_text', True),
+            word_timestamps=True
+        )
+        
+        result_segments = []
+        for i, segment in enumerate(segments):
+            result_segments.append({
+                'id': i,
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text,
+                'words': [
+                    {'word': word.word, 'start': word.start, 'end': word.end, 'probability': word.probability}
+                    for word in (segment.words or [])
+                ],
+            })
+        return {
+            'text': ''.join(segment['text'] for segment in result_segments),
+            'segments': result_segments,
+            'language': info.language,
+        }
+
+TRANSCRIPTION_BACKENDS = {
+    backend.name: backend for backend in (OpenAIWhisperBackend, FasterWhisperInt8Backend, TorchInt8Backend)
+}
+
+_instances = {}
+
+def available_backends() -> list:
+    return [name for name, backend in TRANSCRIPTION_BACKENDS.items() if backend.available()]
+
+def resolve_backend_name(name: str = None) -> str:
+    """Имя движка из config ('auto' - самый быстрый установленный на CPU)"""
+    name = name or DEFAULT_BACKEND
+    if name == 'auto':
+        for candidate in ('faster-whisper-int8', 'torch-int8', 'openai'):
+            if TRANSCRIPTION_BACKENDS[candidate].available():
+                return candidate
+        return DEFAULT_BACKEND
+    
+    if name not in TRANSCRIPTION_BACKENDS:
+        logger.warning(f"⚠️ Unknown transcription backend '{name}', using {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    if not TRANSCRIPTION_BACKENDS[name].available():
+        logger.warning(f"⚠️ Transcription backend '{name}' is not installed, using {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    return name
+
+def get_backend(name: str = None) -> TranscriptionBackend:
+    name = resolve_backend_name(name)
+    if name not in _instances:
+        _instances[name] = TRANSCRIPTION_BACKENDS[name]()
+    return _instances[name]
+
+def choose_model_size(audio_seconds: float, backend_name: str, threads: int = None, time_budget: float = 0.25,
+                      max_seconds: float = 180.0, max_size: str = 'small') -> str:
+    """Самая крупная модель, которая на доступных потоках уложится и в долю time_budget от длительности
+    аудио, и в max_seconds реального времени (для длинной озвучки - модель меньше)"""
+    threads = threads or os.cpu_count() or 1
+    estimates = ESTIMATED_RTF.get(backend_name, ESTIMATED_RTF[DEFAULT_BACKEND])
+    allowed = MODEL_SIZES[:MODEL_SIZES.index(max_size) + 1] if max_size in MODEL_SIZES else MODEL_SIZES
+    limit = min(time_budget * audio_seconds, max_seconds) if audio_seconds > 0 else max_seconds
+    
+    chosen = allowed[0]
+    for size in allowed:
+        if estimates[size] * REFERENCE_THREADS / threads * audio_seconds <= limit:
+            chosen = size
+    
+    estimated = estimates[chosen] * REFERENCE_THREADS / threads * audio_seconds
+    logger.info(f"📐 Whisper model '{chosen}' ({backend_name}) for {audio_seconds:.0f}s of audio "
+                f"on {threads} threads: ~{estimated:.0f}s (limit {limit:.0f}s)")
+    return chosen
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TRANSCRIPTION WORKER PROCESS
+Долгоживущий процесс Whisper, принимающий задания через очередь
+• Модель держит отдельный процесс: нет борьбы за GIL с cv2-рендером и tkinter GUI
+• Задание: путь к аудио или массив 16 кГц, результат - тайминги слов (формат transcribe)
+• Потоки torch процесса ограничены, чтобы не отнимать ядра у рендера
+• Падение процесса - задание выполняется в текущем процессе, процесс перезапускается
+• Готовые тайминги берутся из sidecar-кэша (transcript_cache) без обращения к процессу
+"""
+
+import os
+import queue
+import atexit
+import hashlib
+import logging
+import itertools
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import Future
+
+from transcript_cache import load_transcript, save_transcript
+from transcription_backends import DEFAULT_BACKEND, resolve_backend_name
+
+logger = logging.getLogger(__name__)
+
+# Ключи конфигурации, от которых зависит распознавание (остальной config в процесс не передается)
+TRANSCRIPTION_CONFIG_KEYS = (
+    'transcription_profile', 'subtitle_alignment', 'transcription_backend',
+    'transcription_workers', 'segmented_min_seconds', 'segment_target_seconds'
+)
+
+# Период проверки, жив ли родительский процесс
+PARENT_CHECK_SECONDS = 5.0
+
+def default_worker_threads() -> int:
+    """Потоки torch в процессе распознавания: половина ядер, остальное - рендеру"""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+def _worker_main(jobs, results, threads: int):
+    """Цикл процесса: задания до None, модели остаются загруженными в пуле между заданиями"""
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    
+    from transcription import subtitle_word_timings, shutdown_segment_executor
+    
+    parent = os.getppid()
+    while True:
+        try:
+            job = jobs.get(timeout=PARENT_CHECK_SECONDS)
+        except queue.Empty:
+            # Процесс не daemon (нужны процессы для фрагментов) - завершается сам вместе с родителем
+            if os.getppid() != parent:
+                break
+            continue
+        if job is None:
+            break
+        
+        job_id, audio, config, text_content, model_size = job
+        try:
+            result = subtitle_word_timings(audio, config, text_content, model_size)
+            results.put((job_id, result, None))
+        except Exception as e:
+            results.put((job_id, None, f"{type(e).__name__}: {e}"))
+    
+    # atexit в процессе multiprocessing не срабатывает - пул фрагментов останавливается явно
+    shutdown_segment_executor()
+
+class TranscriptionWorker:
+    """Процесс Whisper с очередью заданий: submit() возвращает Future с результатом"""
+    
+    def __init__(self, threads: int = None):
+        self.threads = threads or default_worker_threads()
+        
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._process = None
+        self._jobs = None
+        self._results = None
+        self._collector = None
+        self.stats = {'jobs': 0, 'failed': 0, 'restarts': 0}
+    
+    def _ensure_started(self):
+        """Запуск (или перезапуск после падения) процесса и потока приема результатов"""
+        if self._process is not None and self._process.is_alive():
+            return
+        
+        if self._process is not None:
+            self.stats['restarts'] += 1
+            logger.warning("⚠️ Transcription worker exited, restarting")
+        
+        # У каждого процесса свой набор ожидающих заданий: при его падении они завершаются ошибкой
+        self._pending = {}
+        self._jobs = self._context.Queue()
+        self._results = self._context.Queue()
+        self._process = self._context.Process(
+            target=_worker_main,
+            args=(self._jobs, self._results, self.threads),
+            name='whisper-worker'
+        )
+        self._process.start()
+        
+        self._collector = threading.Thread(
+            target=self._collect, args=(self._process, self._results, self._pending),
+            name='whisper-worker-results', daemon=True
+        )
+        self._collector.start()
+        logger.info(f"🎧 Transcription worker started (pid {self._process.pid}, {self.threads} torch threads)")
+    
+    def _collect(self, process, results, pending: dict):
+        """Прием результатов; при остановке процесса незавершенные задания получают ошибку"""
+        while True:
+            try:
+                job_id, result, error = results.get(timeout=1.0)
+            except Exception:
+                if process.is_alive():
+                    continue
+                with self._lock:
+                    unfinished = list(pending.values())
+                    pending.clear()
+                for future in unfinished:
+                    future.set_exception(RuntimeError(f"transcription worker exited (code {process.exitcode})"))
+                return
+            
+            with self._lock:
+                future = pending.pop(job_id, None)
+            if future is None:
+                continue
+            if error:
+                self.stats['failed'] += 1
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+    
+    def submit(self, audio, config: dict, text_content: str = None, model_size: str = 'base') -> Future:
+        """Задание на тайминги слов: audio - путь или массив 16 кГц"""
+        if isinstance(audio, Path):
+            audio = str(audio)
+        job_config = {key: config[key] for key in TRANSCRIPTION_CONFIG_KEYS if key in config}
+        
+        future = Future()
+        with self._lock:
+            self._ensure_started()
+            job_id = next(self._ids)
+            self._pending[job_id] = future
+            self.stats['jobs'] += 1
+            self._jobs.put((job_id, audio, job_config, text_content, model_size))
+        return future
+    
+    def close(self, timeout: float = 10.0):
+        """Остановка процесса (модель выгружается вместе с ним)"""
+        with self._lock:
+            process, jobs = self._process, self._jobs
+            self._process = None
+        if process is None:
+            return
+        
+        try:
+            jobs.put(None)
+            process.join(timeout)
+        except Exception:
+            pass
+        if process.is_alive():
+            process.terminate()
+        logger.info(f"🛑 Transcription worker stopped ({self.stats['jobs']} jobs)")
+
+_default_worker = None
+_default_worker_lock = threading.Lock()
+
+def get_transcription_worker() -> TranscriptionWorker:
+    """Процесс распознавания, общий для пайплайна (останавливается при выходе)"""
+    global _default_worker
+    with _default_worker_lock:
+        if _default_worker is None:
+            _default_worker = TranscriptionWorker()
+            atexit.register(_default_worker.close)
+        return _default_worker
+
+def transcript_options(config: dict, text_content: str = None) -> dict:
+    """Параметры, от которых зависит результат распознавания (ключ кэша таймингов)"""
+    from transcription import DEFAULT_PROFILE, language_hint
+    
+    aligned = bool(text_content) and config.get('subtitle_alignment', True)
+    return {
+        'backend': config.get('transcription_backend'),
+        'profile': config.get('transcription_profile', DEFAULT_PROFILE),
+        'alignment': aligned,
+        'text': hashlib.sha1(text_content.encode('utf-8')).hexdigest() if aligned else None,
+        'language': language_hint(text_content),
+    }
+
+def batch_options(options: dict) -> dict:
+    """Ключ кэша для результата пакетного режима: он декодирует жадно и не учитывает профиль"""
+    from transcription import BATCH_PROFILE
+    
+    return {**options, 'profile': BATCH_PROFILE}
+
+def resolve_transcription(audio_file, config: dict, model_size: str = None) -> tuple:
+    """(config с выбранным движком, размер модели) - одинаково для word_timings и пакетного режима"""
+    from transcription import resolve_model, audio_length
+    
+    if model_size is None:
+        threads = default_worker_threads() if config.get('transcription_worker', True) else None
+        backend_name, model_size = resolve_model(config, audio_length(audio_file), threads)
+    else:
+        backend_name = resolve_backend_name(config.get('transcription_backend', DEFAULT_BACKEND))
+    return {**config, 'transcription_backend': backend_name}, model_size
+
+def word_timings(audio_file, config: dict, text_content: str = None, model_size: str = None):
+    """Тайминги слов для субтитров: из sidecar-кэша, иначе в процессе распознавания (или в текущем)"""
+    from transcription import subtitle_word_timings
+    
+    use_worker = config.get('transcription_worker', True)
+    config, model_size = resolve_transcription(audio_file, config, model_size)
+    
+    use_cache = config.get('transcript_cache', True) and isinstance(audio_file, (str, Path))
+    if use_cache:
+        options = transcript_options(config, text_content)
+        cached = load_transcript(audio_file, model_size, options)
+        # Результат пакетного режима подходит, только если он включен в config
+        if cached is None and config.get('batch_transcription') and not options['alignment']:
+            cached = load_transcript(audio_file, model_size, batch_options(options))
+        if cached is not None:
+            return cached
+    
+    result = None
+    if use_worker:
+        try:
+            result = get_transcription_worker().submit(audio_file, config, text_content, model_size).result()
+        except Exception as e:
+            logger.warning(f"⚠️ Transcription worker failed ({e}), transcribing in-process")
+    
+    if result is None:
+        result = subtitle_word_timings(audio_file, config, text_content, model_size)
+    
+    if use_cache:
+        save_transcript(audio_file, model_size, options, result)
+    return result
+
+def batch_word_timings(jobs: list) -> int:
+    """Пакетное распознавание [(аудио, config, текст сценария), ...] с записью в sidecar-кэш,
+    откуда word_timings потом берет тайминги каждого видео (если batch_transcription включен).
+    Видео с выравниванием текста и с движками без батчевого decode пропускаются"""
+    from transcription import batch_transcribe, language_hint, BATCH_SIZE, BATCH_BACKENDS
+    
+    groups = {}
+    skipped_backends = set()
+    for audio_file, config, text_content in jobs:
+        config, model_size = resolve_transcription(audio_file, config)
+        if config['transcription_backend'] not in BATCH_BACKENDS:
+            skipped_backends.add(config['transcription_backend'])
+            continue
+        options = batch_options(transcript_options(config, text_content))
+        if options['alignment'] or load_transcript(audio_file, model_size, options) is not None:
+            continue
+        key = (config['transcription_backend'], model_size)
+        groups.setdefault(key, []).append((audio_file, options, language_hint(text_content), config))
+    
+    if skipped_backends:
+        logger.info(f"⏭️ Batch transcription skipped for backends {sorted(skipped_backends)} "
+                    f"(no batched decode), these videos are transcribed one by one")
+    
+    saved = 0
+    for (backend_name, model_size), items in groups.items():
+        batch_size = items[0][3].get('transcription_batch_size', BATCH_SIZE)
+        results = batch_transcribe([item[0] for item in items], [item[2] for item in items],
+                                   model_size, batch_size, backend_name)
+        for (audio_file, options, _, _), result in zip(items, results):
+            if save_transcript(audio_file, model_size, options, result):
+                saved += 1
+    return saved
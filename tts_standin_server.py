@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LOCAL STAND-IN TTS SERVER
+Локальная замена edge-tts для бенчмарков и нагрузочных тестов пайплайна без живого сервиса
+• Детерминированное аудио: тишина в формате edge-tts (MP3 24 кГц, 48 кбит/с, моно)
+• Равномерные тайминги слов в формате WordBoundary
+• Настраиваемые задержка, доля ошибок и ограничение частоты запросов (429)
+
+Запуск сервера:   python tts_standin_server.py --latency 0.8 --error-rate 0.05 --max-rps 4
+Нагрузочный тест: python tts_standin_server.py --load-test script.txt --concurrency 8
+"""
+
+import sys
+import json
+import time
+import math
+import base64
+import random
+import argparse
+import threading
+import logging
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# MPEG-2 Layer III, 48 кбит/с, 24 кГц, моно: 144 байта и 576 сэмплов (24 мс) на кадр
+SILENT_FRAME = bytes([0xFF, 0xF3, 0x64, 0xC4]) + bytes(140)
+FRAME_SECONDS = 576 / 24000
+
+class StandInTTSState:
+    """Параметры и счетчики stand-in сервера"""
+    
+    def __init__(self, latency=0.5, latency_per_char=0.0005, jitter=0.2, error_rate=0.0,
+                 max_rps=0.0, chars_per_second=15.0, seed=42):
+        self.latency = latency
+        self.latency_per_char = latency_per_char
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.chars_per_second = chars_per_second
+        self.random = random.Random(seed)
+        
+        self.lock = threading.Lock()
+        self.tokens = max_rps
+        self.last_refill = time.monotonic()
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'throttled': 0, 'in_flight': 0, 'max_in_flight': 0}
+    
+    def try_acquire(self) -> bool:
+        """Token bucket для имитации ограничения частоты запросов"""
+        if self.max_rps <= 0:
+            return True
+        
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.max_rps, self.tokens + (now - self.last_refill) * self.max_rps)
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+    
+    def count(self, key: str, delta: int = 1):
+        with self.lock:
+            self.stats[key] += delta
+            if key == 'in_flight':
+                self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+    
+    def draw(self):
+        """Случайные величины одного запроса: (сбой?, множитель задержки)"""
+        with self.lock:
+            return self.random.random() < self.error_rate, 1 + self.random.uniform(-self.jitter, self.jitter)
+
+def parse_rate(rate: str) -> float:
+    """'+10%' / '-5%' -> множитель скорости речи"""
+    try:
+        return max(0.25, 1 + int(rate.strip().rstrip('%')) / 100)
+    except (ValueError, AttributeError):
+        return 1.0
+
+def synthesize_silence(text: str, rate: str, chars_per_second: float):
+    """Детерминированное аудио и тайминги слов для текста"""
+    duration = max(FRAME_SECONDS, len(text) / (chars_per_second * parse_rate(rate)))
+    frame_count = int(math.ceil(duration / FRAME_SECONDS))
+    audio = SILENT_FRAME * frame_count
+    
+    words = []
+    tokens = text.split()
+    total_chars = sum(len(token) + 1 for token in tokens) or 1
+    position = 0
+    for token in tokens:
+        start = duration * position / total_chars
+        position += len(token) + 1
+        end = duration * (position - 1) / total_chars
+        words.append({'word': token.strip('.,!?;:¡¿"()'), 'start': round(start, 3), 'end': round(end, 3)})
+    
+    return audio, words
+
+class StandInTTSHandler(BaseHTTPRequestHandler):
+    """HTTP обработчик: POST /synthesize, GET /stats"""
+    
+    state = None
+    
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+    
+    def send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.state.lock:
+                self.send_json(200, dict(self.state.stats))
+        else:
+            self.send_json(404, {'error': 'not found'})
+    
+    def do_POST(self):
+        if self.path != '/synthesize':
+            self.send_json(404, {'error': 'not found'})
+            return
+        
+        state = self.state
+        state.count('requests')
+        
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+            text = request['text']
+        except (ValueError, KeyError):
+            self.send_json(400, {'error': 'bad request'})
+            return
+        
+        if not state.try_acquire():
+            state.count('throttled')
+            self.send_json(429, {'error': 'throttled'}, {'Retry-After': '1'})
+            return
+        
+        state.count('in_flight')
+        try:
+            fail, latency_factor = state.draw()
+            time.sleep((state.latency + state.latency_per_char * len(text)) * latency_factor)
+            
+            if fail:
+                state.count('errors')
+                self.send_json(503, {'error': 'simulated failure'})
+                return
+            
+            audio, words = synthesize_silence(text, request.get('rate', '+0%'), state.chars_per_second)
+            state.count('ok')
+            self.send_json(200, {'audio': base64.b64encode(audio).decode('ascii'), 'words': words})
+        finally:
+            state.count('in_flight', -1)
+
+class StandInTTSServer:
+    """Stand-in TTS сервер, запускаемый в фоновом потоке"""
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, **state_options):
+        self.state = StandInTTSState(**state_options)
+        handler = type('BoundStandInTTSHandler', (StandInTTSHandler,), {'state': self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"🧪 Stand-in TTS server listening on {self.url}")
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def stats(self) -> dict:
+        with self.state.lock:
+            return dict(self.state.stats)
+
+def run_load_test(text: str, server: StandInTTSServer, output_dir: Path, config: dict = None):
+    """Полный прогон SmartTTSProcessor против stand-in сервера: пропускная способность и задержки"""
+    from recoverr4fix_subtitle import SmartTTSProcessor
+    
+    run_config = {'voice_preset': {'en': 'aria_standard', 'es': 'elvira_elegant'}, 'speed': 1.0}
+    run_config.update(config or {})
+    run_config.update({'tts_backend': 'standin', 'tts_standin_url': server.url})
+    
+    processor = SmartTTSProcessor()
+    output_file = Path(output_dir) / 'standin_load_test.mp3'
+    
+    started = time.monotonic()
+    try:
+        result = processor.run_sync(processor.text_to_speech(text, output_file, run_config))
+    finally:
+        processor.close_sessions()
+    elapsed = time.monotonic() - started
+    
+    report = {
+        'success': result is not None,
+        'wall_seconds': round(elapsed, 2),
+        'chars': len(text),
+        'chars_per_second': round(len(text) / elapsed, 1) if elapsed > 0 else 0.0,
+        'concurrency': run_config.get('tts_concurrency'),
+        'latency': processor.get_latency_histogram(),
+        'server': server.stats(),
+    }
+    
+    if output_file.exists():
+        output_file.unlink()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in TTS server for offline benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help="base request latency, s")
+    parser.add_argument('--latency-per-char', type=float, default=0.0005, help="extra latency per character, s")
+    parser.add_argument('--jitter', type=float, default=0.2, help="relative latency jitter (0.2 = ±20%%)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests failing with 503")
+    parser.add_argument('--max-rps', type=float, default=0.0, help="requests per second before 429 (0 = unlimited)")
+    parser.add_argument('--chars-per-second', type=float, default=15.0, help="speech rate of generated audio")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--load-test', metavar='TEXT_FILE', help="run SmartTTSProcessor against the server and exit")
+    parser.add_argument('--concurrency', type=int, default=4, help="tts_concurrency for --load-test")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    server = StandInTTSServer(
+        args.host, 0 if args.load_test else args.port,
+        latency=args.latency, latency_per_char=args.latency_per_char, jitter=args.jitter,
+        error_rate=args.error_rate, max_rps=args.max_rps,
+        chars_per_second=args.chars_per_second, seed=args.seed
+    ).start()
+    
+    if args.load_test:
+        text = Path(args.load_test).read_text(encoding='utf-8')
+        try:
+            report = run_load_test(text, server, Path(args.load_test).parent, {'tts_concurrency': args.concurrency})
+        finally:
+            server.stop()
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0 if report['success'] else 1
+    
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,7 @@ import random
 import asyncio
 import threading
 import subprocess
+import importlib.util
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import queue
@@ -27,9 +28,15 @@ from tkinter import ttk, filedialog, messagebox
 # Core processing imports
 import cv2
 import numpy as np
-import whisper
 import edge_tts
 
+# Local modules
+from media_probe import get_duration
+from language_detector import detect_language as detect_text_language
+from transcription_worker import word_timings
+from subtitle_ir import SubtitleIR, ass_header, compile_formatter, write_ass, export_plain_subtitles
+from subtitle_fonts import ass_filter, resolve_fonts_dir
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -230,24 +237,7 @@ class EnhancedTTSProcessor:
     
     def detect_language(self, text: str) -> str:
         """Быстрое определение языка"""
-        sample = text[:200].lower()
-        
-        # Испанские характерные элементы
-        spanish_chars = ['ñ', 'á', 'é', 'í', 'ó', 'ú', '¿', '¡']
-        spanish_words = ['el', 'la', 'de', 'que', 'y', 'es', 'en', 'un', 'se', 'no', 
-                        'te', 'lo', 'le', 'da', 'su', 'por', 'son', 'con', 'para', 
-                        'del', 'los', 'las', 'una', 'este', 'esta']
-        
-        # Проверка на испанский
-        if any(char in sample for char in spanish_chars):
-            return 'es'
-        
-        words = sample.split()
-        spanish_score = sum(1 for word in words if word in spanish_words)
-        if spanish_score > len(words) * 0.25:
-            return 'es'
-        
-        return 'en'
+        return detect_text_language(text)
     
     async def text_to_speech(self, text: str, output_file: Path, config: dict):
         """Высококачественная генерация речи"""
@@ -282,16 +272,9 @@ class AdvancedSlideshowGenerator:
     
     def get_audio_duration(self, audio_file: Path) -> float:
         """Получение длительности аудио файла"""
-        try:
-            result = subprocess.run([
-                'ffprobe', '-i', str(audio_file), '-show_entries', 'format=duration',
-                '-v', 'quiet', '-of', 'csv=p=0'
-            ], capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                return float(result.stdout.strip())
-        except:
-            pass
+        duration = get_duration(audio_file)
+        if duration > 0:
+            return duration
         
         return 300.0  # Fallback: 5 минут
     
@@ -448,25 +431,16 @@ class PrecisionVideoMerger:
             logger.error(f"❌ Audio extraction failed: {e}")
             return False
     
-    def generate_colored_subtitles(self, audio_file: Path, subtitle_file: Path, config: dict):
+    def generate_colored_subtitles(self, audio_file: Path, subtitle_file: Path, config: dict, text_content: str = None):
         """Генерация цветных субтитров с word-level timestamps"""
         try:
-            logger.info("🤖 Loading Whisper model...")
-            model = whisper.load_model("base")
-            
-            logger.info("🎤 Transcribing with word-level timestamps...")
-            result = model.transcribe(
-                str(audio_file), 
-                fp16=False, 
-                verbose=False,
-                word_timestamps=True  # Включаем word-level timestamps
-            )
-            
-            # Конвертация в ASS с цветами
-            ass_content = self.whisper_to_colored_ass(result, config)
+            logger.info("🎤 Building word-level timestamps...")
+            result = word_timings(audio_file, config, text_content)
             
-            with open(subtitle_file, 'w', encoding='utf-8') as f:
-                f.write(ass_content)
+            # Конвертация в ASS с цветами (сегменты без word-level данных - целиком)
+            ir = SubtitleIR.from_result(result, config.get('subtitle_offset', 0.0), segment_fallback=True)
+            write_ass(ir, subtitle_file, self.colored_ass_header(), self.colored_formatter(config))
+            export_plain_subtitles(ir, subtitle_file, config.get('subtitle_export_formats'))
             
             logger.info(f"✅ Colored subtitles generated: {subtitle_file}")
             return True
@@ -475,128 +449,21 @@ class PrecisionVideoMerger:
             logger.error(f"❌ Subtitle generation failed: {e}")
             return False
     
-    def whisper_to_colored_ass(self, result, config: dict):
-        """Конвертация в ASS с настраиваемыми цветами"""
-        # Получаем цвета из конфига
+    def colored_ass_header(self) -> str:
+        """ASS заголовок"""
+        return ass_header('Generated Colored Subtitles', 'Arial Black', 28, '&Hffffff', '&Hffffff', 3, 2, 5, 40)
+    
+    def colored_formatter(self, config: dict):
+        """Чередующиеся цвета из конфига"""
         primary_color = config.get('subtitle_colors', {}).get('primary', '&H00FFFF&')    # желтый
         secondary_color = config.get('subtitle_colors', {}).get('secondary', '&HFFFFFF&') # белый
-        
-        # ASS заголовок
-        ass_content = """[Script Info]
-Title: Generated Colored Subtitles
-ScriptType: v4.00+
-
-[V4+ Styles]
-Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
-Style: Default,Arial Black,28,&Hffffff,&Hffffff,&H000000,&H80000000,1,0,0,0,100,100,0,0,1,3,2,5,10,10,40,1
-
-[Events]
-Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
-
-"""
-        
-        subtitle_offset = config.get('subtitle_offset', 0.0)
-        
-        for segment in result['segments']:
-            # Используем word-level данные если доступны
-            if 'words' in segment and segment['words']:
-                words = segment['words']
-                word_chunks = self.group_words_into_chunks(words, max_words=4)
-                
-                for chunk in word_chunks:
-                    if not chunk:
-                        continue
-                    
-                    start_time = chunk[0]['start'] + subtitle_offset
-                    end_time = chunk[-1]['end'] + subtitle_offset
-                    
-                    # Форматируем текст с чередующимися цветами
-                    text = self.format_colored_text(chunk, primary_color, secondary_color)
-                    
-                    if text.strip():
-                        start_ass = self.seconds_to_ass_time(max(0, start_time))
-                        end_ass = self.seconds_to_ass_time(max(0.1, end_time))
-                        
-                        ass_content += f"Dialogue: 0,{start_ass},{end_ass},Default,,0,0,0,,{text}\n"
-            
-            else:
-                # Fallback к сегментам без word-level данных
-                start_time = segment['start'] + subtitle_offset
-                end_time = segment['end'] + subtitle_offset
-                text = segment['text'].strip()
-                
-                if text:
-                    formatted_text = self.format_colored_text_from_string(
-                        text, primary_color, secondary_color)
-                    start_ass = self.seconds_to_ass_time(max(0, start_time))
-                    end_ass = self.seconds_to_ass_time(max(0.1, end_time))
-                    
-                    ass_content += f"Dialogue: 0,{start_ass},{end_ass},Default,,0,0,0,,{formatted_text}\n"
-        
-        return ass_content
-    
-    def format_colored_text(self, word_chunk, primary_color, secondary_color):
-        """Форматирование текста с чередующимися цветами"""
-        formatted_words = []
-        
-        for i, word_data in enumerate(word_chunk):
-            word = word_data['word'].strip().upper()
-            
-            if i % 2 == 0:  # четные позиции - первый цвет
-                formatted_words.append(f"{{\\c{primary_color}}}{word}{{\\r}}")
-            else:  # нечетные позиции - второй цвет
-                formatted_words.append(f"{{\\c{secondary_color}}}{word}{{\\r}}")
-        
-        return " ".join(formatted_words)
-    
-    def format_colored_text_from_string(self, text, primary_color, secondary_color):
-        """Форматирование обычного текста с чередующимися цветами"""
-        words = text.strip().split()
-        formatted_words = []
-        
-        for i, word in enumerate(words):
-            word = word.upper()
-            
-            if i % 2 == 0:  # четные позиции - первый цвет
-                formatted_words.append(f"{{\\c{primary_color}}}{word}{{\\r}}")
-            else:  # нечетные позиции - второй цвет
-                formatted_words.append(f"{{\\c{secondary_color}}}{word}{{\\r}}")
-        
-        return " ".join(formatted_words)
-    
-    def group_words_into_chunks(self, words, max_words=4):
-        """Группировка слов в чанки"""
-        chunks = []
-        current_chunk = []
-        
-        for word in words:
-            current_chunk.append(word)
-            
-            if len(current_chunk) >= max_words:
-                chunks.append(current_chunk)
-                current_chunk = []
-        
-        if current_chunk:
-            chunks.append(current_chunk)
-        
-        return chunks
-    
-    def seconds_to_ass_time(self, seconds):
-        """Конвертация секунд в ASS формат"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        centisecs = int((seconds % 1) * 100)
-        
-        return f"{hours}:{minutes:02d}:{secs:02d}.{centisecs:02d}"
+        return compile_formatter('alternate', primary_color, secondary_color)
     
     def add_colored_subtitles_to_video(self, video_file: Path, subtitle_file: Path, output_file: Path):
         """Добавление цветных субтитров к видео"""
-        subtitle_path_escaped = str(subtitle_file).replace('\\', '\\\\').replace(':', '\\:')
-        
         cmd = [
             'ffmpeg', '-i', str(video_file),
-            '-vf', f"ass='{subtitle_path_escaped}'",
+            '-vf', ass_filter(subtitle_file, resolve_fonts_dir()),
             '-c:a', 'copy', '-y', str(output_file)
         ]
         
@@ -642,6 +509,14 @@ class UltimateVideoProductionPipeline:
                 'subtitle_style': 'colorful',
                 'subtitle_offset': 0.0,
                 'word_timestamps': True,
+                'subtitle_export_formats': [],  # srt/vtt рядом с ASS
+                'transcription_profile': 'balanced',  # fast/balanced/accurate
+                'subtitle_alignment': True,  # выравнивание текста сценария вместо транскрипции
+                'transcription_worker': True,  # Whisper в отдельном процессе
+                'transcription_workers': 'auto',  # процессы для длинной озвучки (фрагменты по паузам)
+                'transcript_cache': True,  # тайминги слов в sidecar рядом с озвучкой
+                'transcription_backend': 'openai',  # openai / faster-whisper-int8 / torch-int8 / auto (по выбору)
+                'whisper_model': 'base',  # tiny/base/small/medium / auto (по выбору: подбор по аудио и CPU)
                 'image_quality': 'high',  # high/fast
                 'subtitle_colors': {
                     'primary': '&H00FFFF&',    # желтый
@@ -755,7 +630,7 @@ class UltimateVideoProductionPipeline:
             if self.progress_callback:
                 self.progress_callback(f"🌈 {folder_name}: Generating colored subtitles...")
             
-            if not self.video_merger.generate_colored_subtitles(temp_audio, subtitle_file, config):
+            if not self.video_merger.generate_colored_subtitles(temp_audio, subtitle_file, config, text_content):
                 logger.error(f"❌ Failed to generate colored subtitles for {folder_name}")
                 return False
             
@@ -780,16 +655,9 @@ class UltimateVideoProductionPipeline:
     
     def get_audio_duration(self, audio_file: Path) -> float:
         """Получение длительности аудио файла"""
-        try:
-            result = subprocess.run([
-                'ffprobe', '-i', str(audio_file), '-show_entries', 'format=duration',
-                '-v', 'quiet', '-of', 'csv=p=0'
-            ], capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                return float(result.stdout.strip())
-        except:
-            pass
+        duration = get_duration(audio_file)
+        if duration > 0:
+            return duration
         
         return 300.0  # Fallback
     
@@ -1221,8 +1089,10 @@ def main():
     try:
         import cv2
         import numpy as np
-        import whisper
         import edge_tts
+        # Только наличие пакета: whisper и torch загружает процесс распознавания
+        if importlib.util.find_spec('whisper') is None:
+            raise ImportError("No module named 'whisper'")
         print("✅ All dependencies found")
     except ImportError as e:
         print(f"❌ Missing dependency: {e}")
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WHISPER MODEL POOL
+Общий для процесса пул моделей Whisper: каждая модель загружается один раз на пакет
+• Ключ модели: (движок, размер, устройство) - движки из transcription_backends
+• Выгрузка после простоя и при нехватке памяти (только неиспользуемые модели)
+• Проверка: результаты пула совпадают с только что загруженной моделью
+
+Проверка: python whisper_pool.py --verify voice.wav --model base
+"""
+
+import gc
+import sys
+import time
+import json
+import argparse
+import threading
+import logging
+from pathlib import Path
+from contextlib import contextmanager
+
+import whisper
+
+from transcription_backends import DEFAULT_BACKEND, get_backend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_TIMEOUT = 600.0
+DEFAULT_MIN_AVAILABLE_MB = 1024
+
+def available_memory_mb():
+    """Доступная память системы в МБ (None если определить нельзя)"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available / (1024 * 1024)
+    except ImportError:
+        pass
+    
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def release_memory():
+    """Возврат памяти после выгрузки модели"""
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+class PooledModel:
+    """Загруженная модель и ее учет: блокировка использования, время последнего обращения"""
+    
+    def __init__(self, key: tuple, model, load_seconds: float):
+        self.key = key
+        self.model = model
+        self.load_seconds = load_seconds
+        self.lock = threading.Lock()
+        self.users = 0
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+class WhisperModelPool:
+    """Пул моделей Whisper с повторным использованием и выгрузкой по простою/памяти"""
+    
+    def __init__(self, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, min_available_mb: float = DEFAULT_MIN_AVAILABLE_MB,
+                 loader=None):
+        self.idle_timeout = idle_timeout
+        self.min_available_mb = min_available_mb
+        self.loader = loader or whisper.load_model
+        
+        self._lock = threading.Lock()
+        self._models = {}
+        self._load_locks = {}
+        self._reaper = None
+        self._stop = threading.Event()
+        self.stats = {'loads': 0, 'hits': 0, 'evicted_idle': 0, 'evicted_memory': 0, 'load_seconds': 0.0}
+    
+    @contextmanager
+    def acquire(self, model_size: str = 'base', device: str = None, backend: str = DEFAULT_BACKEND):
+        """Модель на время использования: пока она занята, выгрузка невозможна"""
+        entry = self._get_entry(model_size, device, backend)
+        try:
+            # Один transcribe на модель одновременно
+            with entry.lock:
+                entry.uses += 1
+                yield entry.model
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+    
+    def _get_entry(self, model_size: str, device: str, backend: str = DEFAULT_BACKEND):
+        """Запись пула с уже учтенным пользователем (под общей блокировкой - без гонки с выгрузкой)"""
+        key = (backend, model_size, device)
+        
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self.stats['hits'] += 1
+                entry.users += 1
+                return entry
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        
+        # Загрузка вне общей блокировки: другие размеры моделей доступны параллельно
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self.stats['hits'] += 1
+                    entry.users += 1
+                    return entry
+            
+            self.evict_for_memory(exclude=key)
+            
+            logger.info(f"🔄 Loading Whisper model '{model_size}' ({backend}, pooled)")
+            started = time.monotonic()
+            if backend == DEFAULT_BACKEND:
+                model = self.loader(model_size, device=device) if device else self.loader(model_size)
+            else:
+                model = get_backend(backend).load(model_size, device)
+            load_seconds = time.monotonic() - started
+            logger.info(f"✅ Whisper model '{model_size}' ({backend}) loaded in {load_seconds:.1f}s")
+            
+            entry = PooledModel(key, model, load_seconds)
+            entry.users = 1
+            with self._lock:
+                self._models[key] = entry
+                self.stats['loads'] += 1
+                self.stats['load_seconds'] += load_seconds
+        
+        self._start_reaper()
+        return entry
+    
+    def _evict(self, entries: list, reason: str):
+        with self._lock:
+            evicted = []
+            for entry in entries:
+                if entry.users == 0 and self._models.get(entry.key) is entry:
+                    del self._models[entry.key]
+                    evicted.append(entry)
+                    self.stats[f'evicted_{reason}'] += 1
+        
+        for entry in evicted:
+            logger.info(f"🧹 Whisper model '{entry.key[1]}' ({entry.key[0]}) unloaded ({reason}, {entry.uses} uses)")
+            entry.model = None
+        if evicted:
+            release_memory()
+        return len(evicted)
+    
+    def evict_idle(self) -> int:
+        """Выгрузка моделей, не использовавшихся дольше idle_timeout"""
+        now = time.monotonic()
+        with self._lock:
+            idle = [e for e in self._models.values() if e.users == 0 and now - e.last_used >= self.idle_timeout]
+        return self._evict(idle, 'idle') if idle else 0
+    
+    def evict_for_memory(self, exclude: tuple = None) -> int:
+        """Выгрузка свободных моделей (начиная с давно не использованных) при нехватке памяти"""
+        available = available_memory_mb()
+        if available is None or available >= self.min_available_mb:
+            return 0
+        
+        with self._lock:
+            candidates = sorted(
+                (e for e in self._models.values() if e.users == 0 and e.key != exclude),
+                key=lambda e: e.last_used
+            )
+        if not candidates:
+            return 0
+        
+        logger.warning(f"⚠️ Low memory ({available:.0f} MB available), unloading idle Whisper models")
+        return self._evict(candidates, 'memory')
+    
+    def clear(self) -> int:
+        """Выгрузка всех свободных моделей"""
+        with self._lock:
+            entries = list(self._models.values())
+        return self._evict(entries, 'idle')
+    
+    def loaded(self) -> list:
+        with self._lock:
+            return [key for key in self._models]
+    
+    def _start_reaper(self):
+        """Фоновая проверка простоя и памяти"""
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._reap, name='whisper-pool-reaper', daemon=True)
+            self._reaper.start()
+    
+    def _reap(self):
+        interval = max(5.0, min(60.0, self.idle_timeout / 4))
+        while not self._stop.wait(interval):
+            self.evict_idle()
+            self.evict_for_memory()
+            with self._lock:
+                if not self._models:
+                    self._reaper = None
+                    return
+    
+    def shutdown(self):
+        self._stop.set()
+        self.clear()
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_whisper_pool() -> WhisperModelPool:
+    """Пул моделей Whisper процесса (общий для обоих пайплайнов)"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = WhisperModelPool()
+        return _default_pool
+
+def compare_transcriptions(first: dict, second: dict, tolerance: float = 0.01) -> list:
+    """Различия двух результатов transcribe: текст и границы сегментов/слов"""
+    differences = []
+    if first.get('text', '').strip() != second.get('text', '').strip():
+        differences.append("text differs")
+    
+    first_segments = first.get('segments', [])
+    second_segments = second.get('segments', [])
+    if len(first_segments) != len(second_segments):
+        differences.append(f"segment count {len(first_segments)} != {len(second_segments)}")
+        return differences
+    
+    for i, (a, b) in enumerate(zip(first_segments, second_segments)):
+        if abs(a['start'] - b['start']) > tolerance or abs(a['end'] - b['end']) > tolerance:
+            differences.append(f"segment {i} timing {a['start']:.2f}-{a['end']:.2f} != {b['start']:.2f}-{b['end']:.2f}")
+        for j, (wa, wb) in enumerate(zip(a.get('words', []), b.get('words', []))):
+            if wa['word'] != wb['word'] or abs(wa['start'] - wb['start']) > tolerance:
+                differences.append(f"segment {i} word {j}: {wa['word']!r}@{wa['start']:.2f} != {wb['word']!r}@{wb['start']:.2f}")
+                break
+    return differences
+
+def verify_against_fresh_load(audio_file: Path, model_size: str = 'base', pool: WhisperModelPool = None) -> bool:
+    """Проверка: повторно используемая модель пула дает тот же результат, что и свежая загрузка"""
+    pool = pool or get_whisper_pool()
+    options = {'fp16': False, 'verbose': False, 'word_timestamps': True, 'temperature': 0.0}
+    
+    with pool.acquire(model_size) as model:
+        pooled_first = model.transcribe(str(audio_file), **options)
+    # Второй прогон на уже "теплой" модели - как для следующего видео в пакете
+    with pool.acquire(model_size) as model:
+        pooled_warm = model.transcribe(str(audio_file), **options)
+    
+    fresh_model = whisper.load_model(model_size)
+    fresh = fresh_model.transcribe(str(audio_file), **options)
+    del fresh_model
+    release_memory()
+    
+    differences = compare_transcriptions(fresh, pooled_first) + compare_transcriptions(fresh, pooled_warm)
+    if differences:
+        for difference in differences:
+            logger.error(f"❌ Pooled Whisper mismatch: {difference}")
+        return False
+    
+    logger.info(f"✅ Pooled Whisper '{model_size}' matches a fresh load ({len(fresh.get('segments', []))} segments)")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper model pool check")
+    parser.add_argument('--verify', metavar='AUDIO', required=True, help="compare pooled and freshly loaded model results")
+    parser.add_argument('--model', default='base')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    pool = get_whisper_pool()
+    ok = verify_against_fresh_load(Path(args.verify), args.model, pool)
+    print(json.dumps({'match': ok, 'pool': pool.stats}, indent=2))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())